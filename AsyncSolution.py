@@ -0,0 +1,645 @@
+from typing import Iterable, List, Tuple, Union
+
+import Solution  # registers the statements shared with the synchronous API
+from Solution import cacheKey, critic_profiles, actor_profiles, movie_profiles, studio_profiles
+from Solution import forgetRatings, forgetActorRatings, movie_ratings, actor_ratings, best_performances
+from Solution import cachedBatch, cacheFirst, cacheFound, validID, validMovieKey, validRoles
+from Solution import add_errors, insert_errors, remove_errors, errorValue, removedValue
+from Solution import criticValues, actorValues, movieValues, studioValues, asCritic, asActor, asMovie, asStudio
+from Solution import foundActors, foundMovies, foundRatings, ratingValue, actorRatingValue, budgetValue, investedValue
+from Solution import franchiseRows, studioRevenueRows, fanCriticRows, genreAgeRows, exclusiveActorRows
+from Solution import pageKey, pageOf
+from Solution import deleteChunks, notDeleted, critic_deletes, actor_deletes, movie_deletes, studio_deletes
+import Utility.AsyncDBConnector as Connector
+from Utility.Cache import MISSING
+from Utility.ReturnValue import ReturnValue
+from Utility.Exceptions import DatabaseException
+
+from Business.Movie import Movie
+from Business.Studio import Studio
+from Business.Critic import Critic
+from Business.Actor import Actor
+
+# the CRUD, basic and advanced API of Solution.py as coroutines, for callers running on an asyncio event loop.
+# every function runs the same registered statement and makes the same of its outcome as its synchronous
+# counterpart (see RESULTS in Solution.py), and the profiles and rating aggregates are served from (and invalidated
+# in) the same caches.
+# createTables / clearTables / dropTables and the bulk loaders (COPY) stay in Solution.py, the bulk deletes are here
+
+# ---------------------------------- CRUD API: ----------------------------------
+
+async def addCritic(critic: Critic) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    return_value = ReturnValue.OK
+    try:
+        await conn.connect()
+        await conn.executeStatement("addCritic", critic.getCriticID(), critic.getName())
+        await conn.commit()
+    except Exception as e:
+        return_value = errorValue(e, add_errors)
+    finally:
+        await conn.close()
+    if return_value == ReturnValue.OK:
+        critic_profiles.invalidate(cacheKey(critic.getCriticID()))
+    return return_value
+
+
+async def deleteCritic(critic_id: int) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    return_value = ReturnValue.OK
+    try:
+        await conn.connect()
+        rows_effected, touched = await conn.executeStatement("deleteCritic", critic_id)
+        await conn.commit()
+        if rows_effected == 0:
+            return_value = ReturnValue.NOT_EXISTS
+    except Exception as e:
+        return_value = ReturnValue.ERROR
+    finally:
+        await conn.close()
+    if return_value == ReturnValue.OK:
+        critic_profiles.invalidate(cacheKey(critic_id))
+        forgetRatings(touched)
+    return return_value
+
+
+async def getCriticProfile(critic_id: int) -> Critic:
+    profile = critic_profiles.get(cacheKey(critic_id))
+    if profile is MISSING:
+        conn = Connector.AsyncDBConnector()
+        stamp = critic_profiles.stamp()
+        try:
+            await conn.connect()
+            _, result = await conn.executeStatement("getCriticProfile", critic_id)
+            await conn.commit()
+            profile = cacheFirst(critic_profiles, cacheKey(critic_id), result, criticValues, stamp)
+        except Exception:
+            profile = None
+        finally:
+            await conn.close()
+    return asCritic(profile)
+
+
+async def addActor(actor: Actor) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    return_value = ReturnValue.OK
+    try:
+        await conn.connect()
+        await conn.executeStatement("addActor", actor.getActorID(), actor.getActorName(), actor.getAge(),
+                                    actor.getHeight())
+        await conn.commit()
+    except Exception as e:
+        return_value = errorValue(e, add_errors)
+    finally:
+        await conn.close()
+    if return_value == ReturnValue.OK:
+        actor_profiles.invalidate(cacheKey(actor.getActorID()))
+    return return_value
+
+
+async def deleteActor(actor_id: int) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    return_value = ReturnValue.OK
+    try:
+        await conn.connect()
+        rows_effected, _ = await conn.executeStatement("deleteActor", actor_id)
+        await conn.commit()
+        if rows_effected == 0:
+            return_value = ReturnValue.NOT_EXISTS
+    except Exception as e:
+        return_value = ReturnValue.ERROR
+    finally:
+        await conn.close()
+    if return_value == ReturnValue.OK:
+        actor_profiles.invalidate(cacheKey(actor_id))
+        forgetActorRatings(actor_id)
+    return return_value
+
+
+async def getActorProfile(actor_id: int) -> Actor:
+    profile = actor_profiles.get(cacheKey(actor_id))
+    if profile is MISSING:
+        conn = Connector.AsyncDBConnector()
+        stamp = actor_profiles.stamp()
+        try:
+            await conn.connect()
+            _, result = await conn.executeStatement("getActorProfile", actor_id)
+            await conn.commit()
+            profile = cacheFirst(actor_profiles, cacheKey(actor_id), result, actorValues, stamp)
+        except Exception:
+            profile = None
+        finally:
+            await conn.close()
+    return asActor(profile)
+
+
+async def addMovie(movie: Movie) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    return_value = ReturnValue.OK
+    try:
+        await conn.connect()
+        await conn.executeStatement("addMovie", movie.getMovieName(), movie.getYear(), movie.getGenre())
+        await conn.commit()
+    except Exception as e:
+        return_value = errorValue(e, add_errors)
+    finally:
+        await conn.close()
+    if return_value == ReturnValue.OK:
+        movie_profiles.invalidate((movie.getMovieName(), cacheKey(movie.getYear())))
+    return return_value
+
+
+async def deleteMovie(movie_name: str, year: int) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    return_value = ReturnValue.OK
+    try:
+        await conn.connect()
+        rows_effected, touched = await conn.executeStatement("deleteMovie", movie_name, year)
+        await conn.commit()
+        if rows_effected == 0:
+            return_value = ReturnValue.NOT_EXISTS
+    except Exception as e:
+        return_value = ReturnValue.ERROR
+    finally:
+        await conn.close()
+    if return_value == ReturnValue.OK:
+        movie_profiles.invalidate((movie_name, cacheKey(year)))
+        forgetRatings(touched)
+    return return_value
+
+
+async def getMovieProfile(movie_name: str, year: int) -> Movie:
+    profile = movie_profiles.get((movie_name, cacheKey(year)))
+    if profile is MISSING:
+        conn = Connector.AsyncDBConnector()
+        stamp = movie_profiles.stamp()
+        try:
+            await conn.connect()
+            _, result = await conn.executeStatement("getMovieProfile", movie_name, year)
+            await conn.commit()
+            profile = cacheFirst(movie_profiles, (movie_name, cacheKey(year)), result, movieValues, stamp)
+        except Exception:
+            profile = None
+        finally:
+            await conn.close()
+    return asMovie(profile)
+
+
+async def addStudio(studio: Studio) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    return_value = ReturnValue.OK
+    try:
+        await conn.connect()
+        await conn.executeStatement("addStudio", studio.getStudioID(), studio.getStudioName())
+        await conn.commit()
+    except Exception as e:
+        return_value = errorValue(e, add_errors)
+    finally:
+        await conn.close()
+    if return_value == ReturnValue.OK:
+        studio_profiles.invalidate(cacheKey(studio.getStudioID()))
+    return return_value
+
+
+async def deleteStudio(studio_id: int) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    return_value = ReturnValue.OK
+    try:
+        await conn.connect()
+        rows_effected, _ = await conn.executeStatement("deleteStudio", studio_id)
+        await conn.commit()
+        if rows_effected == 0:
+            return_value = ReturnValue.NOT_EXISTS
+    except Exception as e:
+        return_value = ReturnValue.ERROR
+    finally:
+        await conn.close()
+    if return_value == ReturnValue.OK:
+        studio_profiles.invalidate(cacheKey(studio_id))
+    return return_value
+
+
+async def getStudioProfile(studio_id: int) -> Studio:
+    profile = studio_profiles.get(cacheKey(studio_id))
+    if profile is MISSING:
+        conn = Connector.AsyncDBConnector()
+        stamp = studio_profiles.stamp()
+        try:
+            await conn.connect()
+            _, result = await conn.executeStatement("getStudioProfile", studio_id)
+            await conn.commit()
+            profile = cacheFirst(studio_profiles, cacheKey(studio_id), result, studioValues, stamp)
+        except Exception:
+            profile = None
+        finally:
+            await conn.close()
+    return asStudio(profile)
+
+
+async def criticRatedMovie(movieName: str, movieYear: int, critic_id: int, rating: int) -> ReturnValue:
+    result = ReturnValue.OK
+    conn = Connector.AsyncDBConnector()
+    try:
+        await conn.connect()
+        _, touched = await conn.executeStatement("criticRatedMovie", movieName, movieYear, critic_id, rating)
+        forgetRatings(touched)
+    except Exception as e:
+        result = errorValue(e, insert_errors)
+    finally:
+        await conn.close()
+    return result
+
+
+async def criticDidntRateMovie(movieName: str, movieYear: int, critic_id: int) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    rows_effected, result = 0, ReturnValue.OK
+    try:
+        await conn.connect()
+        rows_effected, touched = await conn.executeStatement("criticDidntRateMovie", movieName, movieYear, critic_id)
+        forgetRatings(touched)
+    except Exception as e:
+        result = errorValue(e, remove_errors)
+    finally:
+        await conn.close()
+    return removedValue(result, rows_effected)
+
+
+async def actorPlayedInMovie(movieName: str, movieYear: int, actorID: int, salary: int,
+                             roles: List[str]) -> ReturnValue:
+    if not validRoles(roles):
+        return ReturnValue.BAD_PARAMS
+    conn = Connector.AsyncDBConnector()
+    result = ReturnValue.OK
+    try:
+        await conn.connect()
+        await conn.executeStatement("actorPlayedInMovie", movieName, movieYear, actorID, salary, list(roles))
+        forgetActorRatings(actorID)
+    except Exception as e:
+        result = errorValue(e, insert_errors)
+    finally:
+        await conn.close()
+    return result
+
+
+async def actorDidntPlayInMovie(movieName: str, movieYear: int, actorID: int) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    rows_effected, result = 0, ReturnValue.OK
+    try:
+        await conn.connect()
+        # the actor's roles in the movie are removed with the job (ON DELETE CASCADE)
+        rows_effected, _ = await conn.executeStatement("actorDidntPlayInMovie", movieName, movieYear, actorID)
+        if rows_effected > 0:
+            forgetActorRatings(actorID)
+    except Exception as e:
+        result = errorValue(e, remove_errors)
+    finally:
+        await conn.close()
+    return removedValue(result, rows_effected)
+
+
+async def studioProducedMovie(studioID: int, movieName: str, movieYear: int, budget: int, revenue: int) -> ReturnValue:
+    result = ReturnValue.OK
+    conn = Connector.AsyncDBConnector()
+    try:
+        await conn.connect()
+        rows_effected, _ = await conn.executeStatement("studioProducedMovie", studioID, movieName, movieYear,
+                                                       budget, revenue)
+    except Exception as e:
+        result = errorValue(e, insert_errors)
+    finally:
+        await conn.close()
+    return result
+
+
+async def studioDidntProduceMovie(studioID: int, movieName: str, movieYear: int) -> ReturnValue:
+    conn = Connector.AsyncDBConnector()
+    rows_effected, result = 0, ReturnValue.OK
+    try:
+        await conn.connect()
+        rows_effected, _ = await conn.executeStatement("studioDidntProduceMovie", studioID, movieName, movieYear)
+    except Exception as e:
+        result = errorValue(e, remove_errors)
+    finally:
+        await conn.close()
+    return removedValue(result, rows_effected)
+
+
+# the bulk deletes of Solution.py, chunk by chunk with the same statements and the same (OK / ERROR, rejected) result
+async def _bulkDelete(keys: List, chunk_size: int, statement: str, valid, params, deleted, forget) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    rejected = []
+    for start, chunk, sent in deleteChunks(keys, valid, chunk_size):
+        removed = Connector.ResultSet()
+        if sent:
+            conn = Connector.AsyncDBConnector()
+            try:
+                await conn.connect()
+                _, removed = await conn.executeStatement(statement, *params(sent))
+                await conn.commit()
+            except Exception as e:
+                rejected.extend((position, ReturnValue.ERROR) for position in range(start, len(keys)))
+                return ReturnValue.ERROR, rejected
+            finally:
+                await conn.close()
+        forget(removed)
+        rejected.extend(notDeleted(start, chunk, removed, deleted))
+    return ReturnValue.OK, rejected
+
+
+async def deleteCritics(critic_ids: Iterable[int], chunk_size: int = 1000) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return await _bulkDelete([cacheKey(critic_id) for critic_id in critic_ids], chunk_size, *critic_deletes)
+
+
+async def deleteActors(actor_ids: Iterable[int], chunk_size: int = 1000) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return await _bulkDelete([cacheKey(actor_id) for actor_id in actor_ids], chunk_size, *actor_deletes)
+
+
+async def deleteMovies(movies: Iterable[Tuple[str, int]], chunk_size: int = 1000) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return await _bulkDelete([(movie_name, cacheKey(year)) for movie_name, year in movies], chunk_size,
+                             *movie_deletes)
+
+
+async def deleteStudios(studio_ids: Iterable[int], chunk_size: int = 1000) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return await _bulkDelete([cacheKey(studio_id) for studio_id in studio_ids], chunk_size, *studio_deletes)
+
+
+# ---------------------------------- BATCH API: ----------------------------------
+async def getActorProfiles(actor_ids: Iterable[int]) -> List[Actor]:
+    keys = [cacheKey(actor_id) for actor_id in actor_ids]
+    profiles, missing = cachedBatch(actor_profiles, keys, validID)
+    if missing:
+        conn = Connector.AsyncDBConnector()
+        stamp = actor_profiles.stamp()
+        try:
+            await conn.connect()
+            _, result = await conn.executeStatement("getActorProfiles", missing)
+            await conn.commit()
+            cacheFound(actor_profiles, profiles, missing, foundActors(result), stamp)
+        except Exception:
+            pass
+        finally:
+            await conn.close()
+    return [asActor(profiles.get(key)) for key in keys]
+
+
+async def getMovieProfiles(movies: Iterable[Tuple[str, int]]) -> List[Movie]:
+    keys = [(movie_name, cacheKey(year)) for movie_name, year in movies]
+    profiles, missing = cachedBatch(movie_profiles, keys, validMovieKey)
+    if missing:
+        conn = Connector.AsyncDBConnector()
+        stamp = movie_profiles.stamp()
+        try:
+            await conn.connect()
+            _, result = await conn.executeStatement("getMovieProfiles", [name for name, _ in missing],
+                                                    [year for _, year in missing])
+            await conn.commit()
+            cacheFound(movie_profiles, profiles, missing, foundMovies(result), stamp)
+        except Exception:
+            pass
+        finally:
+            await conn.close()
+    return [asMovie(profiles.get(key)) for key in keys]
+
+
+async def averageRatings(movies: Iterable[Tuple[str, int]]) -> List[float]:
+    keys = [(movie_name, cacheKey(year)) for movie_name, year in movies]
+    ratings, missing = cachedBatch(movie_ratings, keys, validMovieKey)
+    if missing:
+        conn = Connector.AsyncDBConnector()
+        stamp = movie_ratings.stamp()
+        try:
+            await conn.connect()
+            _, result = await conn.executeStatement("averageRatings", [name for name, _ in missing],
+                                                    [year for _, year in missing])
+            await conn.commit()
+            cacheFound(movie_ratings, ratings, missing, foundRatings(result), stamp, 0.0)
+        except Exception:
+            pass
+        finally:
+            await conn.close()
+    return [ratings.get(key, 0) for key in keys]
+
+
+# ---------------------------------- BASIC API: ----------------------------------
+async def averageRating(movieName: str, movieYear: int) -> float:
+    key = (movieName, cacheKey(movieYear))
+    cached = movie_ratings.get(key)
+    if cached is not MISSING:
+        return cached
+    stamp = movie_ratings.stamp()
+    conn = Connector.AsyncDBConnector()
+    output = 0
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("averageRating", movieName, movieYear)
+        output = ratingValue(result)
+        movie_ratings.put(key, output, stamp)
+    except Exception as e:
+        output = 0
+    finally:
+        await conn.close()
+    return output
+
+
+async def averageActorRating(actorID: int) -> float:
+    cached = actor_ratings.get(cacheKey(actorID))
+    if cached is not MISSING:
+        return cached
+    stamp = actor_ratings.stamp()
+    conn = Connector.AsyncDBConnector()
+    avg = 0
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("averageActorRating", actorID)
+        await conn.commit()
+        avg = actorRatingValue(result)
+        actor_ratings.put(cacheKey(actorID), avg, stamp)
+    except DatabaseException.ConnectionInvalid as e:
+        avg = 0
+    except Exception as e:
+        await conn.rollback()
+        avg = 0
+    finally:
+        await conn.close()
+    return avg
+
+
+async def bestPerformance(actor_id: int) -> Movie:
+    best = best_performances.get(cacheKey(actor_id))
+    if best is MISSING:
+        conn = Connector.AsyncDBConnector()
+        stamp = best_performances.stamp()
+        try:
+            await conn.connect()
+            _, result = await conn.executeStatement("bestPerformance", actor_id)
+            await conn.commit()
+            best = cacheFirst(best_performances, cacheKey(actor_id), result, movieValues, stamp)
+        except Exception:
+            best = None
+        finally:
+            await conn.close()
+    return asMovie(best)
+
+
+async def stageCrewBudget(movieName: str, movieYear: int) -> int:
+    conn = Connector.AsyncDBConnector()
+    budget = -1
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("stageCrewBudget", movieName, movieYear)
+        await conn.commit()
+        budget = budgetValue(result)
+    except Exception as e:
+        budget = -1
+    finally:
+        await conn.close()
+    return budget
+
+
+async def overlyInvestedInMovie(movie_name: str, movie_year: int, actor_id: int) -> bool:
+    conn = Connector.AsyncDBConnector()
+    invested = False
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("overlyInvestedInMovie", movie_name, movie_year, actor_id)
+        await conn.commit()
+        invested = investedValue(result)
+    except Exception as e:
+        invested = False
+    finally:
+        await conn.close()
+    return invested
+
+
+# ---------------------------------- ADVANCED API: ----------------------------------
+
+
+# top: only the first top rows, read like a page
+async def franchiseRevenue(top: int = None) -> List[Tuple[str, int]]:
+    if top is not None:
+        return (await franchiseRevenuePage(top))[0]
+    conn = Connector.AsyncDBConnector()
+    grouped_revenues = []
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("franchiseRevenue")
+        grouped_revenues = franchiseRows(result)
+    except Exception as e:
+        print(e)
+        grouped_revenues = []
+    finally:
+        await conn.close()
+    return grouped_revenues
+
+
+async def studioRevenueByYear(top: int = None) -> List[Tuple[int, int, int]]:
+    if top is not None:
+        return (await studioRevenueByYearPage(top))[0]
+    conn = Connector.AsyncDBConnector()
+    grouped_revenues = []
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("studioRevenueByYear")
+        grouped_revenues = studioRevenueRows(result)
+    except Exception as e:
+        print(e)
+        grouped_revenues = []
+    finally:
+        await conn.close()
+    return grouped_revenues
+
+
+# like Solution.franchiseRevenuePage / studioRevenueByYearPage, the tokens of both APIs are interchangeable
+async def franchiseRevenuePage(page_size: int, token: str = None) -> Tuple[List[Tuple[str, int]], Union[str, None]]:
+    if page_size < 1:
+        return [], None
+    conn = Connector.AsyncDBConnector()
+    page, next_token = [], None
+    try:
+        await conn.connect()
+        if token is None:
+            _, result = await conn.executeStatement("franchiseRevenueTop", page_size + 1)
+        else:
+            _, result = await conn.executeStatement("franchiseRevenueAfter", page_size + 1,
+                                                    *pageKey("franchiseRevenue", token))
+        page, next_token = pageOf(franchiseRows(result), page_size, "franchiseRevenue", 1)
+    except Exception as e:
+        print(e)
+        page, next_token = [], None
+    finally:
+        await conn.close()
+    return page, next_token
+
+
+async def studioRevenueByYearPage(page_size: int, token: str = None) \
+        -> Tuple[List[Tuple[int, int, int]], Union[str, None]]:
+    if page_size < 1:
+        return [], None
+    conn = Connector.AsyncDBConnector()
+    page, next_token = [], None
+    try:
+        await conn.connect()
+        if token is None:
+            _, result = await conn.executeStatement("studioRevenueByYearTop", page_size + 1)
+        else:
+            _, result = await conn.executeStatement("studioRevenueByYearAfter", page_size + 1,
+                                                    *pageKey("studioRevenueByYear", token))
+        page, next_token = pageOf(studioRevenueRows(result), page_size, "studioRevenueByYear", 2)
+    except Exception as e:
+        print(e)
+        page, next_token = [], None
+    finally:
+        await conn.close()
+    return page, next_token
+
+
+async def getFanCritics() -> List[Tuple[int, int]]:
+    conn = Connector.AsyncDBConnector()
+    fan_critics = []
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("getFanCritics")
+        await conn.commit()
+        fan_critics = fanCriticRows(result)
+    except Exception as e:
+        print(e)
+        fan_critics = []
+    finally:
+        await conn.close()
+    return fan_critics
+
+
+async def averageAgeByGenre() -> List[Tuple[str, float]]:
+    conn = Connector.AsyncDBConnector()
+    avg_by_genre = []
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("averageAgeByGenre")
+        await conn.commit()
+        avg_by_genre = genreAgeRows(result)
+    except Exception as e:
+        print(e)
+        avg_by_genre = []
+    finally:
+        await conn.close()
+    return avg_by_genre
+
+
+async def getExclusiveActors() -> List[Tuple[int, int]]:
+    conn = Connector.AsyncDBConnector()
+    exclusive_actors = []
+    try:
+        await conn.connect()
+        _, result = await conn.executeStatement("getExclusiveActors")
+        await conn.commit()
+        exclusive_actors = exclusiveActorRows(result)
+    except Exception as e:
+        print(e)
+        exclusive_actors = []
+    finally:
+        await conn.close()
+    return exclusive_actors
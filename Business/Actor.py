@@ -1,4 +1,7 @@
 class Actor:
+    # no per-instance __dict__, lookups return many of them
+    __slots__ = ('__id', '__name', '__age', '__height')
+
     def __init__(self, actor_id=None, actor_name=None, age=None, height=None):
         self.__id = actor_id
         self.__name = actor_name
@@ -34,9 +37,15 @@ class Actor:
         return Actor()
 
     def __eq__(self, other):
+        if not isinstance(other, Actor):
+            return NotImplemented
         return self.__id == other.__id and self.__name == other.__name and self.__age == other.__age and\
                self.__height == other.__height
 
+    # equal objects hash alike, do not change one while it is a set member or a dict key
+    def __hash__(self):
+        return hash((self.__id, self.__name, self.__age, self.__height))
+
     def __str__(self):
         return str("ActorID=" + str(self.__id) + ", ActorName=" + str(self.__name) + ", Age=" + str(self.__age) + ", Height=" +
               str(self.__height))
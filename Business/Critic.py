@@ -1,4 +1,7 @@
 class Critic:
+    # no per-instance __dict__, lookups return many of them
+    __slots__ = ('__id', '__name')
+
     def __init__(self,critic_id=None, critic_name=None):
         self.__id = critic_id
         self.__name = critic_name
@@ -21,8 +24,14 @@ class Critic:
         return Critic()
 
     def __eq__(self, other):
+        if not isinstance(other, Critic):
+            return NotImplemented
         return self.__name == other.__name and self.__id == other.__id
 
+    # equal objects hash alike, do not change one while it is a set member or a dict key
+    def __hash__(self):
+        return hash((self.__id, self.__name))
+
     def __str__(self):
-        str("CriticName=" + str(self.__name) + ", CriticID=" + str(self.__id))
+        return str("CriticName=" + str(self.__name) + ", CriticID=" + str(self.__id))
 
@@ -1,4 +1,7 @@
 class Movie:
+    # no per-instance __dict__, lookups return many of them
+    __slots__ = ('__name', '__year', '__genre')
+
     def __init__(self, movie_name=None, year=None, genre=None):
         self.__name = movie_name
         self.__year = year
@@ -30,7 +33,13 @@ class Movie:
         return self.__name is None and self.__year is None and self.__genre is None
 
     def __eq__(self, other):
+        if not isinstance(other, Movie):
+            return NotImplemented
         return self.__name == other.__name and self.__year == other.__year and self.__genre == other.__genre
 
+    # equal objects hash alike, do not change one while it is a set member or a dict key
+    def __hash__(self):
+        return hash((self.__name, self.__year, self.__genre))
+
     def __str__(self):
-        str("MovieName=" + str(self.__name) + ", Year=" + str(self.__year) + ", Genre=" + str(self.__genre))
+        return str("MovieName=" + str(self.__name) + ", Year=" + str(self.__year) + ", Genre=" + str(self.__genre))
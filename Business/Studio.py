@@ -1,4 +1,7 @@
 class Studio():
+    # no per-instance __dict__, lookups return many of them
+    __slots__ = ('__id', '__name')
+
     def __init__(self,studio_id=None, studio_name=None):
         self.__id = studio_id
         self.__name = studio_name
@@ -22,7 +25,13 @@ class Studio():
         return Studio()
 
     def __eq__(self, other):
+        if not isinstance(other, Studio):
+            return NotImplemented
         return self.__name == other.__name and self.__id == other.__id
 
+    # equal objects hash alike, do not change one while it is a set member or a dict key
+    def __hash__(self):
+        return hash((self.__id, self.__name))
+
     def __str__(self):
-        str("StudioName=" + str(self.__name) + ", StudioID=" + str(self.__id))
\ No newline at end of file
+        return str("StudioName=" + str(self.__name) + ", StudioID=" + str(self.__id))
\ No newline at end of file
@@ -1,7 +1,11 @@
-from typing import List, Tuple
+import base64
+import json
+import time
+from typing import Dict, Iterable, List, Tuple, Union
 from psycopg2 import sql
 
 import Utility.DBConnector as Connector
+from Utility.Cache import Cache, MISSING
 from Utility.ReturnValue import ReturnValue
 from Utility.Exceptions import DatabaseException
 
@@ -11,15 +15,701 @@ from Business.Critic import Critic
 from Business.Actor import Actor
 
 
+# ---------------------------------- STATEMENTS: ----------------------------------
+# every fixed query shape used below, named after the function that runs it.
+# DBConnector PREPAREs each one once per pooled connection and afterwards only EXECUTEs it with bound parameters
+
+Connector.DBConnector.registerStatement("addCritic",
+                                        "INSERT INTO Critics "
+                                        "VALUES($1, $2);")
+# the statements that change ratings return the (movieName, movie_year, actorID) whose cached aggregates they
+# made stale, with a NULL actorID for a movie without actors, and no rows when they changed nothing.
+# the outer SELECT still sees the reviews and jobs the cascades remove, all parts of a statement share one snapshot
+Connector.DBConnector.registerStatement("deleteCritic",
+                                        "WITH Removed AS ("
+                                        "    DELETE FROM Critics "
+                                        "    WHERE criticID = $1 "
+                                        "    RETURNING criticID) "
+                                        "SELECT R.movieName, R.movie_year, AJ.actorID "
+                                        "FROM Removed D LEFT OUTER JOIN Reviews R ON R.criticID = D.criticID "
+                                        "LEFT OUTER JOIN ActingJobs AJ "
+                                        "ON AJ.movieName = R.movieName AND AJ.movie_year = R.movie_year;")
+Connector.DBConnector.registerStatement("getCriticProfile",
+                                        "SELECT * "
+                                        "FROM Critics "
+                                        "WHERE criticID = $1;")
+Connector.DBConnector.registerStatement("addActor",
+                                        "INSERT INTO Actors "
+                                        "VALUES($1, $2, $3, $4);")
+Connector.DBConnector.registerStatement("deleteActor",
+                                        "DELETE FROM Actors "
+                                        "WHERE actorID = $1;")
+Connector.DBConnector.registerStatement("getActorProfile",
+                                        "SELECT * "
+                                        "FROM Actors "
+                                        "WHERE actorID = $1;")
+Connector.DBConnector.registerStatement("addMovie",
+                                        "INSERT INTO Movies "
+                                        "VALUES($1, $2, $3);")
+Connector.DBConnector.registerStatement("deleteMovie",
+                                        "WITH Removed AS ("
+                                        "    DELETE FROM Movies "
+                                        "    WHERE (movieName = $1 AND movie_year = $2) "
+                                        "    RETURNING movieName, movie_year) "
+                                        "SELECT D.movieName, D.movie_year, AJ.actorID "
+                                        "FROM Removed D LEFT OUTER JOIN ActingJobs AJ "
+                                        "ON AJ.movieName = D.movieName AND AJ.movie_year = D.movie_year;")
+Connector.DBConnector.registerStatement("getMovieProfile",
+                                        "SELECT * "
+                                        "FROM Movies "
+                                        "WHERE (movieName = $1 AND movie_year = $2);")
+Connector.DBConnector.registerStatement("addStudio",
+                                        "INSERT INTO Studios "
+                                        "VALUES($1, $2);")
+Connector.DBConnector.registerStatement("deleteStudio",
+                                        "DELETE FROM Studios "
+                                        "WHERE studioID = $1;")
+Connector.DBConnector.registerStatement("getStudioProfile",
+                                        "SELECT * "
+                                        "FROM Studios "
+                                        "WHERE studioID = $1;")
+Connector.DBConnector.registerStatement("criticRatedMovie",
+                                        "WITH Added AS ("
+                                        "    INSERT INTO Reviews(movieName, movie_year, criticID, review_rating) "
+                                        "    VALUES($1, $2, $3, $4) "
+                                        "    RETURNING movieName, movie_year) "
+                                        "SELECT A.movieName, A.movie_year, AJ.actorID "
+                                        "FROM Added A LEFT OUTER JOIN ActingJobs AJ "
+                                        "ON AJ.movieName = A.movieName AND AJ.movie_year = A.movie_year;")
+Connector.DBConnector.registerStatement("criticDidntRateMovie",
+                                        "WITH Removed AS ("
+                                        "    DELETE "
+                                        "    FROM Reviews "
+                                        "    WHERE movieName = $1 AND movie_year = $2 AND criticID = $3 "
+                                        "    RETURNING movieName, movie_year) "
+                                        "SELECT D.movieName, D.movie_year, AJ.actorID "
+                                        "FROM Removed D LEFT OUTER JOIN ActingJobs AJ "
+                                        "ON AJ.movieName = D.movieName AND AJ.movie_year = D.movie_year;")
+# the job and its roles go in with one statement, so they are committed together
+Connector.DBConnector.registerStatement("actorPlayedInMovie",
+                                        "WITH Job AS ("
+                                        "    INSERT INTO ActingJobs(job_salary, movieName, movie_year, actorID) "
+                                        "    VALUES($4, $1, $2, $3) "
+                                        "    RETURNING movieName, movie_year, actorID) "
+                                        "INSERT INTO Roles(roleName, movieName, movie_year, actorID) "
+                                        "SELECT R.roleName, Job.movieName, Job.movie_year, Job.actorID "
+                                        "FROM Job, unnest($5::TEXT[]) AS R(roleName);")
+Connector.DBConnector.registerStatement("actorDidntPlayInMovie",
+                                        "DELETE "
+                                        "FROM ActingJobs "
+                                        "WHERE movieName = $1 AND movie_year = $2 AND actorID = $3;")
+Connector.DBConnector.registerStatement("studioProducedMovie",
+                                        "INSERT INTO Productions(production_budget, production_revenue, studioID, "
+                                        "                        movieName, movie_year) "
+                                        "VALUES($4, $5, $1, $2, $3);")
+Connector.DBConnector.registerStatement("studioDidntProduceMovie",
+                                        "DELETE "
+                                        "FROM Productions "
+                                        "WHERE movieName = $2 AND movie_year = $3 AND studioID = $1;")
+# the ratings are read from MovieRatings, which only has the movies with reviews
+Connector.DBConnector.registerStatement("averageRating",
+                                        "SELECT rating_sum::FLOAT / rating_count "
+                                        "FROM MovieRatings "
+                                        "WHERE movieName = $1 AND movie_year = $2;")
+# a movie without reviews counts as rated 0
+Connector.DBConnector.registerStatement("averageActorRating",
+                                        "SELECT COALESCE(AVG(COALESCE(MR.rating_sum::FLOAT / MR.rating_count, 0)), 0) "
+                                        "AS avg "
+                                        "FROM ActingJobs AJ LEFT OUTER JOIN MovieRatings MR "
+                                        "ON AJ.movieName = MR.movieName AND AJ.movie_year = MR.movie_year "
+                                        "WHERE AJ.actorID = $1;")
+Connector.DBConnector.registerStatement("bestPerformance",
+                                        "SELECT M.movieName, M.movie_year, M.movie_genre "
+                                        "FROM ActingJobs AJ INNER JOIN Movies M "
+                                        "ON AJ.movieName = M.movieName AND AJ.movie_year = M.movie_year "
+                                        "LEFT OUTER JOIN MovieRatings MR "
+                                        "ON AJ.movieName = MR.movieName AND AJ.movie_year = MR.movie_year "
+                                        "WHERE AJ.actorID = $1 "
+                                        "ORDER BY COALESCE(MR.rating_sum::FLOAT / MR.rating_count, 0) DESC, "
+                                        "         M.movie_year ASC, M.movieName DESC "
+                                        "LIMIT 1;")
+# a movie no studio produced has a budget of 0
+Connector.DBConnector.registerStatement("stageCrewBudget",
+                                        "SELECT COALESCE((SELECT P.production_budget "
+                                        "                 FROM Productions P "
+                                        "                 WHERE P.movieName = M.movieName "
+                                        "                 AND P.movie_year = M.movie_year), 0) "
+                                        "     - COALESCE((SELECT SUM(AJ.job_salary) "
+                                        "                 FROM ActingJobs AJ "
+                                        "                 WHERE AJ.movieName = M.movieName "
+                                        "                 AND AJ.movie_year = M.movie_year), 0) AS budget "
+                                        "FROM Movies M "
+                                        "WHERE M.movieName = $1 AND M.movie_year = $2;")
+Connector.DBConnector.registerStatement("overlyInvestedInMovie",
+                                        "SELECT COUNT(*) FILTER (WHERE actorID = $3) > 0 "
+                                        "       AND COUNT(*) FILTER (WHERE actorID = $3) * 2 >= COUNT(*) AS invested "
+                                        "FROM Roles "
+                                        "WHERE movieName = $1 AND movie_year = $2;")
+Connector.DBConnector.registerStatement("franchiseRevenue",
+                                        "SELECT "
+                                        "M1.movieName, COALESCE(SUM(P1.production_revenue),0) AS tot_revenue "
+                                        "FROM (Productions P1 RIGHT OUTER JOIN Movies M1 "
+                                        "ON (P1.movieName = M1.movieName AND P1.movie_year = M1.movie_year)) "
+                                        "GROUP BY M1.movieName "
+                                        "ORDER BY M1.movieName DESC;")
+Connector.DBConnector.registerStatement("studioRevenueByYear",
+                                        "SELECT studioID, movie_year, SUM(production_revenue) AS tot_revenue "
+                                        "FROM Productions "
+                                        "GROUP BY studioID, movie_year "
+                                        "ORDER BY studioID DESC, movie_year DESC;")
+# pages of the two above in the same order, $1 rows at most (Top) or the rows after a key (After): the key is
+# compared with the ORDER BY columns, so the scan starts where the previous page ended instead of skipping rows
+Connector.DBConnector.registerStatement("franchiseRevenueTop",
+                                        "SELECT M.movieName, COALESCE(SUM(P.production_revenue), 0) AS tot_revenue "
+                                        "FROM (SELECT DISTINCT movieName FROM Movies "
+                                        "      ORDER BY movieName DESC LIMIT $1) M "
+                                        "LEFT OUTER JOIN Productions P ON P.movieName = M.movieName "
+                                        "GROUP BY M.movieName "
+                                        "ORDER BY M.movieName DESC;")
+Connector.DBConnector.registerStatement("franchiseRevenueAfter",
+                                        "SELECT M.movieName, COALESCE(SUM(P.production_revenue), 0) AS tot_revenue "
+                                        "FROM (SELECT DISTINCT movieName FROM Movies WHERE movieName < $2 "
+                                        "      ORDER BY movieName DESC LIMIT $1) M "
+                                        "LEFT OUTER JOIN Productions P ON P.movieName = M.movieName "
+                                        "GROUP BY M.movieName "
+                                        "ORDER BY M.movieName DESC;")
+Connector.DBConnector.registerStatement("studioRevenueByYearTop",
+                                        "SELECT studioID, movie_year, SUM(production_revenue) AS tot_revenue "
+                                        "FROM Productions "
+                                        "GROUP BY studioID, movie_year "
+                                        "ORDER BY studioID DESC, movie_year DESC "
+                                        "LIMIT $1;")
+Connector.DBConnector.registerStatement("studioRevenueByYearAfter",
+                                        "SELECT studioID, movie_year, SUM(production_revenue) AS tot_revenue "
+                                        "FROM Productions "
+                                        "WHERE (studioID, movie_year) < ($2, $3) "
+                                        "GROUP BY studioID, movie_year "
+                                        "ORDER BY studioID DESC, movie_year DESC "
+                                        "LIMIT $1;")
+# a critic is a fan of a studio when they reviewed as many of its movies as it produced
+Connector.DBConnector.registerStatement("getFanCritics",
+                                        "SELECT C.criticID, C.studioID "
+                                        "FROM CriticToStudio C INNER JOIN StudioFilms S "
+                                        "ON C.studioID = S.studioID "
+                                        "WHERE C.count1 = S.count2 "
+                                        "ORDER BY C.criticID DESC, C.studioID DESC;")
+Connector.DBConnector.registerStatement("averageAgeByGenre",
+                                        "SELECT movie_genre, age_sum::FLOAT / actor_count AS avg "
+                                        "FROM GenreAges;")
+# every movie the actor played in was produced, and all of them by the same studio
+Connector.DBConnector.registerStatement("getExclusiveActors",
+                                        "SELECT AJ.actorID, MAX(P.studioID) AS studioID "
+                                        "FROM ActingJobs AJ LEFT OUTER JOIN Productions P "
+                                        "ON AJ.movieName = P.movieName AND AJ.movie_year = P.movie_year "
+                                        "GROUP BY AJ.actorID "
+                                        "HAVING COUNT(P.studioID) = COUNT(*) AND COUNT(DISTINCT P.studioID) = 1 "
+                                        "ORDER BY AJ.actorID DESC;")
+
+
+# bulk loads COPY rows into a session-local staging table, then insert every acceptable row in one statement and
+# report the rest by position (seq): BAD_PARAMS for rows breaking a NOT NULL or CHECK constraint of the target
+# table, ALREADY_EXISTS for keys that are already stored or repeat an earlier row of the same batch
+Connector.DBConnector.registerStatement("addCritics",
+                                        "WITH Valid AS ("
+                                        "    SELECT L.seq, L.criticID, L.critic_name, "
+                                        "           ROW_NUMBER() OVER (PARTITION BY L.criticID ORDER BY L.seq) AS copy "
+                                        "    FROM critics_load L "
+                                        "    WHERE L.criticID > 0 AND L.critic_name IS NOT NULL), "
+                                        "Loaded AS ("
+                                        "    INSERT INTO Critics "
+                                        "    SELECT V.criticID, V.critic_name FROM Valid V WHERE V.copy = 1 "
+                                        "    ON CONFLICT DO NOTHING "
+                                        "    RETURNING criticID) "
+                                        "SELECT L.seq, CASE WHEN V.seq IS NULL THEN 'BAD_PARAMS' "
+                                        "                   ELSE 'ALREADY_EXISTS' END AS outcome "
+                                        "FROM critics_load L LEFT OUTER JOIN Valid V ON L.seq = V.seq "
+                                        "LEFT OUTER JOIN Loaded D ON V.copy = 1 AND D.criticID = V.criticID "
+                                        "WHERE D.criticID IS NULL "
+                                        "ORDER BY L.seq;")
+Connector.DBConnector.registerStatement("addActors",
+                                        "WITH Valid AS ("
+                                        "    SELECT L.seq, L.actorID, L.actor_name, L.actor_age, L.actor_height, "
+                                        "           ROW_NUMBER() OVER (PARTITION BY L.actorID ORDER BY L.seq) AS copy "
+                                        "    FROM actors_load L "
+                                        "    WHERE L.actorID > 0 AND L.actor_name IS NOT NULL "
+                                        "    AND L.actor_age > 0 AND L.actor_height > 0), "
+                                        "Loaded AS ("
+                                        "    INSERT INTO Actors "
+                                        "    SELECT V.actorID, V.actor_name, V.actor_age, V.actor_height "
+                                        "    FROM Valid V WHERE V.copy = 1 "
+                                        "    ON CONFLICT DO NOTHING "
+                                        "    RETURNING actorID) "
+                                        "SELECT L.seq, CASE WHEN V.seq IS NULL THEN 'BAD_PARAMS' "
+                                        "                   ELSE 'ALREADY_EXISTS' END AS outcome "
+                                        "FROM actors_load L LEFT OUTER JOIN Valid V ON L.seq = V.seq "
+                                        "LEFT OUTER JOIN Loaded D ON V.copy = 1 AND D.actorID = V.actorID "
+                                        "WHERE D.actorID IS NULL "
+                                        "ORDER BY L.seq;")
+Connector.DBConnector.registerStatement("addMovies",
+                                        "WITH Valid AS ("
+                                        "    SELECT L.seq, L.movieName, L.movie_year, L.movie_genre, "
+                                        "           ROW_NUMBER() OVER (PARTITION BY L.movieName, L.movie_year "
+                                        "                              ORDER BY L.seq) AS copy "
+                                        "    FROM movies_load L "
+                                        "    WHERE L.movieName IS NOT NULL AND L.movie_year >= 1895 "
+                                        "    AND L.movie_genre IN ('Drama', 'Action', 'Comedy', 'Horror')), "
+                                        "Loaded AS ("
+                                        "    INSERT INTO Movies "
+                                        "    SELECT V.movieName, V.movie_year, V.movie_genre FROM Valid V WHERE V.copy = 1 "
+                                        "    ON CONFLICT DO NOTHING "
+                                        "    RETURNING movieName, movie_year) "
+                                        "SELECT L.seq, CASE WHEN V.seq IS NULL THEN 'BAD_PARAMS' "
+                                        "                   ELSE 'ALREADY_EXISTS' END AS outcome "
+                                        "FROM movies_load L LEFT OUTER JOIN Valid V ON L.seq = V.seq "
+                                        "LEFT OUTER JOIN Loaded D "
+                                        "ON V.copy = 1 AND D.movieName = V.movieName AND D.movie_year = V.movie_year "
+                                        "WHERE D.movieName IS NULL "
+                                        "ORDER BY L.seq;")
+Connector.DBConnector.registerStatement("addStudios",
+                                        "WITH Valid AS ("
+                                        "    SELECT L.seq, L.studioID, L.studio_name, "
+                                        "           ROW_NUMBER() OVER (PARTITION BY L.studioID ORDER BY L.seq) AS copy "
+                                        "    FROM studios_load L "
+                                        "    WHERE L.studioID > 0 AND L.studio_name IS NOT NULL), "
+                                        "Loaded AS ("
+                                        "    INSERT INTO Studios "
+                                        "    SELECT V.studioID, V.studio_name FROM Valid V WHERE V.copy = 1 "
+                                        "    ON CONFLICT DO NOTHING "
+                                        "    RETURNING studioID) "
+                                        "SELECT L.seq, CASE WHEN V.seq IS NULL THEN 'BAD_PARAMS' "
+                                        "                   ELSE 'ALREADY_EXISTS' END AS outcome "
+                                        "FROM studios_load L LEFT OUTER JOIN Valid V ON L.seq = V.seq "
+                                        "LEFT OUTER JOIN Loaded D ON V.copy = 1 AND D.studioID = V.studioID "
+                                        "WHERE D.studioID IS NULL "
+                                        "ORDER BY L.seq;")
+
+
+# the relationship loads additionally report NOT_EXISTS for rows whose movie / critic / actor / studio is missing.
+# conflicts are resolved the way inserting the rows one by one in input order would resolve them: a row is
+# ALREADY_EXISTS when its key is stored or an earlier row of the batch with the same key gets stored (first_loaded)
+Connector.DBConnector.registerStatement("criticRatedMovies",
+                                        "WITH Checked AS ("
+                                        "    SELECT L.*, "
+                                        "           EXISTS (SELECT 1 FROM Movies M "
+                                        "                   WHERE M.movieName = L.movieName "
+                                        "                   AND M.movie_year = L.movie_year) "
+                                        "           AND EXISTS (SELECT 1 FROM Critics C "
+                                        "                       WHERE C.criticID = L.criticID) AS known, "
+                                        "           EXISTS (SELECT 1 FROM Reviews R "
+                                        "                   WHERE R.movieName = L.movieName "
+                                        "                   AND R.movie_year = L.movie_year "
+                                        "                   AND R.criticID = L.criticID) AS stored "
+                                        "    FROM reviews_load L "
+                                        "    WHERE L.movieName IS NOT NULL AND L.movie_year >= 1895 "
+                                        "    AND L.criticID IS NOT NULL AND L.review_rating > 0 AND L.review_rating < 6), "
+                                        "Valid AS ("
+                                        "    SELECT C.*, MIN(C.seq) FILTER (WHERE C.known AND NOT C.stored) "
+                                        "                OVER (PARTITION BY C.movieName, C.movie_year, C.criticID) "
+                                        "                AS first_loaded "
+                                        "    FROM Checked C), "
+                                        "Loaded AS ("
+                                        "    INSERT INTO Reviews(movieName, movie_year, criticID, review_rating) "
+                                        "    SELECT V.movieName, V.movie_year, V.criticID, V.review_rating "
+                                        "    FROM Valid V WHERE V.seq = V.first_loaded "
+                                        "    ON CONFLICT DO NOTHING "
+                                        "    RETURNING movieName, movie_year, criticID) "
+                                        "SELECT L.seq, CASE WHEN V.seq IS NULL THEN 'BAD_PARAMS' "
+                                        "                   WHEN V.stored OR V.first_loaded < V.seq THEN 'ALREADY_EXISTS' "
+                                        "                   WHEN NOT V.known THEN 'NOT_EXISTS' "
+                                        "                   ELSE 'ALREADY_EXISTS' END AS outcome "
+                                        "FROM reviews_load L LEFT OUTER JOIN Valid V ON L.seq = V.seq "
+                                        "LEFT OUTER JOIN Loaded D "
+                                        "ON V.seq = V.first_loaded AND D.movieName = V.movieName "
+                                        "AND D.movie_year = V.movie_year AND D.criticID = V.criticID "
+                                        "WHERE D.criticID IS NULL "
+                                        "ORDER BY L.seq;")
+# a job repeating one of its roles is ALREADY_EXISTS, as the Roles key rejects it in actorPlayedInMovie
+Connector.DBConnector.registerStatement("actorPlayedInMovies",
+                                        "WITH Checked AS ("
+                                        "    SELECT L.*, "
+                                        "           EXISTS (SELECT 1 FROM Movies M "
+                                        "                   WHERE M.movieName = L.movieName "
+                                        "                   AND M.movie_year = L.movie_year) "
+                                        "           AND EXISTS (SELECT 1 FROM Actors A "
+                                        "                       WHERE A.actorID = L.actorID) AS known, "
+                                        "           EXISTS (SELECT 1 FROM ActingJobs AJ "
+                                        "                   WHERE AJ.movieName = L.movieName "
+                                        "                   AND AJ.movie_year = L.movie_year "
+                                        "                   AND AJ.actorID = L.actorID) "
+                                        "           OR (SELECT COUNT(DISTINCT R) FROM unnest(L.roles) AS R) "
+                                        "              < cardinality(L.roles) AS stored "
+                                        "    FROM jobs_load L "
+                                        "    WHERE L.movieName IS NOT NULL AND L.movie_year >= 1895 "
+                                        "    AND L.actorID IS NOT NULL AND L.job_salary > 0 "
+                                        "    AND cardinality(L.roles) > 0 AND array_position(L.roles, NULL) IS NULL), "
+                                        "Valid AS ("
+                                        "    SELECT C.*, MIN(C.seq) FILTER (WHERE C.known AND NOT C.stored) "
+                                        "                OVER (PARTITION BY C.movieName, C.movie_year, C.actorID) "
+                                        "                AS first_loaded "
+                                        "    FROM Checked C), "
+                                        "Loaded AS ("
+                                        "    INSERT INTO ActingJobs(job_salary, movieName, movie_year, actorID) "
+                                        "    SELECT V.job_salary, V.movieName, V.movie_year, V.actorID "
+                                        "    FROM Valid V WHERE V.seq = V.first_loaded "
+                                        "    ON CONFLICT DO NOTHING "
+                                        "    RETURNING movieName, movie_year, actorID), "
+                                        "Casting AS ("
+                                        "    INSERT INTO Roles(roleName, movieName, movie_year, actorID) "
+                                        "    SELECT R.roleName, D.movieName, D.movie_year, D.actorID "
+                                        "    FROM Loaded D INNER JOIN Valid V "
+                                        "    ON V.seq = V.first_loaded AND D.movieName = V.movieName "
+                                        "    AND D.movie_year = V.movie_year AND D.actorID = V.actorID, "
+                                        "    unnest(V.roles) AS R(roleName)) "
+                                        "SELECT L.seq, CASE WHEN V.seq IS NULL THEN 'BAD_PARAMS' "
+                                        "                   WHEN V.stored OR V.first_loaded < V.seq THEN 'ALREADY_EXISTS' "
+                                        "                   WHEN NOT V.known THEN 'NOT_EXISTS' "
+                                        "                   ELSE 'ALREADY_EXISTS' END AS outcome "
+                                        "FROM jobs_load L LEFT OUTER JOIN Valid V ON L.seq = V.seq "
+                                        "LEFT OUTER JOIN Loaded D "
+                                        "ON V.seq = V.first_loaded AND D.movieName = V.movieName "
+                                        "AND D.movie_year = V.movie_year AND D.actorID = V.actorID "
+                                        "WHERE D.actorID IS NULL "
+                                        "ORDER BY L.seq;")
+Connector.DBConnector.registerStatement("studioProducedMovies",
+                                        "WITH Checked AS ("
+                                        "    SELECT L.*, "
+                                        "           EXISTS (SELECT 1 FROM Movies M "
+                                        "                   WHERE M.movieName = L.movieName "
+                                        "                   AND M.movie_year = L.movie_year) "
+                                        "           AND EXISTS (SELECT 1 FROM Studios S "
+                                        "                       WHERE S.studioID = L.studioID) AS known, "
+                                        "           EXISTS (SELECT 1 FROM Productions P "
+                                        "                   WHERE P.movieName = L.movieName "
+                                        "                   AND P.movie_year = L.movie_year) AS stored "
+                                        "    FROM productions_load L "
+                                        "    WHERE L.movieName IS NOT NULL AND L.movie_year >= 1895 "
+                                        "    AND L.studioID IS NOT NULL "
+                                        "    AND L.production_budget >= 0 AND L.production_revenue >= 0), "
+                                        "Valid AS ("
+                                        "    SELECT C.*, MIN(C.seq) FILTER (WHERE C.known AND NOT C.stored) "
+                                        "                OVER (PARTITION BY C.movieName, C.movie_year) AS first_loaded "
+                                        "    FROM Checked C), "
+                                        "Loaded AS ("
+                                        "    INSERT INTO Productions(production_budget, production_revenue, studioID, "
+                                        "                            movieName, movie_year) "
+                                        "    SELECT V.production_budget, V.production_revenue, V.studioID, "
+                                        "           V.movieName, V.movie_year "
+                                        "    FROM Valid V WHERE V.seq = V.first_loaded "
+                                        "    ON CONFLICT DO NOTHING "
+                                        "    RETURNING movieName, movie_year) "
+                                        "SELECT L.seq, CASE WHEN V.seq IS NULL THEN 'BAD_PARAMS' "
+                                        "                   WHEN V.stored OR V.first_loaded < V.seq THEN 'ALREADY_EXISTS' "
+                                        "                   WHEN NOT V.known THEN 'NOT_EXISTS' "
+                                        "                   ELSE 'ALREADY_EXISTS' END AS outcome "
+                                        "FROM productions_load L LEFT OUTER JOIN Valid V ON L.seq = V.seq "
+                                        "LEFT OUTER JOIN Loaded D "
+                                        "ON V.seq = V.first_loaded AND D.movieName = V.movieName "
+                                        "AND D.movie_year = V.movie_year "
+                                        "WHERE D.movieName IS NULL "
+                                        "ORDER BY L.seq;")
+# batch lookups, one round trip for any number of keys. The keys missing from the result do not exist
+Connector.DBConnector.registerStatement("getActorProfiles",
+                                        "SELECT * "
+                                        "FROM Actors "
+                                        "WHERE actorID = ANY($1::INTEGER[]);")
+Connector.DBConnector.registerStatement("getMovieProfiles",
+                                        "SELECT M.* "
+                                        "FROM Movies M INNER JOIN unnest($1::TEXT[], $2::INTEGER[]) "
+                                        "AS K(movieName, movie_year) "
+                                        "ON M.movieName = K.movieName AND M.movie_year = K.movie_year;")
+Connector.DBConnector.registerStatement("averageRatings",
+                                        "SELECT MR.movieName, MR.movie_year, "
+                                        "       MR.rating_sum::FLOAT / MR.rating_count AS avg "
+                                        "FROM MovieRatings MR INNER JOIN unnest($1::TEXT[], $2::INTEGER[]) "
+                                        "AS K(movieName, movie_year) "
+                                        "ON MR.movieName = K.movieName AND MR.movie_year = K.movie_year;")
+# bulk deletes, one chunk of keys per statement. They return the deleted keys, the ones of movies and critics
+# together with the (movieName, movie_year, actorID) rows whose ratings changed like deleteMovie / deleteCritic
+Connector.DBConnector.registerStatement("deleteCritics",
+                                        "WITH Removed AS ("
+                                        "    DELETE FROM Critics "
+                                        "    WHERE criticID = ANY($1::INTEGER[]) "
+                                        "    RETURNING criticID) "
+                                        "SELECT D.criticID, R.movieName, R.movie_year, AJ.actorID "
+                                        "FROM Removed D LEFT OUTER JOIN Reviews R ON R.criticID = D.criticID "
+                                        "LEFT OUTER JOIN ActingJobs AJ "
+                                        "ON AJ.movieName = R.movieName AND AJ.movie_year = R.movie_year;")
+Connector.DBConnector.registerStatement("deleteActors",
+                                        "DELETE FROM Actors "
+                                        "WHERE actorID = ANY($1::INTEGER[]) "
+                                        "RETURNING actorID;")
+Connector.DBConnector.registerStatement("deleteMovies",
+                                        "WITH Removed AS ("
+                                        "    DELETE FROM Movies M "
+                                        "    USING unnest($1::TEXT[], $2::INTEGER[]) AS K(movieName, movie_year) "
+                                        "    WHERE M.movieName = K.movieName AND M.movie_year = K.movie_year "
+                                        "    RETURNING M.movieName, M.movie_year) "
+                                        "SELECT D.movieName, D.movie_year, AJ.actorID "
+                                        "FROM Removed D LEFT OUTER JOIN ActingJobs AJ "
+                                        "ON AJ.movieName = D.movieName AND AJ.movie_year = D.movie_year;")
+Connector.DBConnector.registerStatement("deleteStudios",
+                                        "DELETE FROM Studios "
+                                        "WHERE studioID = ANY($1::INTEGER[]) "
+                                        "RETURNING studioID;")
+
+
+# ---------------------------------- CACHES: ----------------------------------
+# profiles by primary key: the values the Business object is rebuilt from, or None when the entity does not exist.
+# the add* / delete* functions invalidate what they change, createTables / clearTables / dropTables clear everything
+critic_profiles = Cache("critic_profiles")
+actor_profiles = Cache("actor_profiles")
+movie_profiles = Cache("movie_profiles")
+studio_profiles = Cache("studio_profiles")
+profile_caches = [critic_profiles, actor_profiles, movie_profiles, studio_profiles]
+# rating aggregates: averageRating by movie, averageActorRating and bestPerformance (values or None) by actor.
+# reviews, jobs and deletes invalidate exactly the movies and actors they affect (see forgetRatings)
+movie_ratings = Cache("movie_ratings")
+actor_ratings = Cache("actor_ratings")
+best_performances = Cache("best_performances")
+rating_caches = [movie_ratings, actor_ratings, best_performances]
+
+
+# ids may arrive as a string Postgres converts (e.g. year="1996"), they must find the same entry as the int
+def cacheKey(value):
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    return value
+
+
+# splits the keys of a batch lookup into the values cached for them and the distinct keys to query,
+# keys that cannot name a row (see validKey) are neither, their lookup misses
+def cachedBatch(cache: Cache, keys: List, valid) -> Tuple[dict, List]:
+    values, missing = {}, {}
+    for key in keys:
+        if key in values or key in missing or not valid(key):
+            continue
+        cached = cache.get(key)
+        if cached is MISSING:
+            missing[key] = None
+        else:
+            values[key] = cached
+    return values, list(missing)
+
+
+# whether an id / a (name, year) key could be stored, one key the database would reject fails the whole batch
+def validID(key) -> bool:
+    return isinstance(key, int) and not isinstance(key, bool) and -2 ** 31 <= key < 2 ** 31
+
+
+def validMovieKey(key) -> bool:
+    return isinstance(key[0], str) and validID(key[1])
+
+
+def _clearCaches():
+    for cache in profile_caches + rating_caches:
+        cache.clear()
+
+
+# invalidates the aggregates named by the (movieName, movie_year, actorID) rows a rating-changing statement returned
+def forgetRatings(result: Connector.ResultSet):
+    for row in result:
+        if row['movieName'] is not None:
+            movie_ratings.invalidate((row['movieName'], row['movie_year']))
+        if row['actorID'] is not None:
+            forgetActorRatings(row['actorID'])
+
+
+def forgetActorRatings(actor_id):
+    actor_ratings.invalidate(cacheKey(actor_id))
+    best_performances.invalidate(cacheKey(actor_id))
+
+
+# ---------------------------------- RESULTS: ----------------------------------
+# what the API makes of its input and of a statement's rows or error. AsyncSolution.py runs the same statements
+# and shares these, so both APIs validate, convert and map errors alike
+
+# the ReturnValue a DatabaseException maps to, by kind of call: add* (CRUD API), the inserts of the basic API
+# (criticRatedMovie, actorPlayedInMovie, studioProducedMovie) and its deletes (criticDidntRateMovie, ...)
+add_errors = {DatabaseException.NOT_NULL_VIOLATION: ReturnValue.BAD_PARAMS,
+              DatabaseException.CHECK_VIOLATION: ReturnValue.BAD_PARAMS,
+              DatabaseException.UNIQUE_VIOLATION: ReturnValue.ALREADY_EXISTS}
+insert_errors = dict(add_errors)
+insert_errors[DatabaseException.FOREIGN_KEY_VIOLATION] = ReturnValue.NOT_EXISTS
+remove_errors = {DatabaseException.NOT_NULL_VIOLATION: ReturnValue.NOT_EXISTS,
+                 DatabaseException.CHECK_VIOLATION: ReturnValue.NOT_EXISTS,
+                 DatabaseException.UNIQUE_VIOLATION: ReturnValue.NOT_EXISTS,
+                 DatabaseException.FOREIGN_KEY_VIOLATION: ReturnValue.NOT_EXISTS}
+
+
+# any other exception (ConnectionInvalid included) is an ERROR
+def errorValue(e: Exception, errors: dict) -> ReturnValue:
+    for error, return_value in errors.items():
+        if isinstance(e, error):
+            return return_value
+    return ReturnValue.ERROR
+
+
+# a delete that went through but matched no row
+def removedValue(return_value: ReturnValue, rows_effected: int) -> ReturnValue:
+    if return_value == ReturnValue.OK and rows_effected == 0:
+        return ReturnValue.NOT_EXISTS
+    return return_value
+
+
+def validRoles(roles: List[str]) -> bool:
+    return roles is not None and len(roles) > 0
+
+
+# the values a Business object is rebuilt from (and cached as), from a row of its table
+def criticValues(row) -> tuple:
+    return int(row['criticID']), str(row['critic_name'])
+
+
+def actorValues(row) -> tuple:
+    return int(row['actorID']), str(row['actor_name']), int(row['actor_age']), int(row['actor_height'])
+
+
+def movieValues(row) -> tuple:
+    return str(row['movieName']), int(row['movie_year']), str(row['movie_genre'])
+
+
+def studioValues(row) -> tuple:
+    return int(row['studioID']), str(row['studio_name'])
+
+
+# the values of the first row of a single-key lookup, None when it found nothing, and caches them under key
+def cacheFirst(cache: Cache, key, result: Connector.ResultSet, values, stamp: int):
+    found = None if result.isEmpty() else values(result[0])
+    cache.put(key, found, stamp)
+    return found
+
+
+def asCritic(values) -> Critic:
+    return Critic.badCritic() if values is None else Critic(*values)
+
+
+def asActor(values) -> Actor:
+    return Actor.badActor() if values is None else Actor(*values)
+
+
+def asMovie(values) -> Movie:
+    return Movie.badMovie() if values is None else Movie(*values)
+
+
+def asStudio(values) -> Studio:
+    return Studio.badStudio() if values is None else Studio(*values)
+
+
+# the rows of a batch lookup by key
+def foundActors(result: Connector.ResultSet) -> dict:
+    return {values[0]: values for values in map(actorValues, result)}
+
+
+def foundMovies(result: Connector.ResultSet) -> dict:
+    return {values[:2]: values for values in map(movieValues, result)}
+
+
+def foundRatings(result: Connector.ResultSet) -> dict:
+    return {(str(row['movieName']), int(row['movie_year'])): float(row['avg']) for row in result}
+
+
+# stores what a batch lookup found for each of the missing keys (see cachedBatch) in values and in the cache,
+# default for the keys it did not find
+def cacheFound(cache: Cache, values: dict, missing: List, found: dict, stamp: int, default=None):
+    for key in missing:
+        values[key] = found.get(key, default)
+        cache.put(key, values[key], stamp)
+
+
+def ratingValue(result: Connector.ResultSet) -> float:
+    output = 0
+    for row in result.rows:
+        for val in row:
+            output = val
+    if output is None:
+        output = 0
+    return float(output)
+
+
+def actorRatingValue(result: Connector.ResultSet) -> float:
+    return 0 if result.isEmpty() else float(result[0]['avg'])
+
+
+def budgetValue(result: Connector.ResultSet) -> int:
+    return -1 if result.isEmpty() else int(result[0]['budget'])
+
+
+def investedValue(result: Connector.ResultSet) -> bool:
+    return False if result.isEmpty() else bool(result[0]['invested'])
+
+
+# the rows of the advanced API, rows may be a ResultSet or a ResultSetStream
+def franchiseRows(rows) -> List[Tuple[str, int]]:
+    return [(row['movieName'], row['tot_revenue']) for row in rows]
+
+
+def studioRevenueRows(rows) -> List[Tuple[int, int, int]]:
+    return [(row['studioID'], row['movie_year'], row['tot_revenue']) for row in rows]
+
+
+def fanCriticRows(rows) -> List[Tuple[int, int]]:
+    return [(row['criticID'], row['studioID']) for row in rows]
+
+
+def genreAgeRows(rows) -> List[Tuple[str, float]]:
+    return [(row['movie_genre'], float(row['avg'])) for row in rows]
+
+
+def exclusiveActorRows(rows) -> List[Tuple[int, int]]:
+    return [(row['actorID'], row['studioID']) for row in rows]
+
+
+# ---------------------------------- TRANSACTIONS: ----------------------------------
+# every call this thread makes inside the with block runs in one transaction, committed once at the end of the block
+# or rolled back if it raises (see Utility/DBConnector.py, Transaction). The calls return the same ReturnValues,
+# to undo the whole block when one is not OK raise from it:
+#
+#     with Solution.transaction():
+#         if Solution.addMovie(movie) != ReturnValue.OK:
+#             raise ValueError("could not add " + movie.getMovieName())
+#         Solution.actorPlayedInMovies(jobs)
+def transaction() -> Connector.Transaction:
+    return Connector.DBConnector.transaction()
+
+
+# ---------------------------------- DIAGNOSTICS: ----------------------------------
+# the statements of the advanced API whose plans change the most as the catalogue grows
+advanced_statements = ("franchiseRevenue", "studioRevenueByYear", "getFanCritics", "averageAgeByGenre",
+                       "getExclusiveActors")
+
+
+# runs every advanced statement once under EXPLAIN ANALYZE (see DBConnector.explainStatements) and returns its
+# QueryPlan by name, plan.warnings lists the sequential scans and sort spills above the thresholds.
+# the diagnostic mode is turned off again afterwards, including for statements explained before the call
+def explainAdvancedAPI(seq_scan_rows: int = 10000, sort_spill_kb: int = 0) -> Dict[str, Connector.QueryPlan]:
+    Connector.DBConnector.explainStatements(*advanced_statements, seq_scan_rows=seq_scan_rows,
+                                            sort_spill_kb=sort_spill_kb)
+    try:
+        franchiseRevenue()
+        studioRevenueByYear()
+        getFanCritics()
+        averageAgeByGenre()
+        getExclusiveActors()
+    finally:
+        Connector.DBConnector.explainStatements()
+    return {name: Connector.DBConnector.lastPlan(name) for name in advanced_statements}
+
+
 # ---------------------------------- CRUD API: ----------------------------------
 
 def createTables():
     conn = None
     try:
         conn = Connector.DBConnector()
-        transaction = sql.SQL("BEGIN;"
-
-                              "CREATE TABLE Critics("
+        transaction = sql.SQL("CREATE TABLE Critics("
                               "criticID INTEGER PRIMARY KEY,"
                               "critic_name TEXT NOT NULL,"
                               "CHECK (criticID > 0));"
@@ -61,15 +751,6 @@ def createTables():
                               "FOREIGN KEY (movieName, movie_year) REFERENCES Movies(movieName, movie_year) ON DELETE CASCADE, "
                               "CONSTRAINT Reviews_key PRIMARY KEY (movieName, movie_year, criticID)); "
 
-                              "CREATE TABLE Roles("
-                              "roleName TEXT NOT NULL, "
-                              "movieName TEXT NOT NULL, "
-                              "movie_year INTEGER NOT NULL CHECK (movie_year >= 1895),"
-                              "actorID INTEGER NOT NULL,"
-                              "FOREIGN KEY (actorID) REFERENCES Actors(actorID) ON DELETE CASCADE, "
-                              "FOREIGN KEY (movieName, movie_year) REFERENCES Movies(movieName, movie_year) ON DELETE CASCADE, "
-                              "CONSTRAINT Roles_key PRIMARY KEY (movieName, movie_year, actorID)); "
-
                               "CREATE TABLE ActingJobs("
                               "job_salary INTEGER NOT NULL CHECK (job_salary > 0), "
                               "movieName TEXT NOT NULL, "
@@ -79,33 +760,247 @@ def createTables():
                               "FOREIGN KEY (movieName,movie_year) REFERENCES Movies(movieName,movie_year) ON DELETE CASCADE,"
                               "CONSTRAINT Jobs_key PRIMARY KEY (movieName, movie_year, actorID));"
 
-                              "CREATE VIEW CriticToStudio AS "
-                              "SELECT V1.studioID, COUNT(*) AS count1 "
-                              "FROM (SELECT R1.criticID, P1.studioID"
-                              "      FROM Productions P1 INNER JOIN Reviews R1"
-                              "      ON P1.movieName = R1.movieName AND P1.movie_year = R1.movie_year) AS V1 "
-                              "GROUP BY V1.criticID, V1.studioID;"
-
-                              "CREATE VIEW StudioFilms AS "
-                              "SELECT V2.studioID, COUNT(*) AS count2 "
-                              "FROM (SELECT P2.studioID, P2.movieName, P2.movie_year "
-                              "      FROM Productions P2) AS V2 "
-                              "GROUP BY V2.studioID;"
-
-                              "CREATE VIEW ActorsToGenre AS "
-                              "SELECT M.movie_genre, AVG(A.actorID)"
-                              "FROM Movies M "
-                              "INNER JOIN ActingJobs AJ "
-                              "ON M.movieName = AJ.movieName "
-                              "AND M.movie_year = AJ.movie_year "
-                              "INNER JOIN Actors A "
-                              "ON A.actorID = AJ.actorID "
-                              "GROUP BY M.movie_genre;").format()
+                              "CREATE TABLE Roles("
+                              "roleName TEXT NOT NULL, "
+                              "movieName TEXT NOT NULL, "
+                              "movie_year INTEGER NOT NULL CHECK (movie_year >= 1895),"
+                              "actorID INTEGER NOT NULL,"
+                              "FOREIGN KEY (movieName, movie_year, actorID) REFERENCES ActingJobs(movieName, movie_year, actorID) ON DELETE CASCADE, "
+                              "CONSTRAINT Roles_key PRIMARY KEY (movieName, movie_year, actorID, roleName)); "
+
+                              # the primary keys all lead with the movie, these cover the lookups and the
+                              # ON DELETE CASCADE scans that start from a critic, an actor or a studio
+                              "CREATE INDEX Reviews_critic_idx ON Reviews(criticID); "
+
+                              "CREATE INDEX Jobs_actor_idx ON ActingJobs(actorID); "
+
+                              "CREATE INDEX Productions_studio_idx ON Productions(studioID, movie_year); "
+
+                              # summaries for the advanced API, kept up to date by the triggers below.
+                              # CriticToStudio: how many movies of the studio the critic reviewed,
+                              # StudioFilms: how many movies the studio produced,
+                              # ActorGenres: how many jobs the actor has in movies of the genre,
+                              # GenreAges: the ages of the actors with at least one job in the genre,
+                              # MovieRatings: the sum and number of the ratings of each reviewed movie
+                              "CREATE TABLE CriticToStudio("
+                              "criticID INTEGER NOT NULL, "
+                              "studioID INTEGER NOT NULL, "
+                              "count1 INTEGER NOT NULL, "
+                              "CONSTRAINT CriticToStudio_key PRIMARY KEY (criticID, studioID)); "
+
+                              "CREATE TABLE StudioFilms("
+                              "studioID INTEGER PRIMARY KEY, "
+                              "count2 INTEGER NOT NULL); "
+
+                              "CREATE TABLE ActorGenres("
+                              "actorID INTEGER NOT NULL, "
+                              "movie_genre TEXT NOT NULL, "
+                              "actor_age INTEGER NOT NULL, "
+                              "jobs INTEGER NOT NULL, "
+                              "CONSTRAINT ActorGenres_key PRIMARY KEY (actorID, movie_genre)); "
+
+                              "CREATE TABLE GenreAges("
+                              "movie_genre TEXT PRIMARY KEY, "
+                              "age_sum BIGINT NOT NULL, "
+                              "actor_count INTEGER NOT NULL); "
 
+                              "CREATE TABLE MovieRatings("
+                              "movieName TEXT NOT NULL, "
+                              "movie_year INTEGER NOT NULL, "
+                              "rating_sum BIGINT NOT NULL, "
+                              "rating_count INTEGER NOT NULL, "
+                              "CONSTRAINT MovieRatings_key PRIMARY KEY (movieName, movie_year)); "
+
+                              # a review and a production of the same movie count for CriticToStudio together, both
+                              # sides lock the movie so one of them always sees the other once it is committed
+                              "CREATE OR REPLACE FUNCTION reviews_added() RETURNS TRIGGER AS $$ "
+                              "BEGIN "
+                              "    PERFORM 1 FROM Movies M INNER JOIN (SELECT DISTINCT movieName, movie_year FROM added) A "
+                              "    ON M.movieName = A.movieName AND M.movie_year = A.movie_year "
+                              "    ORDER BY M.movieName, M.movie_year FOR NO KEY UPDATE OF M; "
+                              "    INSERT INTO MovieRatings(movieName, movie_year, rating_sum, rating_count) "
+                              "    SELECT movieName, movie_year, SUM(review_rating), COUNT(*) "
+                              "    FROM added GROUP BY movieName, movie_year "
+                              "    ON CONFLICT (movieName, movie_year) "
+                              "    DO UPDATE SET rating_sum = MovieRatings.rating_sum + EXCLUDED.rating_sum, "
+                              "                  rating_count = MovieRatings.rating_count + EXCLUDED.rating_count; "
+                              "    INSERT INTO CriticToStudio(criticID, studioID, count1) "
+                              "    SELECT R.criticID, P.studioID, COUNT(*) "
+                              "    FROM added R INNER JOIN Productions P "
+                              "    ON P.movieName = R.movieName AND P.movie_year = R.movie_year "
+                              "    GROUP BY R.criticID, P.studioID "
+                              "    ON CONFLICT (criticID, studioID) "
+                              "    DO UPDATE SET count1 = CriticToStudio.count1 + EXCLUDED.count1; "
+                              "    RETURN NULL; "
+                              "END $$ LANGUAGE plpgsql; "
+
+                              "CREATE OR REPLACE FUNCTION reviews_removed() RETURNS TRIGGER AS $$ "
+                              "BEGIN "
+                              "    PERFORM 1 FROM Movies M INNER JOIN (SELECT DISTINCT movieName, movie_year FROM removed) D "
+                              "    ON M.movieName = D.movieName AND M.movie_year = D.movie_year "
+                              "    ORDER BY M.movieName, M.movie_year FOR NO KEY UPDATE OF M; "
+                              # movies and pairs losing their last review go first, the rest are decremented
+                              "    DELETE FROM MovieRatings MR "
+                              "    USING (SELECT movieName, movie_year, COUNT(*) AS cnt "
+                              "           FROM removed GROUP BY movieName, movie_year) D "
+                              "    WHERE MR.movieName = D.movieName AND MR.movie_year = D.movie_year "
+                              "    AND MR.rating_count = D.cnt; "
+                              "    UPDATE MovieRatings MR "
+                              "    SET rating_sum = MR.rating_sum - D.total, rating_count = MR.rating_count - D.cnt "
+                              "    FROM (SELECT movieName, movie_year, SUM(review_rating) AS total, COUNT(*) AS cnt "
+                              "          FROM removed GROUP BY movieName, movie_year) D "
+                              "    WHERE MR.movieName = D.movieName AND MR.movie_year = D.movie_year; "
+                              "    DELETE FROM CriticToStudio C "
+                              "    USING (SELECT R.criticID, P.studioID, COUNT(*) AS cnt "
+                              "           FROM removed R INNER JOIN Productions P "
+                              "           ON P.movieName = R.movieName AND P.movie_year = R.movie_year "
+                              "           GROUP BY R.criticID, P.studioID) D "
+                              "    WHERE C.criticID = D.criticID AND C.studioID = D.studioID AND C.count1 = D.cnt; "
+                              "    UPDATE CriticToStudio C SET count1 = C.count1 - D.cnt "
+                              "    FROM (SELECT R.criticID, P.studioID, COUNT(*) AS cnt "
+                              "          FROM removed R INNER JOIN Productions P "
+                              "          ON P.movieName = R.movieName AND P.movie_year = R.movie_year "
+                              "          GROUP BY R.criticID, P.studioID) D "
+                              "    WHERE C.criticID = D.criticID AND C.studioID = D.studioID; "
+                              "    RETURN NULL; "
+                              "END $$ LANGUAGE plpgsql; "
+
+                              "CREATE OR REPLACE FUNCTION productions_added() RETURNS TRIGGER AS $$ "
+                              "BEGIN "
+                              "    PERFORM 1 FROM Movies M INNER JOIN added A "
+                              "    ON M.movieName = A.movieName AND M.movie_year = A.movie_year "
+                              "    ORDER BY M.movieName, M.movie_year FOR NO KEY UPDATE OF M; "
+                              "    INSERT INTO StudioFilms(studioID, count2) "
+                              "    SELECT studioID, COUNT(*) FROM added GROUP BY studioID "
+                              "    ON CONFLICT (studioID) DO UPDATE SET count2 = StudioFilms.count2 + EXCLUDED.count2; "
+                              "    INSERT INTO CriticToStudio(criticID, studioID, count1) "
+                              "    SELECT R.criticID, P.studioID, COUNT(*) "
+                              "    FROM added P INNER JOIN Reviews R "
+                              "    ON P.movieName = R.movieName AND P.movie_year = R.movie_year "
+                              "    GROUP BY R.criticID, P.studioID "
+                              "    ON CONFLICT (criticID, studioID) "
+                              "    DO UPDATE SET count1 = CriticToStudio.count1 + EXCLUDED.count1; "
+                              "    RETURN NULL; "
+                              "END $$ LANGUAGE plpgsql; "
+
+                              "CREATE OR REPLACE FUNCTION productions_removed() RETURNS TRIGGER AS $$ "
+                              "BEGIN "
+                              "    PERFORM 1 FROM Movies M INNER JOIN removed D "
+                              "    ON M.movieName = D.movieName AND M.movie_year = D.movie_year "
+                              "    ORDER BY M.movieName, M.movie_year FOR NO KEY UPDATE OF M; "
+                              "    DELETE FROM StudioFilms S "
+                              "    USING (SELECT studioID, COUNT(*) AS cnt FROM removed GROUP BY studioID) D "
+                              "    WHERE S.studioID = D.studioID AND S.count2 = D.cnt; "
+                              "    UPDATE StudioFilms S SET count2 = S.count2 - D.cnt "
+                              "    FROM (SELECT studioID, COUNT(*) AS cnt FROM removed GROUP BY studioID) D "
+                              "    WHERE S.studioID = D.studioID; "
+                              "    DELETE FROM CriticToStudio C "
+                              "    USING (SELECT R.criticID, P.studioID, COUNT(*) AS cnt "
+                              "           FROM removed P INNER JOIN Reviews R "
+                              "           ON P.movieName = R.movieName AND P.movie_year = R.movie_year "
+                              "           GROUP BY R.criticID, P.studioID) D "
+                              "    WHERE C.criticID = D.criticID AND C.studioID = D.studioID AND C.count1 = D.cnt; "
+                              "    UPDATE CriticToStudio C SET count1 = C.count1 - D.cnt "
+                              "    FROM (SELECT R.criticID, P.studioID, COUNT(*) AS cnt "
+                              "          FROM removed P INNER JOIN Reviews R "
+                              "          ON P.movieName = R.movieName AND P.movie_year = R.movie_year "
+                              "          GROUP BY R.criticID, P.studioID) D "
+                              "    WHERE C.criticID = D.criticID AND C.studioID = D.studioID; "
+                              "    RETURN NULL; "
+                              "END $$ LANGUAGE plpgsql; "
+
+                              # an actor enters GenreAges with their first job in the genre and leaves with the last
+                              "CREATE OR REPLACE FUNCTION jobs_added() RETURNS TRIGGER AS $$ "
+                              "BEGIN "
+                              "    WITH Added AS ("
+                              "        SELECT J.actorID, M.movie_genre, A.actor_age, COUNT(*) AS cnt "
+                              "        FROM added J "
+                              "        INNER JOIN Movies M ON M.movieName = J.movieName AND M.movie_year = J.movie_year "
+                              "        INNER JOIN Actors A ON A.actorID = J.actorID "
+                              "        GROUP BY J.actorID, M.movie_genre, A.actor_age), "
+                              "    Counted AS ("
+                              "        INSERT INTO ActorGenres(actorID, movie_genre, actor_age, jobs) "
+                              "        SELECT actorID, movie_genre, actor_age, cnt FROM Added "
+                              "        ON CONFLICT (actorID, movie_genre) DO UPDATE SET jobs = ActorGenres.jobs + EXCLUDED.jobs "
+                              "        RETURNING actorID, movie_genre, jobs) "
+                              "    INSERT INTO GenreAges(movie_genre, age_sum, actor_count) "
+                              "    SELECT A.movie_genre, SUM(A.actor_age), COUNT(*) "
+                              "    FROM Added A INNER JOIN Counted C "
+                              "    ON A.actorID = C.actorID AND A.movie_genre = C.movie_genre "
+                              "    WHERE C.jobs = A.cnt "
+                              "    GROUP BY A.movie_genre "
+                              "    ON CONFLICT (movie_genre) DO UPDATE "
+                              "    SET age_sum = GenreAges.age_sum + EXCLUDED.age_sum, "
+                              "        actor_count = GenreAges.actor_count + EXCLUDED.actor_count; "
+                              "    RETURN NULL; "
+                              "END $$ LANGUAGE plpgsql; "
+
+                              # the genre is read from Movies, so the jobs of a deleted movie are removed by
+                              # Movies_removing while the movie is still there
+                              "CREATE OR REPLACE FUNCTION jobs_removed() RETURNS TRIGGER AS $$ "
+                              "BEGIN "
+                              "    WITH Emptied AS ("
+                              "        DELETE FROM ActorGenres AG "
+                              "        USING (SELECT J.actorID, M.movie_genre, COUNT(*) AS cnt "
+                              "               FROM removed J INNER JOIN Movies M "
+                              "               ON M.movieName = J.movieName AND M.movie_year = J.movie_year "
+                              "               GROUP BY J.actorID, M.movie_genre) D "
+                              "        WHERE AG.actorID = D.actorID AND AG.movie_genre = D.movie_genre AND AG.jobs = D.cnt "
+                              "        RETURNING AG.movie_genre, AG.actor_age) "
+                              "    UPDATE GenreAges G "
+                              "    SET age_sum = G.age_sum - E.age_sum, actor_count = G.actor_count - E.actor_count "
+                              "    FROM (SELECT movie_genre, SUM(actor_age) AS age_sum, COUNT(*) AS actor_count "
+                              "          FROM Emptied GROUP BY movie_genre) E "
+                              "    WHERE G.movie_genre = E.movie_genre; "
+                              "    DELETE FROM GenreAges WHERE actor_count = 0; "
+                              "    UPDATE ActorGenres AG SET jobs = AG.jobs - D.cnt "
+                              "    FROM (SELECT J.actorID, M.movie_genre, COUNT(*) AS cnt "
+                              "          FROM removed J INNER JOIN Movies M "
+                              "          ON M.movieName = J.movieName AND M.movie_year = J.movie_year "
+                              "          GROUP BY J.actorID, M.movie_genre) D "
+                              "    WHERE AG.actorID = D.actorID AND AG.movie_genre = D.movie_genre; "
+                              "    RETURN NULL; "
+                              "END $$ LANGUAGE plpgsql; "
+
+                              # the cascades of a deleted movie run before any of their triggers, so the production
+                              # goes first for productions_removed to still see the reviews it pairs with
+                              "CREATE OR REPLACE FUNCTION movies_removing() RETURNS TRIGGER AS $$ "
+                              "BEGIN "
+                              "    DELETE FROM Productions WHERE movieName = OLD.movieName AND movie_year = OLD.movie_year; "
+                              "    DELETE FROM ActingJobs WHERE movieName = OLD.movieName AND movie_year = OLD.movie_year; "
+                              "    RETURN OLD; "
+                              "END $$ LANGUAGE plpgsql; "
+
+                              "CREATE TRIGGER Reviews_added AFTER INSERT ON Reviews "
+                              "REFERENCING NEW TABLE AS added FOR EACH STATEMENT EXECUTE FUNCTION reviews_added(); "
+
+                              "CREATE TRIGGER Reviews_removed AFTER DELETE ON Reviews "
+                              "REFERENCING OLD TABLE AS removed FOR EACH STATEMENT EXECUTE FUNCTION reviews_removed(); "
+
+                              "CREATE TRIGGER Productions_added AFTER INSERT ON Productions "
+                              "REFERENCING NEW TABLE AS added FOR EACH STATEMENT EXECUTE FUNCTION productions_added(); "
+
+                              "CREATE TRIGGER Productions_removed AFTER DELETE ON Productions "
+                              "REFERENCING OLD TABLE AS removed FOR EACH STATEMENT EXECUTE FUNCTION productions_removed(); "
+
+                              "CREATE TRIGGER Jobs_added AFTER INSERT ON ActingJobs "
+                              "REFERENCING NEW TABLE AS added FOR EACH STATEMENT EXECUTE FUNCTION jobs_added(); "
+
+                              "CREATE TRIGGER Jobs_removed AFTER DELETE ON ActingJobs "
+                              "REFERENCING OLD TABLE AS removed FOR EACH STATEMENT EXECUTE FUNCTION jobs_removed(); "
+
+                              "CREATE TRIGGER Movies_removing BEFORE DELETE ON Movies "
+                              "FOR EACH ROW EXECUTE FUNCTION movies_removing();").format()
+
+        schema = Connector.DBConnector.schema()
+        if schema is not None:
+            transaction = sql.SQL("CREATE SCHEMA IF NOT EXISTS {schema}; ").format(
+                schema=sql.Identifier(schema)) + transaction
         conn.execute(transaction)
         conn.commit()
     except DatabaseException.ConnectionInvalid as e:
-        conn.rollback()
+        if conn is not None:
+            conn.rollback()
         print(e)
     except DatabaseException.NOT_NULL_VIOLATION as e:
         conn.rollback()
@@ -122,28 +1017,27 @@ def createTables():
     except Exception as e:
         print(e)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    _clearCaches()
 
 
-def clearTables():
+# empties every table, the summaries included, with one TRUNCATE: no row is visited, no trigger fires and next to
+# no WAL is written. It takes an exclusive lock on all the tables, so concurrent calls wait until it is done.
+# returns how many seconds it took
+def clearTables() -> float:
+    started = time.perf_counter()
     conn = None
     try:
         conn = Connector.DBConnector()
-        transaction = sql.SQL("BEGIN;"
-
-                              "DELETE FROM Critics; "
-
-                              "DELETE FROM Movies; "
-
-                              "DELETE FROM Actors;"
-
-                              "DELETE FROM Studios; "
-
-                              "COMMIT;")
+        transaction = sql.SQL("TRUNCATE Critics, Movies, Actors, Studios, Reviews, ActingJobs, Roles, Productions, "
+                              "CriticToStudio, StudioFilms, ActorGenres, GenreAges, MovieRatings "
+                              "RESTART IDENTITY CASCADE;")
 
         conn.execute(transaction)
     except DatabaseException.ConnectionInvalid as e:
-        conn.rollback()
+        if conn is not None:
+            conn.rollback()
         print(e)
     except DatabaseException.NOT_NULL_VIOLATION as e:
         conn.rollback()
@@ -161,16 +1055,17 @@ def clearTables():
         conn.rollback()
         print(e)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    _clearCaches()
+    return time.perf_counter() - started
 
 
 def dropTables():
     conn = None
     try:
         conn = Connector.DBConnector()
-        transaction = sql.SQL("BEGIN;"
-
-                              "DROP TABLE IF EXISTS Critics CASCADE; "
+        transaction = sql.SQL("DROP TABLE IF EXISTS Critics CASCADE; "
 
                               "DROP TABLE IF EXISTS Movies CASCADE;"
 
@@ -178,9 +1073,15 @@ def dropTables():
 
                               "DROP TABLE IF EXISTS Studios CASCADE; "
 
-                              "DROP VIEW IF EXISTS StudioFilms CASCADE; "
+                              "DROP TABLE IF EXISTS StudioFilms CASCADE; "
+
+                              "DROP TABLE IF EXISTS CriticToStudio CASCADE; "
+
+                              "DROP TABLE IF EXISTS ActorGenres CASCADE; "
+
+                              "DROP TABLE IF EXISTS GenreAges CASCADE; "
 
-                              "DROP VIEW IF EXISTS CriticsToStudio CASCADE; "
+                              "DROP TABLE IF EXISTS MovieRatings CASCADE; "
 
                               "DROP TABLE IF EXISTS Roles CASCADE;"
 
@@ -190,13 +1091,13 @@ def dropTables():
 
                               "DROP TABLE IF EXISTS Productions CASCADE; "
 
-                              "DROP TABLE IF EXISTS ActorsToGenre CASCADE; "
-
-                              "COMMIT;")
+                              "DROP FUNCTION IF EXISTS reviews_added, reviews_removed, productions_added, "
+                              "productions_removed, jobs_added, jobs_removed, movies_removing; ")
 
         conn.execute(transaction)
     except DatabaseException.ConnectionInvalid as e:
-        conn.rollback()
+        if conn is not None:
+            conn.rollback()
         print(e)
     except DatabaseException.NOT_NULL_VIOLATION as e:
         conn.rollback()
@@ -214,7 +1115,9 @@ def dropTables():
         conn.rollback()
         print(e)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    _clearCaches()
 
 
 def addCritic(critic: Critic) -> ReturnValue:
@@ -222,22 +1125,15 @@ def addCritic(critic: Critic) -> ReturnValue:
     return_value = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("INSERT INTO Critics "
-                        "VALUES({critic_id}, {critic_name});").format(
-            critic_id=sql.Literal(critic.getCriticID()),
-            critic_name=sql.Literal(critic.getName()))
-        conn.execute(query)
+        conn.executeStatement("addCritic", critic.getCriticID(), critic.getName())
         conn.commit()
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        return_value = ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION as e:
-        return_value = ReturnValue.BAD_PARAMS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        return_value = ReturnValue.ALREADY_EXISTS
-    except Exception:
-        return_value = ReturnValue.ERROR
+    except Exception as e:
+        return_value = errorValue(e, add_errors)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    if return_value == ReturnValue.OK:
+        critic_profiles.invalidate(cacheKey(critic.getCriticID()))
     return return_value
 
 
@@ -246,42 +1142,37 @@ def deleteCritic(critic_id: int) -> ReturnValue:
     return_value = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("DELETE FROM Critics "
-                        "WHERE criticID = {id};").format(
-            id=sql.Literal(
-                critic_id))
-        rows_effected, _ = conn.execute(query)
+        rows_effected, touched = conn.executeStatement("deleteCritic", critic_id)
         conn.commit()
         if rows_effected == 0:
             return_value = ReturnValue.NOT_EXISTS
     except Exception as e:
         return_value = ReturnValue.ERROR
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    if return_value == ReturnValue.OK:
+        critic_profiles.invalidate(cacheKey(critic_id))
+        forgetRatings(touched)
     return return_value
 
 
 def getCriticProfile(critic_id: int) -> Critic:
-    conn = None
-    critic = Critic()
-    try:
-        conn = Connector.DBConnector()
-        sql_query = sql.SQL("SELECT * "
-                            "FROM Critics "
-                            "WHERE criticID = {id};").format(
-            id=sql.Literal(critic_id))
-        _, result = conn.execute(sql_query)
-        conn.commit()
-        if result.isEmpty():
-            critic = critic.badCritic()
-        else:
-            critic.setCriticID(int(result[0]['criticID']))
-            critic.setName(str(result[0]['critic_name']))
-    except Exception:
-        critic = critic.badCritic()
-    finally:
-        conn.close()
-    return critic
+    profile = critic_profiles.get(cacheKey(critic_id))
+    if profile is MISSING:
+        conn = None
+        stamp = critic_profiles.stamp()
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.executeStatement("getCriticProfile", critic_id)
+            conn.commit()
+            profile = cacheFirst(critic_profiles, cacheKey(critic_id), result, criticValues, stamp)
+        except Exception:
+            profile = None
+        finally:
+            if conn is not None:
+                conn.close()
+    return asCritic(profile)
 
 
 def addActor(actor: Actor) -> ReturnValue:
@@ -289,25 +1180,16 @@ def addActor(actor: Actor) -> ReturnValue:
     return_value = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL(
-            "INSERT INTO Actors "
-            "VALUES({actor_id}, {actor_name}, {actor_age}, {actor_height});").format(
-            actor_id=sql.Literal(actor.getActorID()),
-            actor_name=sql.Literal(actor.getActorName()),
-            actor_age=sql.Literal(actor.getAge()),
-            actor_height=sql.Literal(actor.getHeight()))
-        conn.execute(query)
+        conn.executeStatement("addActor", actor.getActorID(), actor.getActorName(), actor.getAge(),
+                              actor.getHeight())
         conn.commit()
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        return_value = ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION as e:
-        return_value = ReturnValue.BAD_PARAMS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        return_value = ReturnValue.ALREADY_EXISTS
-    except Exception:
-        return_value = ReturnValue.ERROR
+    except Exception as e:
+        return_value = errorValue(e, add_errors)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    if return_value == ReturnValue.OK:
+        actor_profiles.invalidate(cacheKey(actor.getActorID()))
     return return_value
 
 
@@ -316,44 +1198,37 @@ def deleteActor(actor_id: int) -> ReturnValue:
     return_value = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("DELETE FROM Actors "
-                        "WHERE actorID = {id};").format(
-            id=sql.Literal(
-                actor_id))
-        rows_effected, _ = conn.execute(query)
+        rows_effected, _ = conn.executeStatement("deleteActor", actor_id)
         conn.commit()
         if rows_effected == 0:
             return_value = ReturnValue.NOT_EXISTS
     except Exception as e:
         return_value = ReturnValue.ERROR
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    if return_value == ReturnValue.OK:
+        actor_profiles.invalidate(cacheKey(actor_id))
+        forgetActorRatings(actor_id)
     return return_value
 
 
 def getActorProfile(actor_id: int) -> Actor:
-    conn = None
-    actor = Actor()
-    try:
-        conn = Connector.DBConnector()
-        sql_query = sql.SQL("SELECT * "
-                            "FROM Actors "
-                            "WHERE actorID = {id};").format(
-            id=sql.Literal(actor_id))
-        _, result = conn.execute(sql_query)
-        conn.commit()
-        if result.isEmpty():
-            actor = actor.badActor()
-        else:
-            actor.setActorID(int(result[0]['actorID']))
-            actor.setActorName(str(result[0]['actor_name']))
-            actor.setAge(int(result[0]['actor_age']))
-            actor.setHeight(int(result[0]['actor_height']))
-    except Exception:
-        actor = actor.badActor()
-    finally:
-        conn.close()
-    return actor
+    profile = actor_profiles.get(cacheKey(actor_id))
+    if profile is MISSING:
+        conn = None
+        stamp = actor_profiles.stamp()
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.executeStatement("getActorProfile", actor_id)
+            conn.commit()
+            profile = cacheFirst(actor_profiles, cacheKey(actor_id), result, actorValues, stamp)
+        except Exception:
+            profile = None
+        finally:
+            if conn is not None:
+                conn.close()
+    return asActor(profile)
 
 
 def addMovie(movie: Movie) -> ReturnValue:
@@ -361,24 +1236,15 @@ def addMovie(movie: Movie) -> ReturnValue:
     return_value = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL(
-            "INSERT INTO Movies "
-            "VALUES({movieName}, {movie_year}, {movie_genre});").format(
-            movieName=sql.Literal(movie.getMovieName()),
-            movie_year=sql.Literal(movie.getYear()),
-            movie_genre=sql.Literal(movie.getGenre()))
-        conn.execute(query)
+        conn.executeStatement("addMovie", movie.getMovieName(), movie.getYear(), movie.getGenre())
         conn.commit()
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        return_value = ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION as e:
-        return_value = ReturnValue.BAD_PARAMS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        return_value = ReturnValue.ALREADY_EXISTS
-    except Exception:
-        return_value = ReturnValue.ERROR
+    except Exception as e:
+        return_value = errorValue(e, add_errors)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    if return_value == ReturnValue.OK:
+        movie_profiles.invalidate((movie.getMovieName(), cacheKey(movie.getYear())))
     return return_value
 
 
@@ -387,44 +1253,37 @@ def deleteMovie(movie_name: str, year: int) -> ReturnValue:
     return_value = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("DELETE FROM Movies "
-                        "WHERE (movieName = {id1} AND movie_year = {id2});").format(
-            id1=sql.Literal(movie_name),
-            id2=sql.Literal(year))
-        rows_effected, _ = conn.execute(query)
+        rows_effected, touched = conn.executeStatement("deleteMovie", movie_name, year)
         conn.commit()
         if rows_effected == 0:
             return_value = ReturnValue.NOT_EXISTS
     except Exception as e:
         return_value = ReturnValue.ERROR
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    if return_value == ReturnValue.OK:
+        movie_profiles.invalidate((movie_name, cacheKey(year)))
+        forgetRatings(touched)
     return return_value
 
 
 def getMovieProfile(movie_name: str, year: int) -> Movie:
-    conn = None
-    movie = Movie()
-    try:
-        conn = Connector.DBConnector()
-        sql_query = sql.SQL("SELECT * "
-                            "FROM Movies "
-                            "WHERE (movieName = {id1} AND movie_year = {id2});").format(
-            id1=sql.Literal(movie_name),
-            id2=sql.Literal(year))
-        _, result = conn.execute(sql_query)
-        conn.commit()
-        if result.isEmpty():
-            movie = movie.badMovie()
-        else:
-            movie.setMovieName(str(result[0]['movieName']))
-            movie.setYear(int(result[0]['movie_year']))
-            movie.setGenre(str(result[0]['movie_genre']))
-    except Exception:
-        movie = movie.badMovie()
-    finally:
-        conn.close()
-    return movie
+    profile = movie_profiles.get((movie_name, cacheKey(year)))
+    if profile is MISSING:
+        conn = None
+        stamp = movie_profiles.stamp()
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.executeStatement("getMovieProfile", movie_name, year)
+            conn.commit()
+            profile = cacheFirst(movie_profiles, (movie_name, cacheKey(year)), result, movieValues, stamp)
+        except Exception:
+            profile = None
+        finally:
+            if conn is not None:
+                conn.close()
+    return asMovie(profile)
 
 
 def addStudio(studio: Studio) -> ReturnValue:
@@ -432,23 +1291,15 @@ def addStudio(studio: Studio) -> ReturnValue:
     return_value = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL(
-            "INSERT INTO Studios "
-            "VALUES({studio_id}, {studio_name});").format(
-            studio_id=sql.Literal(studio.getStudioID()),
-            studio_name=sql.Literal(studio.getStudioName()))
-        conn.execute(query)
+        conn.executeStatement("addStudio", studio.getStudioID(), studio.getStudioName())
         conn.commit()
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        return_value = ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION as e:
-        return_value = ReturnValue.BAD_PARAMS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        return_value = ReturnValue.ALREADY_EXISTS
-    except Exception:
-        return_value = ReturnValue.ERROR
+    except Exception as e:
+        return_value = errorValue(e, add_errors)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    if return_value == ReturnValue.OK:
+        studio_profiles.invalidate(cacheKey(studio.getStudioID()))
     return return_value
 
 
@@ -457,42 +1308,36 @@ def deleteStudio(studio_id: int) -> ReturnValue:
     return_value = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("DELETE FROM Studios "
-                        "WHERE studioID = {id};").format(
-            id=sql.Literal(
-                studio_id))
-        rows_effected, _ = conn.execute(query)
+        rows_effected, _ = conn.executeStatement("deleteStudio", studio_id)
         conn.commit()
         if rows_effected == 0:
             return_value = ReturnValue.NOT_EXISTS
     except Exception as e:
         return_value = ReturnValue.ERROR
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+    if return_value == ReturnValue.OK:
+        studio_profiles.invalidate(cacheKey(studio_id))
     return return_value
 
 
 def getStudioProfile(studio_id: int) -> Studio:
-    conn = None
-    studio = Studio()
-    try:
-        conn = Connector.DBConnector()
-        sql_query = sql.SQL("SELECT * "
-                            "FROM Studios "
-                            "WHERE studioID = {id};").format(
-            id=sql.Literal(studio_id))
-        _, result = conn.execute(sql_query)
-        conn.commit()
-        if result.isEmpty():
-            studio = studio.badStudio()
-        else:
-            studio.setStudioID(int(result[0]['studioID']))
-            studio.setStudioName(str(result[0]['studio_name']))
-    except Exception:
-        studio = studio.badStudio()
-    finally:
-        conn.close()
-    return studio
+    profile = studio_profiles.get(cacheKey(studio_id))
+    if profile is MISSING:
+        conn = None
+        stamp = studio_profiles.stamp()
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.executeStatement("getStudioProfile", studio_id)
+            conn.commit()
+            profile = cacheFirst(studio_profiles, cacheKey(studio_id), result, studioValues, stamp)
+        except Exception:
+            profile = None
+        finally:
+            if conn is not None:
+                conn.close()
+    return asStudio(profile)
 
 
 def criticRatedMovie(movieName: str, movieYear: int, critic_id: int, rating: int) -> ReturnValue:
@@ -500,115 +1345,63 @@ def criticRatedMovie(movieName: str, movieYear: int, critic_id: int, rating: int
     conn = None
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("INSERT INTO Reviews(movieName,movie_year,criticID,review_rating) "
-                        "VALUES({movieName}, {movieYear}, {critic_id}, {rating})") \
-            .format(movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear),
-                    critic_id=sql.Literal(critic_id), rating=sql.Literal(rating))
-        rows_effected, _ = conn.execute(query)
-    except DatabaseException.ConnectionInvalid as e:
-        result = ReturnValue.ERROR
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        result = ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION as e:
-        result = ReturnValue.BAD_PARAMS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        result = ReturnValue.ALREADY_EXISTS
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
+        _, touched = conn.executeStatement("criticRatedMovie", movieName, movieYear, critic_id, rating)
+        forgetRatings(touched)
     except Exception as e:
-        result = ReturnValue.ERROR
+        result = errorValue(e, insert_errors)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
         return result
 
 
 def criticDidntRateMovie(movieName: str, movieYear: int, critic_id: int) -> ReturnValue:
     conn = None
-    rows_effected= 0, result=ReturnValue.OK
+    rows_effected, result = 0, ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("DELETE "
-                        "FROM Reviews "
-                        "WHERE movieName={movieName} AND movie_year={movieYear}  AND criticID={critic_id}"). \
-            format(movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear), critic_id=sql.Literal(critic_id))
-        rows_effected, _ = conn.execute(query)
-    except DatabaseException.ConnectionInvalid as e:
-        result = ReturnValue.ERROR
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.CHECK_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
+        rows_effected, touched = conn.executeStatement("criticDidntRateMovie", movieName, movieYear, critic_id)
+        forgetRatings(touched)
     except Exception as e:
-        result = ReturnValue.ERROR
+        result = errorValue(e, remove_errors)
     finally:
-        conn.close()
-        if rows_effected == 0:
-            return ReturnValue.NOT_EXISTS
-        return result
+        if conn is not None:
+            conn.close()
+        return removedValue(result, rows_effected)
 
 
 def actorPlayedInMovie(movieName: str, movieYear: int, actorID: int, salary: int, roles: List[str]) -> ReturnValue:
+    if not validRoles(roles):
+        return ReturnValue.BAD_PARAMS
     conn = None
-    rows_effected= 0, result=ReturnValue.OK
+    result = ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("INSERT INTO ActingJobs (job_salary, movieName, movie_year, actorID) VALUES ({job_salary},{movieName},{movieYear},{actorID})")\
-            .format(job_salary=sql.Literal(salary), movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear), actorID=sql.Literal(actorID))
-        rows_effected, _ = conn.execute(query)
-        for role in roles:
-            conn.execute("INSERT INTO Roles (roleName, movieName, movie_year, actorID) VALUES ({role},{movieName},{movieYear},{actorID})")\
-                .format(role=sql.Literal(role), movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear), actorID=sql.Literal(actorID))
-            rows_effected, _ = conn.execute(query)
-    except DatabaseException.ConnectionInvalid as e:
-        result = ReturnValue.ERROR
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        result = ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION as e:
-        result = ReturnValue.BAD_PARAMS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        result = ReturnValue.ALREADY_EXISTS
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
+        conn.executeStatement("actorPlayedInMovie", movieName, movieYear, actorID, salary, list(roles))
+        forgetActorRatings(actorID)
     except Exception as e:
-        result = ReturnValue.ERROR
+        result = errorValue(e, insert_errors)
     finally:
-        conn.close()
-        if rows_effected == 0:
-            return ReturnValue.NOT_EXISTS
+        if conn is not None:
+            conn.close()
         return result
 
 
 def actorDidntPlayInMovie(movieName: str, movieYear: int, actorID: int) -> ReturnValue:
     conn = None
-    rows_effected= 0, result=ReturnValue.OK
+    rows_effected, result = 0, ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("DELETE "
-                        "FROM Roles "
-                        "WHERE movieName={movieName} AND movie_year={movieYear}  AND actorID={actorID}"). \
-            format(movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear), actorID=sql.Literal(actorID))
-        rows_effected, _ = conn.execute(query)
-    except DatabaseException.ConnectionInvalid as e:
-        result = ReturnValue.ERROR
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.CHECK_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
+        # the actor's roles in the movie are removed with the job (ON DELETE CASCADE)
+        rows_effected, _ = conn.executeStatement("actorDidntPlayInMovie", movieName, movieYear, actorID)
+        if rows_effected > 0:
+            forgetActorRatings(actorID)
     except Exception as e:
-        result = ReturnValue.ERROR
+        result = errorValue(e, remove_errors)
     finally:
-        conn.close()
-        if rows_effected == 0:
-            return ReturnValue.NOT_EXISTS
-        return result
+        if conn is not None:
+            conn.close()
+        return removedValue(result, rows_effected)
 
 
 def studioProducedMovie(studioID: int, movieName: str, movieYear: int, budget: int, revenue: int) -> ReturnValue:
@@ -616,287 +1409,504 @@ def studioProducedMovie(studioID: int, movieName: str, movieYear: int, budget: i
     conn = None
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("INSERT INTO Productions(production_budget,production_revenue,studioID,movieName,movie_year) "
-                        "VALUES({_budget}, {_revenue}, {_studioID}, {_movieName}, {_movieYear})") \
-            .format(_budget=sql.Literal(budget), _revenue=sql.Literal(revenue),
-                    _studioID=sql.Literal(studioID), _movieName=sql.Literal(movieName), _movieYear=sql.Literal(movieYear))
-        rows_effected, _ = conn.execute(query)
-    except DatabaseException.ConnectionInvalid as e:
-        result = ReturnValue.ERROR
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        result = ReturnValue.BAD_PARAMS
-    except DatabaseException.CHECK_VIOLATION as e:
-        result = ReturnValue.BAD_PARAMS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        result = ReturnValue.ALREADY_EXISTS
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
+        rows_effected, _ = conn.executeStatement("studioProducedMovie", studioID, movieName, movieYear, budget,
+                                                 revenue)
     except Exception as e:
-        result = ReturnValue.ERROR
+        result = errorValue(e, insert_errors)
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
         return result
 
 
 
 def studioDidntProduceMovie(studioID: int, movieName: str, movieYear: int) -> ReturnValue:
     conn = None
-    rows_effected= 0, result=ReturnValue.OK
+    rows_effected, result = 0, ReturnValue.OK
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("DELETE "
-                        "FROM Productions "
-                        "WHERE movieName={movieName} AND movie_year={movieYear} AND studioID={studioID}").format(movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear), studioID=sql.Literal(studioID))
-        rows_effected, _ = conn.execute(query)
-    except DatabaseException.ConnectionInvalid as e:
-        result = ReturnValue.ERROR
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.CHECK_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        result = ReturnValue.NOT_EXISTS
+        rows_effected, _ = conn.executeStatement("studioDidntProduceMovie", studioID, movieName, movieYear)
     except Exception as e:
-        result = ReturnValue.ERROR
+        result = errorValue(e, remove_errors)
     finally:
-        conn.close()
-        if rows_effected == 0:
-            return ReturnValue.NOT_EXISTS
-        return result
+        if conn is not None:
+            conn.close()
+        return removedValue(result, rows_effected)
+
+
+# ---------------------------------- BULK API: ----------------------------------
+# the add* functions for many rows at once. rows may be any iterable (a generator keeps memory flat), they are
+# streamed with COPY and stored in a single transaction. returns (OK, rejected) where rejected lists
+# (position, ReturnValue) for every row that was not stored, mapped as the single-row function would map it,
+# or (ERROR, []) when the batch as a whole failed and nothing was stored
+
+def _bulkLoad(stage: str, columns: List[Tuple[str, str]], rows, statement: str, caches: List[Cache] = ()) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    conn = None
+    result, rejected = ReturnValue.OK, []
+    try:
+        conn = Connector.DBConnector()
+        # unquoted names, so they are stored in lower case like the ones of the real tables.
+        # the rows go at commit, inside a Transaction the ones of an earlier load are still there
+        conn.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS {stage}(seq BIGINT, {columns}) "
+                             "ON COMMIT DELETE ROWS; "
+                             "DELETE FROM {stage};").format(
+            stage=sql.Identifier(stage),
+            columns=sql.SQL(', ').join(sql.SQL(name + " " + column_type) for name, column_type in columns)))
+        conn.copyFrom(stage, ['seq'] + [name.lower() for name, _ in columns],
+                      ((seq,) + row for seq, row in enumerate(rows)))
+        _, outcomes = conn.executeStatement(statement)
+        conn.commit()
+        for row in outcomes:
+            rejected.append((int(row['seq']), ReturnValue[row['outcome']]))
+    except Exception as e:
+        result, rejected = ReturnValue.ERROR, []
+    finally:
+        if conn is not None:
+            conn.close()
+    # which keys were loaded is not tracked, so the whole caches go
+    if result == ReturnValue.OK:
+        for cache in caches:
+            cache.clear()
+    return result, rejected
+
+
+def addCritics(critics: Iterable[Critic]) -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkLoad("critics_load", [("criticID", "INTEGER"), ("critic_name", "TEXT")],
+                     ((critic.getCriticID(), critic.getName()) for critic in critics), "addCritics", [critic_profiles])
+
+
+def addActors(actors: Iterable[Actor]) -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkLoad("actors_load", [("actorID", "INTEGER"), ("actor_name", "TEXT"), ("actor_age", "INTEGER"),
+                                     ("actor_height", "INTEGER")],
+                     ((actor.getActorID(), actor.getActorName(), actor.getAge(), actor.getHeight())
+                      for actor in actors), "addActors", [actor_profiles])
+
+
+def addMovies(movies: Iterable[Movie]) -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkLoad("movies_load", [("movieName", "TEXT"), ("movie_year", "INTEGER"), ("movie_genre", "TEXT")],
+                     ((movie.getMovieName(), movie.getYear(), movie.getGenre()) for movie in movies), "addMovies",
+                     [movie_profiles])
+
+
+def addStudios(studios: Iterable[Studio]) -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkLoad("studios_load", [("studioID", "INTEGER"), ("studio_name", "TEXT")],
+                     ((studio.getStudioID(), studio.getStudioName()) for studio in studios), "addStudios",
+                     [studio_profiles])
+
+
+# reviews are (movie_name, movie_year, critic_id, rating) like the arguments of criticRatedMovie
+def criticRatedMovies(reviews: Iterable[Tuple[str, int, int, int]]) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkLoad("reviews_load", [("movieName", "TEXT"), ("movie_year", "INTEGER"), ("criticID", "INTEGER"),
+                                      ("review_rating", "INTEGER")],
+                     (tuple(review) for review in reviews), "criticRatedMovies", rating_caches)
+
+
+# jobs are (movie_name, movie_year, actor_id, salary, roles) like the arguments of actorPlayedInMovie
+def actorPlayedInMovies(jobs: Iterable[Tuple[str, int, int, int, List[str]]]) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkLoad("jobs_load", [("movieName", "TEXT"), ("movie_year", "INTEGER"), ("actorID", "INTEGER"),
+                                   ("job_salary", "INTEGER"), ("roles", "TEXT[]")],
+                     (tuple(job) for job in jobs), "actorPlayedInMovies",
+                     [actor_ratings, best_performances])
+
+
+# productions are (studio_id, movie_name, movie_year, budget, revenue) like the arguments of studioProducedMovie
+def studioProducedMovies(productions: Iterable[Tuple[int, str, int, int, int]]) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkLoad("productions_load", [("studioID", "INTEGER"), ("movieName", "TEXT"), ("movie_year", "INTEGER"),
+                                          ("production_budget", "INTEGER"), ("production_revenue", "INTEGER")],
+                     (tuple(production) for production in productions), "studioProducedMovies")
+
+
+# the delete* functions for many keys at once. The keys are deleted chunk_size at a time, every chunk with one
+# statement that is committed on its own, so the locks a chunk takes (its cascades included) are only held until
+# it commits and concurrent readers and writers wait for one chunk at most; inside a Transaction they are held until
+# it ends. returns (OK, rejected) where rejected lists (position, NOT_EXISTS) for every key that was not stored,
+# also when an earlier key of the same call deleted it. When a chunk fails the ones before it stay deleted and the
+# rest is not attempted: (ERROR, rejected) with (position, ERROR) for every key of the failed chunk and after it
+
+# the chunks of keys as (position of the first key, chunk, keys to send), shared with AsyncSolution.
+# a key the database would reject fails the whole chunk, it cannot be stored anyway
+def deleteChunks(keys: List, valid, chunk_size: int):
+    for start in range(0, len(keys), max(chunk_size, 1)):
+        chunk = keys[start:start + max(chunk_size, 1)]
+        yield start, chunk, list(dict.fromkeys(key for key in chunk if valid(key)))
+
+
+# (position, NOT_EXISTS) for every key of the chunk that is not among the deleted rows, shared with AsyncSolution
+def notDeleted(start: int, chunk: List, removed: Connector.ResultSet, deleted) -> List[Tuple[int, ReturnValue]]:
+    found = {deleted(row) for row in removed}
+    rejected = []
+    for position, key in enumerate(chunk, start):
+        if key in found:
+            found.discard(key)  # a repeated key finds nothing left to delete
+        else:
+            rejected.append((position, ReturnValue.NOT_EXISTS))
+    return rejected
+
+
+def forgetDeletedCritics(removed: Connector.ResultSet):
+    for critic_id in {row['criticID'] for row in removed}:
+        critic_profiles.invalidate(critic_id)
+    forgetRatings(removed)
+
+
+def forgetDeletedActors(removed: Connector.ResultSet):
+    for row in removed:
+        actor_profiles.invalidate(row['actorID'])
+        forgetActorRatings(row['actorID'])
+
+
+def forgetDeletedMovies(removed: Connector.ResultSet):
+    for key in {(row['movieName'], row['movie_year']) for row in removed}:
+        movie_profiles.invalidate(key)
+    forgetRatings(removed)
+
+
+def forgetDeletedStudios(removed: Connector.ResultSet):
+    for row in removed:
+        studio_profiles.invalidate(row['studioID'])
+
+
+# every bulk delete as (statement, valid key, statement parameters of the keys, key of a deleted row, forget),
+# shared with AsyncSolution
+critic_deletes = ("deleteCritics", validID, lambda keys: (keys,), lambda row: row['criticID'], forgetDeletedCritics)
+actor_deletes = ("deleteActors", validID, lambda keys: (keys,), lambda row: row['actorID'], forgetDeletedActors)
+movie_deletes = ("deleteMovies", validMovieKey, lambda keys: ([name for name, _ in keys], [year for _, year in keys]),
+                 lambda row: (row['movieName'], row['movie_year']), forgetDeletedMovies)
+studio_deletes = ("deleteStudios", validID, lambda keys: (keys,), lambda row: row['studioID'], forgetDeletedStudios)
+
+
+def _bulkDelete(keys: List, chunk_size: int, statement: str, valid, params, deleted, forget) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    rejected = []
+    for start, chunk, sent in deleteChunks(keys, valid, chunk_size):
+        removed = Connector.ResultSet()
+        if sent:
+            conn = None
+            try:
+                conn = Connector.DBConnector()
+                _, removed = conn.executeStatement(statement, *params(sent))
+                conn.commit()
+            except Exception as e:
+                rejected.extend((position, ReturnValue.ERROR) for position in range(start, len(keys)))
+                return ReturnValue.ERROR, rejected
+            finally:
+                if conn is not None:
+                    conn.close()
+        forget(removed)
+        rejected.extend(notDeleted(start, chunk, removed, deleted))
+    return ReturnValue.OK, rejected
+
+
+def deleteCritics(critic_ids: Iterable[int], chunk_size: int = 1000) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkDelete([cacheKey(critic_id) for critic_id in critic_ids], chunk_size, *critic_deletes)
+
+
+def deleteActors(actor_ids: Iterable[int], chunk_size: int = 1000) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkDelete([cacheKey(actor_id) for actor_id in actor_ids], chunk_size, *actor_deletes)
+
+
+# movies are (movie_name, year) like the arguments of deleteMovie
+def deleteMovies(movies: Iterable[Tuple[str, int]], chunk_size: int = 1000) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkDelete([(movie_name, cacheKey(year)) for movie_name, year in movies], chunk_size, *movie_deletes)
+
+
+def deleteStudios(studio_ids: Iterable[int], chunk_size: int = 1000) \
+        -> Tuple[ReturnValue, List[Tuple[int, ReturnValue]]]:
+    return _bulkDelete([cacheKey(studio_id) for studio_id in studio_ids], chunk_size, *studio_deletes)
+
+
+# ---------------------------------- BATCH API: ----------------------------------
+# lookups of many keys with one query, the results are in the order of the keys, with the same placeholder as the
+# single-key lookup (badActor() / badMovie() / 0) for the ones that do not exist. Keys found in the caches are not
+# queried and the queried ones are cached
+def getActorProfiles(actor_ids: Iterable[int]) -> List[Actor]:
+    keys = [cacheKey(actor_id) for actor_id in actor_ids]
+    profiles, missing = cachedBatch(actor_profiles, keys, validID)
+    if missing:
+        conn = None
+        stamp = actor_profiles.stamp()
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.executeStatement("getActorProfiles", missing)
+            conn.commit()
+            cacheFound(actor_profiles, profiles, missing, foundActors(result), stamp)
+        except Exception:
+            pass
+        finally:
+            if conn is not None:
+                conn.close()
+    return [asActor(profiles.get(key)) for key in keys]
+
+
+# movies are (movie_name, year) like the arguments of getMovieProfile
+def getMovieProfiles(movies: Iterable[Tuple[str, int]]) -> List[Movie]:
+    keys = [(movie_name, cacheKey(year)) for movie_name, year in movies]
+    profiles, missing = cachedBatch(movie_profiles, keys, validMovieKey)
+    if missing:
+        conn = None
+        stamp = movie_profiles.stamp()
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.executeStatement("getMovieProfiles", [name for name, _ in missing],
+                                              [year for _, year in missing])
+            conn.commit()
+            cacheFound(movie_profiles, profiles, missing, foundMovies(result), stamp)
+        except Exception:
+            pass
+        finally:
+            if conn is not None:
+                conn.close()
+    return [asMovie(profiles.get(key)) for key in keys]
+
+
+def averageRatings(movies: Iterable[Tuple[str, int]]) -> List[float]:
+    keys = [(movie_name, cacheKey(year)) for movie_name, year in movies]
+    ratings, missing = cachedBatch(movie_ratings, keys, validMovieKey)
+    if missing:
+        conn = None
+        stamp = movie_ratings.stamp()
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.executeStatement("averageRatings", [name for name, _ in missing],
+                                              [year for _, year in missing])
+            conn.commit()
+            cacheFound(movie_ratings, ratings, missing, foundRatings(result), stamp, 0.0)
+        except Exception:
+            pass
+        finally:
+            if conn is not None:
+                conn.close()
+    return [ratings.get(key, 0) for key in keys]
 
 
 # ---------------------------------- BASIC API: ----------------------------------
 def averageRating(movieName: str, movieYear: int) -> float:
+    key = (movieName, cacheKey(movieYear))
+    cached = movie_ratings.get(key)
+    if cached is not MISSING:
+        return cached
+    stamp = movie_ratings.stamp()
     conn = None
     output = 0
-    rows_effected, result = 0
     try:
-        query = sql.SQL("SELECT AVG(review_rating) "
-                        "FROM Reviews "
-                        "WHERE movieName={movieName} AND movie_year={movieYear}").\
-            format(movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear))
         conn = Connector.DBConnector()
-        rows_effected, result = conn.execute(query)
-        # rows_effected is the number of rows received by the SELECT
-        for row in result.rows:
-            for val in row:
-                output = val
-        if output is None:
-            output = 0
-    except DatabaseException.ConnectionInvalid as e:
-        output = 0
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        output = 0
-    except DatabaseException.CHECK_VIOLATION as e:
-        output = 0
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        output = 0
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        output = 0
+        _, result = conn.executeStatement("averageRating", movieName, movieYear)
+        output = ratingValue(result)
+        movie_ratings.put(key, output, stamp)
     except Exception as e:
         output = 0
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
         return output
 
 
 def averageActorRating(actorID: int) -> float:
+    cached = actor_ratings.get(cacheKey(actorID))
+    if cached is not MISSING:
+        return cached
+    stamp = actor_ratings.stamp()
     conn = None
-    result = None
     avg = 0
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL(
-            "SELECT AVG(review_rating) FROM Reviews INNER JOIN Roles ON Reviews.movieName = Roles.movieName AND Reviews.movie_year = Roles.movie_year WHERE Roles.actorID = {actorID}"
-            .format(
-                actorID=sql.Literal(actorID))
-
-        rows_effected, result = conn.execute(query)
+        _, result = conn.executeStatement("averageActorRating", actorID)
         conn.commit()
+        avg = actorRatingValue(result)
+        actor_ratings.put(cacheKey(actorID), avg, stamp)
     except DatabaseException.ConnectionInvalid as e:
         avg = 0
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        conn.rollback()
-        avg = 0
-    except DatabaseException.CHECK_VIOLATION as e:
-        conn.rollback()
-        avg = 0
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        conn.rollback()
-        avg = 0
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        conn.rollback()
-        avg = 0
     except Exception as e:
         conn.rollback()
         avg = 0
     finally:
-        if result:
-            record = result.fetchone()
-            if record is None:
-                return 0
-
-        conn.close()
-        return record[0];
+        if conn is not None:
+            conn.close()
+        return avg
 
 
 def bestPerformance(actor_id: int) -> Movie:
+    best = best_performances.get(cacheKey(actor_id))
+    if best is MISSING:
+        conn = None
+        stamp = best_performances.stamp()
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.executeStatement("bestPerformance", actor_id)
+            conn.commit()
+            best = cacheFirst(best_performances, cacheKey(actor_id), result, movieValues, stamp)
+        except Exception:
+            best = None
+        finally:
+            if conn is not None:
+                conn.close()
+    return asMovie(best)
+
+
+def stageCrewBudget(movieName: str, movieYear: int) -> int:
     conn = None
-    rows_effected= 0, result=ReturnValue.OK
+    budget = -1
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL(    "SELECT m.movieName, m.movie_year, AVG(r.review_rating) as avg_rating "
-                            "FROM Movies m INNER JOIN Roles r "
-                            "ON m.movieName = r.movieName AND m.movie_year = r.movie_year "
-                            "WHERE r.actorID = {actorID} "
-                            "GROUP BY m.movieName, m.movie_year "
-                            "ORDER BY avg_rating DESC, m.movie_year ASC, m.movieName ASC "
-                            "LIMIT 1").\
-            format(movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear), actorID=sql.Literal(actorID))
-        _, result = conn.execute(query)
+        _, result = conn.executeStatement("stageCrewBudget", movieName, movieYear)
         conn.commit()
-        if result.isEmpty():
-            movie = movie.badMovie()
-        else:
-            movie.setMovieName(str(result[0]['movieName']))
-            movie.setYear(int(result[0]['movie_year']))
-            movie.setGenre(int(result[0]['movie_genre']))
-    except Exception:
-        movie = movie.badMovie()
+        budget = budgetValue(result)
+    except Exception as e:
+        budget = -1
     finally:
-        conn.close()
-    return movie
-
-
-def stageCrewBudget(movieName: str, movieYear: int) -> int:
-    conn = Connector.DBConnector()
-    cur = conn.cursor()
-
-    query = sql.SQL(
-        "SELECT production_budget, SUM(job_salary) FROM Productions P INNER JOIN ActingJobs A ON P.movieName = A.movieName AND P.movie_year = A.movie_year WHERE P.movieName = {movieName} AND P.movie_year = {movie_year}"). \
-        format(movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear)
-    cur.execute(query)
-    row = cur.fetchone()
-    if row == None:
-        return -1
-    else:
-    return row[0] - row[1]
+        if conn is not None:
+            conn.close()
+    return budget
 
 
 def overlyInvestedInMovie(movie_name: str, movie_year: int, actor_id: int) -> bool:
     conn = None
-    result=None
-    avg=0
+    invested = False
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("SELECT * "
-                        "FROM (SELECT COALESCE(COUNT(review_rating),0) AS cnt1 "
-                            "FROM Roles"
-                            "WHERE movieName={movieName} AND movie_year={movieYear} AND actorID={actorID}) AS R1 "
-                            "WHERE R1.cnt1 >= (SELECT COUNT(review_rating)*0.5 "
-                                            "FROM Roles"
-                                            "WHERE movieName={movieName} AND movie_year={movieYear}" ) \
-                            .format(movieName=sql.Literal(movieName), movieYear=sql.Literal(movieYear), actorID=sql.Literal(actorID))
-
-        rows_effected, result = conn.execute(query)
+        _, result = conn.executeStatement("overlyInvestedInMovie", movie_name, movie_year, actor_id)
         conn.commit()
-    except DatabaseException.ConnectionInvalid as e:
-        avg = False
-    except DatabaseException.NOT_NULL_VIOLATION as e:
-        conn.rollback()
-        avg = False
-    except DatabaseException.CHECK_VIOLATION as e:
-        conn.rollback()
-        avg = False
-    except DatabaseException.UNIQUE_VIOLATION as e:
-        conn.rollback()
-        avg = False
-    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
-        conn.rollback()
-        avg = False
+        invested = investedValue(result)
     except Exception as e:
-        conn.rollback()
-        avg = False
+        invested = False
     finally:
-        if result:
-            if not result.isEmpty():
-                avg = TRUE
-
-        conn.close()
-        return avg
+        if conn is not None:
+            conn.close()
+    return invested
 
 
 # ---------------------------------- ADVANCED API: ----------------------------------
 
 
-def franchiseRevenue() -> List[Tuple[str, int]]:
+# top: only the first top rows, read like a page
+def franchiseRevenue(top: int = None) -> List[Tuple[str, int]]:
+    if top is not None:
+        return franchiseRevenuePage(top)[0]
     conn = None
     grouped_revenues = []
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("SELECT "
-                        "M1.movieName, COALESCE(SUM(P1.production_revenue),0) AS tot_revenue "
-                        "FROM (Productions P1 RIGHT OUTER JOIN Movies M1 "
-                        "ON (P1.movieName = M1.movieName AND P1.movie_year = M1.movie_year)) "
-                        "GROUP BY M1.movieName "
-                        "ORDER BY M1.movieName DESC ;").format()
-        _, result = conn.execute(query)
-        conn.commit()
-        if not result.isEmpty():
-            for i in range(result.size()):
-                grouped_revenues.append((result[i]['movieName'], result[i]['tot_revenue']))
+        grouped_revenues = franchiseRows(conn.streamStatement("franchiseRevenue"))
     except Exception as e:
         print(e)
         grouped_revenues = []
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
     return grouped_revenues
 
 
-def studioRevenueByYear() -> List[Tuple[int, int, int]]:
+def studioRevenueByYear(top: int = None) -> List[Tuple[int, int, int]]:
+    if top is not None:
+        return studioRevenueByYearPage(top)[0]
     conn = None
     grouped_revenues = []
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("SELECT studioID, movie_year, SUM(production_revenue) AS tot_revenue "
-                        "FROM Productions "
-                        "GROUP BY studioID, movie_year "
-                        "ORDER BY studioID DESC;").format()
-        _, result = conn.execute(query)
-        conn.commit()
-        if not result.isEmpty():
-            for i in range(result.size()):
-                grouped_revenues.append((result[i]['studioID'], result[i]['movie_year'], result[i]['tot_revenue']))
+        grouped_revenues = studioRevenueRows(conn.streamStatement("studioRevenueByYear"))
     except Exception as e:
         print(e)
         grouped_revenues = []
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
     return grouped_revenues
 
 
+# the token of the page after key, the last row of a page of `kind`. It is opaque to callers: base64 of the key
+def pageToken(kind: str, key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps([kind] + list(key)).encode()).decode()
+
+
+# the key a token of pageToken(kind, ...) holds, ValueError for anything else
+def pageKey(kind: str, token: str) -> list:
+    key = json.loads(base64.urlsafe_b64decode(token.encode()))
+    if not isinstance(key, list) or not key or key[0] != kind:
+        raise ValueError("Not a " + kind + " page token")
+    return key[1:]
+
+
+# a page query reads one row more than asked for, which tells whether there is a next page.
+# Returns the rows of the page and the token of the next one, made of the first key_size columns of its last row
+def pageOf(rows: list, page_size: int, kind: str, key_size: int) -> Tuple[list, Union[str, None]]:
+    if len(rows) <= page_size:
+        return rows, None
+    page = rows[:page_size]
+    return page, pageToken(kind, page[-1][:key_size])
+
+
+# franchiseRevenue / studioRevenueByYear a page at a time, in the same order: returns at most page_size rows and
+# the token of the next page, None after the last one. Pass the token back unchanged, the next page starts after
+# the last row of this one, so rows added or deleted in between do not shift it. A token that is not one of
+# these functions' gives an empty page, like any other error
+def franchiseRevenuePage(page_size: int, token: str = None) -> Tuple[List[Tuple[str, int]], Union[str, None]]:
+    if page_size < 1:
+        return [], None
+    conn = None
+    page, next_token = [], None
+    try:
+        conn = Connector.DBConnector()
+        if token is None:
+            _, result = conn.executeStatement("franchiseRevenueTop", page_size + 1)
+        else:
+            _, result = conn.executeStatement("franchiseRevenueAfter", page_size + 1,
+                                              *pageKey("franchiseRevenue", token))
+        conn.commit()
+        page, next_token = pageOf(franchiseRows(result), page_size, "franchiseRevenue", 1)
+    except Exception as e:
+        print(e)
+        page, next_token = [], None
+    finally:
+        if conn is not None:
+            conn.close()
+    return page, next_token
+
+
+def studioRevenueByYearPage(page_size: int, token: str = None) \
+        -> Tuple[List[Tuple[int, int, int]], Union[str, None]]:
+    if page_size < 1:
+        return [], None
+    conn = None
+    page, next_token = [], None
+    try:
+        conn = Connector.DBConnector()
+        if token is None:
+            _, result = conn.executeStatement("studioRevenueByYearTop", page_size + 1)
+        else:
+            _, result = conn.executeStatement("studioRevenueByYearAfter", page_size + 1,
+                                              *pageKey("studioRevenueByYear", token))
+        conn.commit()
+        page, next_token = pageOf(studioRevenueRows(result), page_size, "studioRevenueByYear", 2)
+    except Exception as e:
+        print(e)
+        page, next_token = [], None
+    finally:
+        if conn is not None:
+            conn.close()
+    return page, next_token
+
+
 def getFanCritics() -> List[Tuple[int, int]]:
     conn = None
-    #TODO: fix no studios
     fan_critics = []
     try:
         conn = Connector.DBConnector()
-        query = sql.SQL("SELECT criticID, studioID"
-                        "FROM CriticToStudio"
-                        "WHERE CriticToStudio.critic_unique = (SELECT studio_unique FROM StudioFilms WHERE StudioFilms.studioID = studioID)"
-                        "ORDER BY criticID DESC, studioID DESC;").format()
-        _, result = conn.execute(query)
+        _, result = conn.executeStatement("getFanCritics")
         conn.commit()
-        if not result.isEmpty():
-            for i in range(result.size()):
-                fan_critics.append((result[i]['criticID'], result[i]['studioID']))
+        fan_critics = fanCriticRows(result)
     except Exception as e:
         print(e)
         fan_critics = []
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
     return fan_critics
 
 
@@ -905,46 +1915,32 @@ def averageAgeByGenre() -> List[Tuple[str, float]]:
     avg_by_genre = []
     try:
         conn = Connector.DBConnector()
-        # query = sql.SQL("SELECT "
-        #                 "M.movie_genre, AVG(DISTINCT A.actorID) as avg "
-        #                 "FROM Movies M "
-        #                 "INNER JOIN ActingJobs AJ "
-        #                 "ON M.movieName = AJ.movieName "
-        #                 "AND M.movie_year = AJ.movie_year"
-        #                 "INNER JOIN Actors A "
-        #                 "ON A.actorID = AJ.actorID AS "
-        #                 "GROUP BY M.movie_genre ;").format()
-        query = sql.SQL("SELECT *"
-                        "FROM ActorsToGenre;").format()
-        _, result = conn.execute(query)
+        _, result = conn.executeStatement("averageAgeByGenre")
         conn.commit()
-        if not result.isEmpty():
-            for i in range(result.size()):
-                avg_by_genre.append((result[i]['movie_genre'], result[i]['avg']))
+        avg_by_genre = genreAgeRows(result)
     except Exception as e:
         print(e)
         avg_by_genre = []
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
     return avg_by_genre
 
 
 def getExclusiveActors() -> List[Tuple[int, int]]:
-    # TODO: implement
-    pass
-
-
-# cur.execute("""SELECT A.actor_id, P.studio_id
-#                 FROM Actors A
-#                 INNER JOIN Roles R
-#                 ON A.actor_id = R.actor_id
-#                 INNER JOIN Productions P
-#                 ON P.movieName = R.movieName
-#                 AND P.movie_year = R.movie_year
-#                 GROUP BY A.actor_id, P.studio_id
-#                 HAVING COUNT(DISTINCT P.studio_id) = 1
-#                 ORDER BY A.actor_id DESC""")
-# rows = cur.fetchall()
-# return rows
+    conn = None
+    exclusive_actors = []
+    try:
+        conn = Connector.DBConnector()
+        _, result = conn.executeStatement("getExclusiveActors")
+        conn.commit()
+        exclusive_actors = exclusiveActorRows(result)
+    except Exception as e:
+        print(e)
+        exclusive_actors = []
+    finally:
+        if conn is not None:
+            conn.close()
+    return exclusive_actors
 
 # GOOD LUCK!
@@ -0,0 +1,115 @@
+import asyncio
+import unittest
+import AsyncSolution
+import Solution
+from Utility.AsyncDBConnector import AsyncDBConnector
+from Utility.ReturnValue import ReturnValue
+from Tests.abstractTest import AbstractTest
+
+from Business.Critic import Critic
+from Business.Actor import Actor
+from Business.Movie import Movie
+
+'''
+    Tests for AsyncSolution, each test drives its coroutines with asyncio.run
+    make sure the tests' names start with test
+'''
+
+
+class Test(AbstractTest):
+
+    def testReturnValuesMatchSolution(self) -> None:
+        async def scenario():
+            try:
+                results = [await AsyncSolution.addCritic(Critic(critic_id=1, critic_name="Roger")),
+                           await AsyncSolution.addCritic(Critic(critic_id=1, critic_name="Gene")),
+                           await AsyncSolution.addCritic(Critic(critic_id=2, critic_name=None)),
+                           await AsyncSolution.addMovie(Movie(movie_name="Titanic", year=1997, genre="Drama")),
+                           await AsyncSolution.criticRatedMovie("Titanic", 1997, 1, 5),
+                           await AsyncSolution.criticRatedMovie("Titanic", 1997, 3, 5),
+                           await AsyncSolution.actorPlayedInMovie("Titanic", 1997, 1, 100, []),
+                           await AsyncSolution.deleteCritic(3)]
+                return results, await AsyncSolution.averageRating("Titanic", 1997)
+            finally:
+                await AsyncDBConnector.closePool()
+
+        results, rating = asyncio.run(scenario())
+        self.assertEqual([ReturnValue.OK, ReturnValue.ALREADY_EXISTS, ReturnValue.BAD_PARAMS, ReturnValue.OK,
+                          ReturnValue.OK, ReturnValue.NOT_EXISTS, ReturnValue.BAD_PARAMS, ReturnValue.NOT_EXISTS],
+                         results)
+        self.assertEqual(5.0, rating)
+        self.assertEqual("Roger", Solution.getCriticProfile(1).getName(), "visible to the synchronous API")
+
+    def testManyConcurrentCalls(self) -> None:
+        Solution.addActors([Actor(actor_id=i, actor_name="Actor " + str(i), age=20 + i, height=170)
+                            for i in range(1, 201)])
+
+        async def scenario():
+            try:
+                return await asyncio.gather(*(AsyncSolution.getActorProfile(i) for i in range(1, 201)))
+            finally:
+                await AsyncDBConnector.closePool()
+
+        actors = asyncio.run(scenario())
+        self.assertEqual(list(range(1, 201)), [actor.getActorID() for actor in actors])
+        self.assertEqual(["Actor " + str(i) for i in range(1, 201)], [actor.getActorName() for actor in actors])
+
+
+    def testBatchLookups(self) -> None:
+        Solution.addActors([Actor(actor_id=i, actor_name="Actor " + str(i), age=20 + i, height=170) for i in (1, 2)])
+
+        async def scenario():
+            try:
+                return await AsyncSolution.getActorProfiles([2, 5, 1]), \
+                       await AsyncSolution.averageRatings([("Titanic", 1997)])
+            finally:
+                await AsyncDBConnector.closePool()
+
+        actors, ratings = asyncio.run(scenario())
+        self.assertEqual([2, None, 1], [actor.getActorID() for actor in actors])
+        self.assertEqual([0], ratings)
+
+    def testRevenuePages(self) -> None:
+        Solution.addMovies([Movie(movie_name="Movie " + str(i), year=2000, genre="Drama") for i in range(3)])
+
+        async def scenario():
+            try:
+                first, token = await AsyncSolution.franchiseRevenuePage(2)
+                second, last = await AsyncSolution.franchiseRevenuePage(2, token)
+                return first + second, last, await AsyncSolution.franchiseRevenue(top=1)
+            finally:
+                await AsyncDBConnector.closePool()
+
+        rows, last, top = asyncio.run(scenario())
+        self.assertEqual(Solution.franchiseRevenue(), rows)
+        self.assertIsNone(last)
+        self.assertEqual(rows[:1], top)
+
+    def testBulkDeletes(self) -> None:
+        Solution.addMovies([Movie(movie_name="Movie " + str(i), year=2000, genre="Drama") for i in range(3)])
+        Solution.addCritics([Critic(critic_id=i, critic_name="Critic " + str(i)) for i in (1, 2)])
+        Solution.criticRatedMovie("Movie 1", 2000, 1, 4)
+        self.assertEqual(4, Solution.averageRating("Movie 1", 2000))
+
+        async def scenario():
+            try:
+                return [await AsyncSolution.deleteMovies([("Movie 0", 2000), ("Movie 9", 2000), ("Movie 1", 2000),
+                                                          ("Movie 0", 2000)], chunk_size=2),
+                        await AsyncSolution.deleteCritics([2, 3, -1]),
+                        await AsyncSolution.deleteActors([]),
+                        await AsyncSolution.deleteStudios([1])]
+            finally:
+                await AsyncDBConnector.closePool()
+
+        self.assertEqual([(ReturnValue.OK, [(1, ReturnValue.NOT_EXISTS), (3, ReturnValue.NOT_EXISTS)]),
+                          (ReturnValue.OK, [(1, ReturnValue.NOT_EXISTS), (2, ReturnValue.NOT_EXISTS)]),
+                          (ReturnValue.OK, []),
+                          (ReturnValue.OK, [(0, ReturnValue.NOT_EXISTS)])], asyncio.run(scenario()))
+        self.assertEqual(Movie.badMovie(), Solution.getMovieProfile("Movie 1", 2000))
+        self.assertEqual(0, Solution.averageRating("Movie 1", 2000), "the cached rating went with the movie")
+        self.assertEqual(Critic.badCritic(), Solution.getCriticProfile(2))
+        self.assertEqual("Critic 1", Solution.getCriticProfile(1).getName())
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,305 @@
+import argparse
+import itertools
+import json
+import platform
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+
+from Business.Critic import Critic
+from Business.Actor import Actor
+from Business.Movie import Movie
+from Business.Studio import Studio
+
+'''
+    Latency (p50 / p95 / p99) and throughput of every API function of Solution.py (createTables, dropTables,
+    explainAdvancedAPI and the helpers shared with AsyncSolution aside) on a synthetic catalogue, called from one
+    thread and then from --threads threads at once. The bulk loaders and deletes, the revenue pages, transaction()
+    and clearTables only run from one thread, clearTables once at the very end since it empties the catalogue.
+    Results can be saved as JSON and compared with an earlier run. not a unit test, run it directly:
+    python -m Tests.Benchmark [--movies N] [--critics N] [--actors N] [--studios N] [--reviews N] [--jobs N]
+                              [--productions N] [--ops N] [--threads N] [--cold] [--output FILE] [--compare FILE]
+'''
+
+GENRES = ['Drama', 'Action', 'Comedy', 'Horror']
+# the advanced API aggregates whole tables, it runs this many times fewer calls
+HEAVY = 20
+# keys per call of the batch lookups and the bulk loaders / deletes, rows per revenue page
+BATCH = 50
+
+
+# movie i is ('Movie i', 1900 + i % 120), review k goes to movie k % movies and a different critic for every review
+# of the movie (jobs likewise with actors), the first `productions` movies are produced by studio i % studios.
+# generated server side, the triggers keep the summaries up to date like for any other insert
+def populate(sizes: dict):
+    if sizes["reviews"] > sizes["movies"] * sizes["critics"] or sizes["jobs"] > sizes["movies"] * sizes["actors"] \
+            or sizes["productions"] > sizes["movies"]:
+        raise ValueError("Too many reviews, jobs or productions for the catalogue: " + str(sizes))
+    conn = Connector.DBConnector()
+    try:
+        conn.execute("INSERT INTO Critics SELECT i, 'Critic ' || i FROM generate_series(1, %(critics)s) i; "
+                     "INSERT INTO Actors SELECT i, 'Actor ' || i, 20 + i %% 50, 150 + i %% 50 "
+                     "FROM generate_series(1, %(actors)s) i; "
+                     "INSERT INTO Studios SELECT i, 'Studio ' || i FROM generate_series(1, %(studios)s) i; "
+                     "INSERT INTO Movies SELECT 'Movie ' || i, 1900 + i %% 120, "
+                     "(ARRAY['Drama', 'Action', 'Comedy', 'Horror'])[1 + i %% 4] "
+                     "FROM generate_series(1, %(movies)s) i; "
+                     "INSERT INTO Reviews(review_rating, movieName, movie_year, criticID) "
+                     "SELECT 1 + k %% 5, 'Movie ' || m, 1900 + m %% 120, (k / %(movies)s + m * 7) %% %(critics)s + 1 "
+                     "FROM (SELECT k, k %% %(movies)s + 1 AS m FROM generate_series(0, %(reviews)s - 1) k) K; "
+                     "INSERT INTO ActingJobs(job_salary, movieName, movie_year, actorID) "
+                     "SELECT 1000 + k %% 1000, 'Movie ' || m, 1900 + m %% 120, "
+                     "(k / %(movies)s + m * 3) %% %(actors)s + 1 "
+                     "FROM (SELECT k, k %% %(movies)s + 1 AS m FROM generate_series(0, %(jobs)s - 1) k) K; "
+                     "INSERT INTO Roles(roleName, movieName, movie_year, actorID) "
+                     "SELECT 'Role', movieName, movie_year, actorID FROM ActingJobs; "
+                     "INSERT INTO Productions(production_budget, production_revenue, studioID, movieName, movie_year) "
+                     "SELECT 100 + i %% 900, 1000 + i * 37 %% 5000, i %% %(studios)s + 1, 'Movie ' || i, "
+                     "1900 + i %% 120 "
+                     "FROM generate_series(1, %(productions)s) i;",
+                     params=sizes)
+        conn.cursor.execute("ANALYZE;")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# (name, function, [arguments of each call], whether the function returns a ReturnValue) in the order they run.
+# the write functions work on fresh ids / movies, each pair leaves the catalogue as it found it
+def cases(sizes: dict, ops: int, fresh, rng: random.Random) -> list:
+    movie = lambda i: ("Movie " + str(i), 1900 + i % 120)
+    some_movie = lambda: movie(rng.randint(1, sizes["movies"]))
+    some = lambda kind: rng.randint(1, sizes[kind])
+    calls = lambda make, count=ops: [make() for _ in range(count)]
+    heavy = max(ops // HEAVY, 3)
+
+    ids = [next(fresh) for _ in range(ops)]
+    movies = [("Bench " + str(i), 2000) for i in ids]
+    reviews = [movies[i] + (some("critics"),) for i in range(ops)]
+    jobs = [movies[i] + (some("actors"),) for i in range(ops)]
+    productions = [(some("studios"),) + movies[i] for i in range(ops)]
+    return [
+        ("getCriticProfile", Solution.getCriticProfile, calls(lambda: (some("critics"),)), False),
+        ("getActorProfile", Solution.getActorProfile, calls(lambda: (some("actors"),)), False),
+        ("getMovieProfile", Solution.getMovieProfile, calls(some_movie), False),
+        ("getStudioProfile", Solution.getStudioProfile, calls(lambda: (some("studios"),)), False),
+        ("getActorProfiles", Solution.getActorProfiles,
+         calls(lambda: ([some("actors") for _ in range(BATCH)],)), False),
+        ("getMovieProfiles", Solution.getMovieProfiles, calls(lambda: ([some_movie() for _ in range(BATCH)],)), False),
+        ("averageRatings", Solution.averageRatings, calls(lambda: ([some_movie() for _ in range(BATCH)],)), False),
+        ("averageRating", Solution.averageRating, calls(some_movie), False),
+        ("averageActorRating", Solution.averageActorRating, calls(lambda: (some("actors"),)), False),
+        ("bestPerformance", Solution.bestPerformance, calls(lambda: (some("actors"),)), False),
+        ("stageCrewBudget", Solution.stageCrewBudget, calls(some_movie), False),
+        ("overlyInvestedInMovie", Solution.overlyInvestedInMovie,
+         calls(lambda: some_movie() + (some("actors"),)), False),
+        ("franchiseRevenue", Solution.franchiseRevenue, calls(tuple, heavy), False),
+        ("studioRevenueByYear", Solution.studioRevenueByYear, calls(tuple, heavy), False),
+        ("getFanCritics", Solution.getFanCritics, calls(tuple, heavy), False),
+        ("averageAgeByGenre", Solution.averageAgeByGenre, calls(tuple, heavy), False),
+        ("getExclusiveActors", Solution.getExclusiveActors, calls(tuple, heavy), False),
+        ("addCritic", Solution.addCritic, [(Critic(critic_id=i, critic_name="Bench"),) for i in ids], True),
+        ("addActor", Solution.addActor, [(Actor(actor_id=i, actor_name="Bench", age=30, height=170),) for i in ids],
+         True),
+        ("addStudio", Solution.addStudio, [(Studio(studio_id=i, studio_name="Bench"),) for i in ids], True),
+        ("addMovie", Solution.addMovie,
+         [(Movie(movie_name=name, year=year, genre=rng.choice(GENRES)),) for name, year in movies], True),
+        ("criticRatedMovie", Solution.criticRatedMovie, [review + (rng.randint(1, 5),) for review in reviews], True),
+        ("actorPlayedInMovie", Solution.actorPlayedInMovie, [job + (1000, ["Bench"]) for job in jobs], True),
+        ("studioProducedMovie", Solution.studioProducedMovie, [production + (100, 1000) for production in productions],
+         True),
+        ("criticDidntRateMovie", Solution.criticDidntRateMovie, reviews, True),
+        ("actorDidntPlayInMovie", Solution.actorDidntPlayInMovie, jobs, True),
+        ("studioDidntProduceMovie", Solution.studioDidntProduceMovie, productions, True),
+        ("deleteMovie", Solution.deleteMovie, movies, True),
+        ("deleteStudio", Solution.deleteStudio, [(i,) for i in ids], True),
+        ("deleteActor", Solution.deleteActor, [(i,) for i in ids], True),
+        ("deleteCritic", Solution.deleteCritic, [(i,) for i in ids], True),
+    ]
+
+
+# the cases of cases() that only run from one thread: every bulk call loads (or deletes) BATCH fresh rows, the pages
+# are walked from the first one and every transaction adds and deletes a fresh critic
+def singleCases(sizes: dict, ops: int, fresh, rng: random.Random) -> list:
+    some = lambda kind: rng.randint(1, sizes[kind])
+    heavy = max(ops // HEAVY, 3)
+
+    batches = [[next(fresh) for _ in range(BATCH)] for _ in range(ops)]
+    movies = [[("Bulk " + str(i), 2000) for i in batch] for batch in batches]
+    return [
+        ("addCritics", Solution.addCritics,
+         [([Critic(critic_id=i, critic_name="Bench") for i in batch],) for batch in batches], True),
+        ("addActors", Solution.addActors,
+         [([Actor(actor_id=i, actor_name="Bench", age=30, height=170) for i in batch],) for batch in batches], True),
+        ("addStudios", Solution.addStudios,
+         [([Studio(studio_id=i, studio_name="Bench") for i in batch],) for batch in batches], True),
+        ("addMovies", Solution.addMovies,
+         [([Movie(movie_name=name, year=year, genre=rng.choice(GENRES)) for name, year in batch],) for batch in movies],
+         True),
+        ("criticRatedMovies", Solution.criticRatedMovies,
+         [([movie + (some("critics"), rng.randint(1, 5)) for movie in batch],) for batch in movies], True),
+        ("actorPlayedInMovies", Solution.actorPlayedInMovies,
+         [([movie + (some("actors"), 1000, ["Bench"]) for movie in batch],) for batch in movies], True),
+        ("studioProducedMovies", Solution.studioProducedMovies,
+         [([(some("studios"),) + movie + (100, 1000) for movie in batch],) for batch in movies], True),
+        ("deleteMovies", Solution.deleteMovies, [(batch,) for batch in movies], True),
+        ("deleteStudios", Solution.deleteStudios, [(batch,) for batch in batches], True),
+        ("deleteActors", Solution.deleteActors, [(batch,) for batch in batches], True),
+        ("deleteCritics", Solution.deleteCritics, [(batch,) for batch in batches], True),
+        ("franchiseRevenuePage", Solution.franchiseRevenuePage,
+         pageArguments(Solution.franchiseRevenuePage, heavy), False),
+        ("studioRevenueByYearPage", Solution.studioRevenueByYearPage,
+         pageArguments(Solution.studioRevenueByYearPage, heavy), False),
+        ("transaction", addAndDeleteInTransaction, [(next(fresh),) for _ in range(ops)], True),
+    ]
+
+
+# (BATCH, token) of the first `count` pages, starting over from the first page when there are fewer
+def pageArguments(paged, count: int) -> list:
+    tokens, token = [None], None
+    while len(tokens) < count:
+        _, token = paged(BATCH, token)
+        if token is None:
+            break
+        tokens.append(token)
+    return [(BATCH, token) for token in itertools.islice(itertools.cycle(tokens), count)]
+
+
+# one Solution.transaction() around an addCritic and the deleteCritic of the same critic, the commit included
+def addAndDeleteInTransaction(critic_id: int) -> ReturnValue:
+    with Solution.transaction():
+        Solution.addCritic(Critic(critic_id=critic_id, critic_name="Bench"))
+        return Solution.deleteCritic(critic_id)
+
+
+# calls function with every argument tuple from `threads` threads, returns the latencies in milliseconds,
+# the wall time in seconds and how many calls did not return ReturnValue.OK (or raised)
+def measure(function, arguments: list, checked: bool, threads: int) -> (list, float, int):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    next_call = itertools.count()
+
+    def worker():
+        nonlocal errors
+        local_latencies, local_errors = [], 0
+        while True:
+            i = next(next_call)
+            if i >= len(arguments):
+                break
+            start = time.perf_counter()
+            try:
+                result = function(*arguments[i])
+                # a bulk call returns (OK, []) when every row went through
+                failed = checked and result != ReturnValue.OK and result != (ReturnValue.OK, [])
+            except Exception:
+                failed = True
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            local_errors += failed
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    start = time.perf_counter()
+    if threads == 1:
+        worker()
+    else:
+        with ThreadPoolExecutor(threads) as executor:
+            for future in [executor.submit(worker) for _ in range(threads)]:
+                future.result()
+    return latencies, time.perf_counter() - start, errors
+
+
+def summarize(latencies: list, wall: float, errors: int) -> dict:
+    cuts = statistics.quantiles(latencies * (2 if len(latencies) == 1 else 1), n=100, method='inclusive')
+    return {"calls": len(latencies), "errors": errors, "mean_ms": statistics.fmean(latencies),
+            "p50_ms": cuts[49], "p95_ms": cuts[94], "p99_ms": cuts[98], "ops_per_sec": len(latencies) / wall}
+
+
+def run(sizes: dict, ops: int, threads: int, seed: int) -> dict:
+    fresh = itertools.count(max(sizes.values()) + 1)
+    results = {}
+    for mode, mode_threads in (("single", 1), ("concurrent", threads)):
+        # open the pool's connections up front, so that the first function measured does not pay for them
+        measure(Solution.getCriticProfile, [(1,)] * mode_threads * 10, False, mode_threads)
+        results[mode] = {}
+        rng = random.Random(seed)
+        measured = cases(sizes, ops, fresh, rng) + (singleCases(sizes, ops, fresh, rng) if mode_threads == 1 else [])
+        for name, function, arguments, checked in measured:
+            Solution._clearCaches()
+            results[mode][name] = summarize(*measure(function, arguments, checked, mode_threads))
+            print("%-11s %-24s %s" % (mode, name, describe(results[mode][name])))
+    # empties the catalogue, so it is measured last and once
+    results["single"]["clearTables"] = summarize(*measure(Solution.clearTables, [()], False, 1))
+    print("%-11s %-24s %s" % ("single", "clearTables", describe(results["single"]["clearTables"])))
+    return results
+
+
+def describe(stats: dict) -> str:
+    return "p50 %8.3f  p95 %8.3f  p99 %8.3f ms  %9.1f ops/s%s" % (
+        stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["ops_per_sec"],
+        "  (%d errors)" % stats["errors"] if stats["errors"] else "")
+
+
+# p50 and ops/s of this run relative to a saved one, > 1 means slower / faster
+def compare(results: dict, baseline: dict):
+    print("\n%-11s %-24s %14s %14s" % ("vs baseline", "", "p50 ratio", "ops/s ratio"))
+    for mode, functions in results.items():
+        for name, stats in functions.items():
+            old = baseline.get("results", {}).get(mode, {}).get(name)
+            if old is None:
+                continue
+            print("%-11s %-24s %13.2fx %13.2fx" % (mode, name, stats["p50_ms"] / max(old["p50_ms"], 1e-9),
+                                                  stats["ops_per_sec"] / max(old["ops_per_sec"], 1e-9)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=10000)
+    parser.add_argument("--critics", type=int, default=1000)
+    parser.add_argument("--actors", type=int, default=2000)
+    parser.add_argument("--studios", type=int, default=50)
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--jobs", type=int, default=30000)
+    parser.add_argument("--productions", type=int, default=9000)
+    parser.add_argument("--ops", type=int, default=200, help="calls per function and mode")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cold", action="store_true", help="disable the in-process caches")
+    parser.add_argument("--label", default="", help="stored in the JSON output, e.g. a commit or a version")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    sizes = {name: getattr(args, name) for name in
+             ("movies", "critics", "actors", "studios", "reviews", "jobs", "productions")}
+    Connector.DBConnector.configurePool(maxconn=max(args.threads, Connector.DBConnector.poolSettings()
+                                                    .get('maxconn', 20)))
+    if args.cold:
+        for cache in Solution.profile_caches + Solution.rating_caches:
+            cache.configure(maxsize=0)
+
+    Solution.dropTables()
+    Solution.createTables()
+    try:
+        start = time.perf_counter()
+        populate(sizes)
+        print("loaded %s in %.1fs" % (sizes, time.perf_counter() - start))
+        results = run(sizes, args.ops, args.threads, args.seed)
+    finally:
+        Solution.dropTables()
+
+    report = {"label": args.label, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "sizes": sizes, "ops": args.ops, "threads": args.threads, "seed": args.seed, "cold": args.cold,
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
@@ -0,0 +1,41 @@
+import time
+import unittest
+from Utility.Cache import Cache, MISSING
+
+'''
+    Tests for the in-process cache, they do not need a database
+    make sure the tests' names start with test
+'''
+
+
+class Test(unittest.TestCase):
+
+    def testLeastRecentlyUsedIsEvicted(self) -> None:
+        cache = Cache("test", maxsize=2, ttl=0)
+        cache.put(1, "a")
+        cache.put(2, "b")
+        self.assertEqual("a", cache.get(1))
+        cache.put(3, "c")
+        self.assertIs(MISSING, cache.get(2), "2 was the least recently used")
+        self.assertEqual("a", cache.get(1))
+        self.assertEqual({'hits': 2, 'misses': 1, 'evictions': 1, 'size': 2, 'maxsize': 2}, cache.stats())
+
+    def testEntriesExpire(self) -> None:
+        cache = Cache("test", maxsize=10, ttl=0.05)
+        cache.put(1, None)
+        self.assertIsNone(cache.get(1), "None is a value like any other")
+        time.sleep(0.1)
+        self.assertIs(MISSING, cache.get(1))
+
+    def testStaleReadsAreDropped(self) -> None:
+        cache = Cache("test", maxsize=10, ttl=0)
+        stamp = cache.stamp()
+        cache.invalidate(1)  # a writer changed the row while the value was being read
+        self.assertFalse(cache.put(1, "old", stamp))
+        self.assertTrue(cache.put(1, "new", cache.stamp()))
+        self.assertFalse(Cache("disabled", maxsize=0, ttl=0).put(1, "a"))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
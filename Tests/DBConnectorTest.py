@@ -0,0 +1,292 @@
+import os
+import threading
+from array import array
+import unittest
+import Utility.DBConnector as Connector
+from Utility import Instrumentation
+from Utility.Exceptions import DatabaseException
+
+'''
+    Tests for the connection layer itself, they only need a reachable database
+    make sure the tests' names start with test
+'''
+
+
+class Test(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        Connector.DBConnector.resetPoolSettings()
+
+    def testPoolReusesConnections(self) -> None:
+        conn = Connector.DBConnector()
+        _, result = conn.execute("SELECT pg_backend_pid() AS pid")
+        first_pid = result[0]['pid']
+        conn.close()
+        conn = Connector.DBConnector()
+        _, result = conn.execute("SELECT pg_backend_pid() AS pid")
+        conn.close()
+        self.assertEqual(first_pid, result[0]['pid'], "connection should come back from the pool")
+
+    def testPoolRollsBackOnReturn(self) -> None:
+        conn = Connector.DBConnector()
+        conn.cursor.execute("CREATE TEMP TABLE pool_probe(x INTEGER)")
+        conn.close()
+        conn = Connector.DBConnector()
+        _, result = conn.execute("SELECT to_regclass('pg_temp.pool_probe') IS NULL AS gone")
+        conn.close()
+        self.assertTrue(result[0]['gone'], "uncommitted work must not survive a return to the pool")
+
+    def testPoolIsBounded(self) -> None:
+        Connector.DBConnector.configurePool(minconn=0, maxconn=2, checkout_timeout=0.5)
+        first, second = Connector.DBConnector(), Connector.DBConnector()
+        self.assertRaises(DatabaseException.ConnectionInvalid, Connector.DBConnector)
+        released = threading.Timer(0.05, first.close)
+        released.start()
+        third = Connector.DBConnector()  # waits for first to be returned
+        third.close()
+        second.close()
+        released.join()
+
+    def testStatementPreparedOncePerConnection(self) -> None:
+        Connector.DBConnector.registerStatement("connectorTestAdd", "SELECT $1::INTEGER + $2::INTEGER AS total;")
+        conn = Connector.DBConnector()
+        _, first = conn.executeStatement("connectorTestAdd", 1, 2)
+        _, second = conn.executeStatement("connectorTestAdd", 3, 4)
+        _, prepared = conn.execute("SELECT COUNT(*) AS cnt FROM pg_prepared_statements "
+                                   "WHERE name = 'connectorTestAdd'")
+        conn.close()
+        self.assertEqual(3, first[0]['total'])
+        self.assertEqual(7, second[0]['total'])
+        self.assertEqual(1, prepared[0]['cnt'], "statement should be prepared exactly once")
+        self.assertRaises(ValueError, Connector.DBConnector.registerStatement, "connectorTestAdd", "SELECT 1;")
+
+    def testStreamFetchesInChunks(self) -> None:
+        conn = Connector.DBConnector()
+        try:
+            stream = conn.stream("SELECT i AS Value FROM generate_series(1, %s) i", params=(10,), chunk_size=3)
+            values = []
+            for row in stream:
+                values.append(row['VALUE'])
+                conn.cursor.execute("SELECT COUNT(*) FROM pg_cursors WHERE name LIKE 'stream%'")
+                self.assertEqual(1, conn.cursor.fetchone()[0], "rows come from a server-side cursor")
+            self.assertEqual(list(range(1, 11)), values)
+            self.assertEqual(['value'], stream.cols_header)
+            Connector.DBConnector.registerStatement("connectorTestSeries",
+                                                    "SELECT i FROM generate_series($1::INTEGER, $2::INTEGER) i "
+                                                    "WHERE i % 2 = 0;")
+            self.assertEqual([2, 4, 6], [row['i'] for row in conn.streamStatement("connectorTestSeries", 1, 7)])
+        finally:
+            conn.close()
+
+    def testResultSetRowsAndColumns(self) -> None:
+        conn = Connector.DBConnector()
+        _, result = conn.execute("SELECT * FROM (VALUES (1, 'a', 1.5::FLOAT, NULL::INTEGER), (2, 'b', 2.5, 7)) "
+                                 "AS T(movieID, name, rating, extra)")
+        conn.close()
+        self.assertEqual(2, result[1]['MovieID'], "column names are case-insensitive")
+        self.assertIsNone(result[0][0], "non-string keys give None")
+        self.assertEqual(['movieid', 'name', 'rating', 'extra'], list(result[0]))
+        self.assertEqual([1, 2], [row['movieid'] for row in result])
+        self.assertEqual(array('q', [1, 2]), result.column('movieID'))
+        self.assertEqual(array('d', [1.5, 2.5]), result.column('rating'))
+        self.assertEqual([None, 7], result.column('extra'), "columns with NULLs stay lists")
+        self.assertEqual({}, result[5], "invalid rows are empty")
+
+    def testTransactionSharesOneConnection(self) -> None:
+        conn = Connector.DBConnector()
+        conn.execute("CREATE TABLE IF NOT EXISTS transaction_test(v INTEGER PRIMARY KEY)")
+        conn.close()
+        try:
+            with Connector.DBConnector.transaction():
+                inner = Connector.DBConnector()
+                inner.execute("INSERT INTO transaction_test VALUES (1)")
+                with self.assertRaises(DatabaseException.UNIQUE_VIOLATION):
+                    inner.execute("INSERT INTO transaction_test VALUES (1)")
+                inner.close()
+                other = threading.Thread(target=lambda: seen.append(self.__count()))
+                seen = []
+                other.start()
+                other.join()
+                self.assertEqual([0], seen, "not committed yet")
+                with self.assertRaises(KeyError):
+                    with Connector.DBConnector.transaction():
+                        Connector.DBConnector().execute("INSERT INTO transaction_test VALUES (2)")
+                        raise KeyError()
+                self.assertEqual(1, self.__count(), "the failed insert and the nested transaction are undone")
+            self.assertEqual(1, self.__count())
+            self.assertIsNone(Connector.Transaction.current())
+        finally:
+            conn = Connector.DBConnector()
+            conn.execute("DROP TABLE transaction_test")
+            conn.close()
+
+    def testFlushReportsEachStatement(self) -> None:
+        Connector.DBConnector.registerStatement("flushTestInsert", "INSERT INTO transaction_test VALUES ($1);")
+        conn = Connector.DBConnector()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS transaction_test(v INTEGER PRIMARY KEY CHECK (v > 0))")
+            conn.queueStatement("flushTestInsert", 1)
+            conn.queue("INSERT INTO transaction_test VALUES (%s), (%s)", params=(2, 3))
+            self.assertEqual([None, None], conn.flush(), "one round trip, nothing failed")
+            self.assertEqual(3, self.__count())
+            for v in (4, 1, -1, 5):
+                conn.queueStatement("flushTestInsert", v)
+            conn.queue("INSERT INTO no_such_table VALUES (1)")
+            outcomes = conn.flush()
+            self.assertEqual([type(None), DatabaseException.UNIQUE_VIOLATION, DatabaseException.CHECK_VIOLATION,
+                              type(None), DatabaseException.UNKNOWN_ERROR], [type(outcome) for outcome in outcomes])
+            self.assertEqual(5, self.__count(), "the statements that did not fail are committed")
+            self.assertEqual([], conn.flush())
+        finally:
+            conn.execute("DROP TABLE transaction_test")
+            conn.close()
+
+    def testFlushAppliesAFailedBatchPartially(self) -> None:
+        conn = Connector.DBConnector()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS transaction_test(v INTEGER PRIMARY KEY CHECK (v > 0))")
+            for v in (10, 20):
+                conn.queue("INSERT INTO transaction_test VALUES (%s)", params=(v,))
+            conn.queue("UPDATE transaction_test SET v = -v WHERE v = 20")
+            conn.queue("INSERT INTO transaction_test VALUES (%s)", params=(30,))
+            outcomes = conn.flush()
+            self.assertEqual([type(None), type(None), DatabaseException.CHECK_VIOLATION, type(None)],
+                             [type(outcome) for outcome in outcomes])
+            _, rows = conn.execute("SELECT v FROM transaction_test ORDER BY v")
+            self.assertEqual([10, 20, 30], [row['v'] for row in rows],
+                             "the statements around the failed one are committed, not the whole batch undone")
+        finally:
+            conn.execute("DROP TABLE transaction_test")
+            conn.close()
+
+    def testQueryTimingSinks(self) -> None:
+        Connector.DBConnector.registerStatement("timingTestSeries", "SELECT generate_series(1, $1) AS n;")
+        timings, histogram = [], Instrumentation.HistogramSink(key=lambda timing: timing.statement)
+        callback = Instrumentation.CallbackSink(timings.append)
+        Instrumentation.addSink(callback)
+        Instrumentation.addSink(histogram)
+        try:
+            conn = Connector.DBConnector()
+            try:
+                conn.executeStatement("timingTestSeries", 3)
+                conn.executeStatement("timingTestSeries", 5)
+                with self.assertRaises(Exception):
+                    conn.execute("SELECT * FROM no_such_table")
+            finally:
+                conn.close()
+        finally:
+            Instrumentation.removeSink(callback)
+            Instrumentation.removeSink(histogram)
+        self.assertEqual(3, len(timings))
+        self.assertTrue(timings[0].api.endswith(".testQueryTimingSinks"), "the caller of the connector is reported")
+        self.assertEqual(["timingTestSeries", "timingTestSeries", "SELECT * FROM no_such_table"],
+                         [timing.statement for timing in timings])
+        self.assertEqual([3, 5, 0], [timing.rows for timing in timings])
+        self.assertEqual([None, None, "UndefinedTable"], [timing.error for timing in timings])
+        self.assertGreater(timings[0].connect_ms, 0, "borrowing the connection is counted once")
+        self.assertEqual(0, timings[1].connect_ms)
+        summary = histogram.snapshot()["timingTestSeries"]
+        self.assertEqual((2, 8, 0), (summary['count'], summary['rows'], summary['errors']))
+        self.assertLessEqual(summary['p50_ms'], summary['max_ms'])
+        conn = Connector.DBConnector()
+        conn.executeStatement("timingTestSeries", 1)
+        conn.close()
+        self.assertEqual(3, len(timings), "nothing is recorded once the sinks are removed")
+
+    def testExplainedStatementsCarryTheirPlan(self) -> None:
+        Connector.DBConnector.registerStatement("explainTestSort", "SELECT n FROM generate_series(1, $1) AS n "
+                                                                   "ORDER BY n::TEXT;")
+        Connector.DBConnector.registerStatement("explainTestInsert", "INSERT INTO transaction_test VALUES ($1);")
+        Connector.DBConnector.registerStatement("explainTestCount", "SELECT COUNT(*) FROM transaction_test;")
+        conn = Connector.DBConnector()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS transaction_test(v INTEGER PRIMARY KEY CHECK (v > 0))")
+            _, result = conn.executeStatement("explainTestSort", 10)
+            self.assertIsNone(result.plan, "only the statements asked for are explained")
+            Connector.DBConnector.explainStatements("explainTestSort", "explainTestInsert", "explainTestCount",
+                                                    seq_scan_rows=1)
+            conn.execute("SET work_mem = '64kB'")
+            _, result = conn.executeStatement("explainTestSort", 100000)
+            self.assertEqual(100000, result.size())
+            self.assertIs(result.plan, Connector.DBConnector.lastPlan("explainTestSort"))
+            self.assertEqual(1, len([node for node in result.plan.nodes() if node['Node Type'] == 'Sort']))
+            self.assertTrue(any("spilled" in warning for warning in result.plan.warnings), result.plan.warnings)
+            with conn.streamStatement("explainTestSort", 5) as stream:
+                self.assertEqual(5, len(list(stream)))
+                self.assertEqual([], stream.plan.warnings, "5 rows sort in memory")
+            conn.executeStatement("explainTestInsert", 1)
+            self.assertEqual(1, self.__count(), "the explained run is rolled back")
+            plan = Connector.DBConnector.lastPlan("explainTestInsert")
+            self.assertEqual("ModifyTable", plan.plan['Plan']['Node Type'])
+            _, result = conn.executeStatement("explainTestCount")
+            self.assertEqual(["Seq Scan on transaction_test read 1 rows"], result.plan.warnings)
+        finally:
+            Connector.DBConnector.explainStatements()
+            conn.execute("DROP TABLE transaction_test")
+            conn.close()
+
+    def testSchemaSetsSearchPath(self) -> None:
+        os.environ['DATABASE_POSTGRESQL_SCHEMA'] = 'connector_test_schema'
+        try:
+            Connector.DBConnector.reloadConfig()
+            self.assertEqual('connector_test_schema', Connector.DBConnector.schema())
+            conn = Connector.DBConnector()
+            try:
+                conn.execute("CREATE SCHEMA IF NOT EXISTS connector_test_schema")
+                conn.execute("CREATE TABLE schema_probe(v INTEGER)")
+                _, result = conn.execute("SELECT current_schema() AS name, "
+                                         "to_regclass('connector_test_schema.schema_probe') IS NOT NULL AS created")
+                self.assertEqual(('connector_test_schema', True), (result[0]['name'], result[0]['created']))
+            finally:
+                conn.execute("DROP SCHEMA connector_test_schema CASCADE")
+                conn.close()
+        finally:
+            del os.environ['DATABASE_POSTGRESQL_SCHEMA']
+            Connector.DBConnector.reloadConfig()
+        self.assertIsNone(Connector.DBConnector.schema())
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "needs os.fork")
+    def testForkedChildOpensItsOwnConnections(self) -> None:
+        conn = Connector.DBConnector()
+        backend = conn.execute("SELECT pg_backend_pid() AS pid")[1][0]['pid']
+        conn.close()
+        child = os.fork()
+        if child == 0:
+            code = 1
+            try:
+                conn = Connector.DBConnector()
+                code = 0 if conn.execute("SELECT pg_backend_pid() AS pid")[1][0]['pid'] != backend else 2
+                conn.close()
+                Connector.DBConnector.closePool()
+            finally:
+                os._exit(code)
+        self.assertEqual(0, os.waitstatus_to_exitcode(os.waitpid(child, 0)[1]), "the child used a session of its own")
+        conn = Connector.DBConnector()
+        self.assertEqual(backend, conn.execute("SELECT pg_backend_pid() AS pid")[1][0]['pid'],
+                         "the child did not close the parent's connection")
+        conn.close()
+
+    @staticmethod
+    def __count() -> int:
+        conn = Connector.DBConnector()
+        try:
+            return conn.execute("SELECT COUNT(*) AS n FROM transaction_test")[1][0]['n']
+        finally:
+            conn.close()
+
+    def testConfigEnvironmentOverride(self) -> None:
+        os.environ['DATABASE_POSTGRESQL_APPLICATION_NAME'] = 'config_override'
+        try:
+            Connector.DBConnector.reloadConfig()
+            conn = Connector.DBConnector()
+            _, result = conn.execute("SELECT current_setting('application_name') AS name")
+            conn.close()
+            self.assertEqual('config_override', result[0]['name'], "environment should override database.ini")
+        finally:
+            del os.environ['DATABASE_POSTGRESQL_APPLICATION_NAME']
+            Connector.DBConnector.reloadConfig()
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,115 @@
+import argparse
+import statistics
+import time
+import Solution
+import Utility.DBConnector as Connector
+
+'''
+    Times the analytics queries and the cascading deletes with and without the secondary indexes
+    createTables builds, on a synthetic catalogue of (by default) one million reviews.
+    not a unit test, run it directly: python -m Tests.IndexBenchmark [--reviews N] [--repeat N]
+'''
+
+INDEXES = {"Reviews_critic_idx": "CREATE INDEX Reviews_critic_idx ON Reviews(criticID)",
+           "Jobs_actor_idx": "CREATE INDEX Jobs_actor_idx ON ActingJobs(actorID)",
+           "Productions_studio_idx": "CREATE INDEX Productions_studio_idx ON Productions(studioID, movie_year)"}
+
+REVIEWS_PER_MOVIE = 10
+JOBS_PER_MOVIE = 3
+
+
+# every movie gets REVIEWS_PER_MOVIE reviews by distinct critics, JOBS_PER_MOVIE distinct actors with one role
+# each and one studio, generated server side rather than sent over the wire
+def populate(reviews: int) -> dict:
+    movies = max(reviews // REVIEWS_PER_MOVIE, 1)
+    sizes = {"movies": movies, "critics": max(movies // 10, REVIEWS_PER_MOVIE),
+             "actors": max(movies // 5, JOBS_PER_MOVIE), "studios": max(movies // 200, 1)}
+    conn = Connector.DBConnector()
+    try:
+        conn.execute("INSERT INTO Critics SELECT i, 'Critic ' || i FROM generate_series(1, %(critics)s) i; "
+                     "INSERT INTO Actors SELECT i, 'Actor ' || i, 20 + i %% 50, 150 + i %% 50 "
+                     "FROM generate_series(1, %(actors)s) i; "
+                     "INSERT INTO Studios SELECT i, 'Studio ' || i FROM generate_series(1, %(studios)s) i; "
+                     "INSERT INTO Movies SELECT 'Movie ' || i, 1900 + i %% 120, "
+                     "(ARRAY['Drama', 'Action', 'Comedy', 'Horror'])[1 + i %% 4] "
+                     "FROM generate_series(1, %(movies)s) i; "
+                     "INSERT INTO Reviews(review_rating, movieName, movie_year, criticID) "
+                     "SELECT 1 + (i + k) %% 5, 'Movie ' || i, 1900 + i %% 120, (i + k) %% %(critics)s + 1 "
+                     "FROM generate_series(1, %(movies)s) i, generate_series(0, %(reviews)s - 1) k; "
+                     "INSERT INTO ActingJobs(job_salary, movieName, movie_year, actorID) "
+                     "SELECT 1000, 'Movie ' || i, 1900 + i %% 120, (i * 3 + k) %% %(actors)s + 1 "
+                     "FROM generate_series(1, %(movies)s) i, generate_series(0, %(jobs)s - 1) k; "
+                     "INSERT INTO Roles(roleName, movieName, movie_year, actorID) "
+                     "SELECT 'Role', movieName, movie_year, actorID FROM ActingJobs; "
+                     "INSERT INTO Productions(production_budget, production_revenue, studioID, movieName, movie_year) "
+                     "SELECT 100, 1000 + i %% 1000, i %% %(studios)s + 1, 'Movie ' || i, 1900 + i %% 120 "
+                     "FROM generate_series(1, %(movies)s) i;",
+                     params=dict(sizes, reviews=REVIEWS_PER_MOVIE, jobs=JOBS_PER_MOVIE))
+        conn.cursor.execute("ANALYZE;")
+        conn.commit()
+    finally:
+        conn.close()
+    return sizes
+
+
+def setIndexes(enabled: bool):
+    conn = Connector.DBConnector()
+    try:
+        for name, create in INDEXES.items():
+            conn.queue("DROP INDEX IF EXISTS " + name)
+            if enabled:
+                conn.queue(create)
+        conn.queue("ANALYZE")
+        failures = [failure for failure in conn.flush() if failure is not None]
+        if failures:
+            raise failures[0]
+    finally:
+        conn.close()
+
+
+# median wall time in milliseconds, each call gets its own argument so deletes never hit the same row twice
+def timed(function, arguments) -> float:
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(sizes: dict, repeat: int, round_number: int) -> dict:
+    # deletes take fresh ids from the top of each range on every round
+    fresh = lambda count: range(count - round_number * repeat, count - (round_number + 1) * repeat, -1)
+    # the rating aggregates are cached, every round has to reach the database
+    Solution._clearCaches()
+    return {"averageActorRating": timed(Solution.averageActorRating, range(1, repeat + 1)),
+            "bestPerformance": timed(Solution.bestPerformance, range(1, repeat + 1)),
+            "getFanCritics": timed(lambda _: Solution.getFanCritics(), range(repeat)),
+            "deleteCritic": timed(Solution.deleteCritic, fresh(sizes["critics"])),
+            "deleteActor": timed(Solution.deleteActor, fresh(sizes["actors"])),
+            "deleteStudio": timed(Solution.deleteStudio, fresh(sizes["studios"]))}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reviews", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    Solution.dropTables()
+    Solution.createTables()
+    try:
+        start = time.perf_counter()
+        sizes = populate(args.reviews)
+        print("loaded %d reviews in %.1fs: %s" % (sizes["movies"] * REVIEWS_PER_MOVIE,
+                                                 time.perf_counter() - start, sizes))
+        setIndexes(False)
+        without = run(sizes, args.repeat, 0)
+        setIndexes(True)
+        with_indexes = run(sizes, args.repeat, 1)
+        print("%-20s %14s %14s %9s" % ("median ms", "no indexes", "indexes", "speedup"))
+        for name in without:
+            print("%-20s %14.2f %14.2f %8.1fx" % (name, without[name], with_indexes[name],
+                                                 without[name] / max(with_indexes[name], 1e-9)))
+    finally:
+        Solution.dropTables()
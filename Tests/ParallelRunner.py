@@ -0,0 +1,103 @@
+import argparse
+import os
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from psycopg2 import sql
+import Solution
+import Utility.DBConnector as Connector
+
+'''
+    Runs test modules sharded across a pool of processes. Every worker owns a schema of its own (see
+    DBConnector.schema), so the tables of the workers are isolated from each other and from public,
+    and the results of all workers are merged into one report:
+    python -m Tests.ParallelRunner [--workers N] [module ...]
+'''
+
+MODULES = ['Tests.SimpleTest', 'Tests.AsyncTest', 'Tests.DBConnectorTest', 'Tests.CacheTest']
+SCHEMA_PREFIX = 'test_worker_'
+
+
+# the ids of every test of the modules, e.g. Tests.SimpleTest.Test.testCritic
+def testIds(modules: list) -> list:
+    ids = []
+    pending = [unittest.defaultTestLoader.loadTestsFromNames(modules)]
+    while pending:
+        suite = pending.pop(0)
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                pending.append(test)
+            else:
+                ids.append(test.id())
+    return ids
+
+
+# round robin, the tests of one class stay in order so each worker sets the class up once per shard
+def shard(ids: list, workers: int) -> list:
+    return [ids[i::workers] for i in range(workers) if ids[i::workers]]
+
+
+def runShard(index: int, ids: list) -> dict:
+    schema = SCHEMA_PREFIX + str(index)
+    os.environ['DATABASE_POSTGRESQL_SCHEMA'] = schema
+    Connector.DBConnector.reloadConfig()
+    # a worker process can run several shards, nothing cached from the schema of the last one may come back
+    Solution._clearCaches()
+    recreate = sql.SQL("DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}").format(
+        schema=sql.Identifier(schema))
+    execute(recreate)
+    started = time.perf_counter()
+    result = unittest.TestResult()
+    try:
+        unittest.defaultTestLoader.loadTestsFromNames(ids).run(result)
+    finally:
+        execute(sql.SQL("DROP SCHEMA IF EXISTS {schema} CASCADE").format(schema=sql.Identifier(schema)))
+        Connector.DBConnector.closePool()
+    return {'schema': schema, 'run': result.testsRun, 'seconds': time.perf_counter() - started,
+            'failures': [(test.id(), trace) for test, trace in result.failures],
+            'errors': [(test.id(), trace) for test, trace in result.errors],
+            'skipped': [(test.id(), reason) for test, reason in result.skipped]}
+
+
+def execute(query: sql.Composed):
+    conn = Connector.DBConnector()
+    try:
+        conn.execute(query)
+    finally:
+        conn.close()
+
+
+# prints the merged report like unittest does, returns whether every test passed
+def report(results: list, seconds: float) -> bool:
+    failures = [failure for result in results for failure in result['failures']]
+    errors = [error for result in results for error in result['errors']]
+    for kind, problems in (('ERROR', errors), ('FAIL', failures)):
+        for test, trace in problems:
+            print('=' * 70)
+            print(kind + ': ' + test)
+            print('-' * 70)
+            print(trace)
+    for result in results:
+        print(result['schema'] + ': ' + str(result['run']) + ' tests in ' + '%.2fs' % result['seconds'])
+    print('-' * 70)
+    print('Ran ' + str(sum(result['run'] for result in results)) + ' tests in ' + '%.2fs' % seconds +
+          ' on ' + str(len(results)) + ' workers')
+    skipped = sum(len(result['skipped']) for result in results)
+    if failures or errors:
+        print('FAILED (failures=' + str(len(failures)) + ', errors=' + str(len(errors)) + ')')
+    else:
+        print('OK' + (' (skipped=' + str(skipped) + ')' if skipped else ''))
+    return not failures and not errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    shards = shard(testIds(args.modules), max(args.workers, 1))
+    with ProcessPoolExecutor(max_workers=len(shards) or 1) as executor:
+        results = list(executor.map(runShard, range(len(shards)), shards))
+    exit(0 if report(results, time.perf_counter() - started) else 1)
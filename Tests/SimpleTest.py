@@ -1,5 +1,6 @@
 import unittest
 import Solution
+import Utility.DBConnector as Connector
 from Utility.ReturnValue import ReturnValue
 from Tests.abstractTest import AbstractTest
 
@@ -48,6 +49,271 @@ class Test(AbstractTest):
         paramount = Studio(studio_id=1, studio_name="Paramount")
         self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.addStudio(paramount), "ID 1 already exists")
 
+    def testBusinessObjectsAsKeys(self) -> None:
+        tom_hanks = Actor(actor_id=1, actor_name="Tom Hanks", age=66, height=183)
+        self.assertEqual(ReturnValue.OK, Solution.addActor(tom_hanks))
+        self.assertEqual(ReturnValue.OK, Solution.addMovie(Movie(movie_name="Big", year=1988, genre="Comedy")))
+        seen = {Solution.getActorProfile(1), Solution.getActorProfile(1), Solution.getActorProfile(2),
+                Solution.getMovieProfile("Big", 1988), Movie.badMovie(), Critic.badCritic(), Studio.badStudio()}
+        self.assertEqual(6, len(seen), "equal objects are one set member")
+        self.assertIn(tom_hanks, seen)
+        self.assertIn(Actor.badActor(), seen)
+        self.assertNotEqual(Critic.badCritic(), Studio.badStudio(), "different entities are never equal")
+        self.assertEqual("MovieName=None, Year=None, Genre=None", str(Movie.badMovie()))
+        self.assertFalse(hasattr(Movie.badMovie(), '__dict__'))
+
+    def testBasicAPI(self) -> None:
+        titanic = Movie(movie_name="Titanic", year=1997, genre="Drama")
+        inception = Movie(movie_name="Inception", year=2010, genre="Action")
+        self.assertEqual(ReturnValue.OK, Solution.addMovie(titanic), "should work")
+        self.assertEqual(ReturnValue.OK, Solution.addMovie(inception), "should work")
+        self.assertEqual(ReturnValue.OK, Solution.addActor(Actor(actor_id=1, actor_name="Leo", age=48, height=183)))
+        self.assertEqual(ReturnValue.OK, Solution.addCritic(Critic(critic_id=1, critic_name="John")))
+        self.assertEqual(ReturnValue.OK, Solution.addCritic(Critic(critic_id=2, critic_name="Bob")))
+        self.assertEqual(ReturnValue.BAD_PARAMS, Solution.criticRatedMovie("Titanic", 1997, 1, 6), "rating too high")
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.criticRatedMovie("Titanic", 1997, 3, 5), "no such critic")
+        self.assertEqual(ReturnValue.OK, Solution.criticRatedMovie("Titanic", 1997, 1, 5), "should work")
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.criticRatedMovie("Titanic", 1997, 1, 4), "rated twice")
+        self.assertEqual(ReturnValue.OK, Solution.criticRatedMovie("Titanic", 1997, 2, 4), "should work")
+        self.assertEqual(4.5, Solution.averageRating("Titanic", 1997), "average of 5 and 4")
+        self.assertEqual(ReturnValue.BAD_PARAMS, Solution.actorPlayedInMovie("Titanic", 1997, 1, 100, []), "no roles")
+        self.assertEqual(ReturnValue.OK, Solution.actorPlayedInMovie("Titanic", 1997, 1, 100, ["Jack", "Narrator"]))
+        self.assertEqual(ReturnValue.OK, Solution.actorPlayedInMovie("Inception", 2010, 1, 100, ["Cobb"]))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.actorPlayedInMovie("Inception", 2010, 1, 100, ["Cobb"]))
+        self.assertEqual(2.25, Solution.averageActorRating(1), "Inception has no reviews and counts as 0")
+        self.assertEqual(titanic, Solution.bestPerformance(1), "Titanic is rated higher")
+        self.assertTrue(Solution.overlyInvestedInMovie("Titanic", 1997, 1), "plays every role")
+        self.assertEqual(ReturnValue.OK, Solution.actorDidntPlayInMovie("Titanic", 1997, 1), "should work")
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.actorDidntPlayInMovie("Titanic", 1997, 1), "already removed")
+        self.assertFalse(Solution.overlyInvestedInMovie("Titanic", 1997, 1), "roles left with the job")
+        self.assertEqual(ReturnValue.OK, Solution.criticDidntRateMovie("Titanic", 1997, 1), "should work")
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.criticDidntRateMovie("Titanic", 1997, 1), "already removed")
+
+    def testBulkLoad(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.addActor(Actor(actor_id=3, actor_name="Kate", age=47, height=169)))
+        actors = (Actor(actor_id=i, actor_name=name, age=40, height=180)
+                  for i, name in [(1, "Leo"), (2, None), (1, "Leo again"), (3, "Kate again"), (4, "Tom")])
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.BAD_PARAMS), (2, ReturnValue.ALREADY_EXISTS),
+                                           (3, ReturnValue.ALREADY_EXISTS)]), Solution.addActors(actors))
+        self.assertEqual("Leo", Solution.getActorProfile(1).getActorName(), "first copy wins")
+        self.assertEqual("Tom", Solution.getActorProfile(4).getActorName(), "loaded")
+        movies = [Movie(movie_name="Titanic", year=1997, genre="Drama"), Movie(movie_name="Up", year=1800, genre="Drama")]
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.BAD_PARAMS)]), Solution.addMovies(movies), "invalid year")
+
+    def testBulkRelationships(self) -> None:
+        Solution.addMovies([Movie(movie_name="Titanic", year=1997, genre="Drama"),
+                            Movie(movie_name="Up", year=2009, genre="Comedy")])
+        Solution.addCritics([Critic(critic_id=1, critic_name="Roger")])
+        Solution.addActors([Actor(actor_id=1, actor_name="Leo", age=40, height=180)])
+        Solution.addStudios([Studio(studio_id=1, studio_name="Fox")])
+        reviews = [("Titanic", 1997, 1, 5), ("Titanic", 1997, 1, 4), ("Titanic", 1997, 2, 5), ("Up", 2009, 1, 7),
+                   ("Up", 2009, 1, 3)]
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.ALREADY_EXISTS), (2, ReturnValue.NOT_EXISTS),
+                                           (3, ReturnValue.BAD_PARAMS)]), Solution.criticRatedMovies(reviews))
+        self.assertEqual(5, Solution.averageRating("Titanic", 1997), "first copy wins")
+        jobs = [("Titanic", 1997, 1, 100, ["Jack", "Dawson"]), ("Up", 2009, 1, 100, []),
+                ("Up", 2009, 1, 100, ["Carl", "Carl"]), ("Up", 2009, 2, 100, ["Russell"])]
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.BAD_PARAMS), (2, ReturnValue.ALREADY_EXISTS),
+                                           (3, ReturnValue.NOT_EXISTS)]), Solution.actorPlayedInMovies(jobs))
+        self.assertEqual(ReturnValue.OK, Solution.actorDidntPlayInMovie("Titanic", 1997, 1), "job was loaded")
+        productions = [(2, "Titanic", 1997, 10, 20), (1, "Titanic", 1997, 10, -1), (1, "Titanic", 1997, 10, 20),
+                       (2, "Titanic", 1997, 10, 20)]
+        self.assertEqual((ReturnValue.OK, [(0, ReturnValue.NOT_EXISTS), (1, ReturnValue.BAD_PARAMS),
+                                           (3, ReturnValue.ALREADY_EXISTS)]), Solution.studioProducedMovies(productions))
+
+    def testSummariesFollowDeletes(self) -> None:
+        Solution.addMovies([Movie(movie_name="Titanic", year=1997, genre="Drama"),
+                            Movie(movie_name="Up", year=2009, genre="Drama")])
+        Solution.addCritics([Critic(critic_id=1, critic_name="Roger")])
+        Solution.addActors([Actor(actor_id=1, actor_name="Leo", age=40, height=180),
+                            Actor(actor_id=2, actor_name="Kate", age=30, height=170)])
+        Solution.addStudios([Studio(studio_id=1, studio_name="Fox")])
+        Solution.studioProducedMovies([(1, "Titanic", 1997, 10, 20), (1, "Up", 2009, 10, 20)])
+        Solution.criticRatedMovies([("Titanic", 1997, 1, 5), ("Up", 2009, 1, 4)])
+        Solution.actorPlayedInMovies([("Titanic", 1997, 1, 100, ["Jack"]), ("Up", 2009, 1, 100, ["Carl"]),
+                                      ("Up", 2009, 2, 100, ["Ellie"])])
+        self.assertEqual([(1, 1)], Solution.getFanCritics())
+        self.assertEqual([("Drama", 35.0)], Solution.averageAgeByGenre())
+        self.assertEqual(ReturnValue.OK, Solution.criticDidntRateMovie("Up", 2009, 1))
+        self.assertEqual([], Solution.getFanCritics(), "one of the studio's movies is not rated anymore")
+        self.assertEqual(ReturnValue.OK, Solution.deleteMovie("Up", 2009))
+        self.assertEqual([(1, 1)], Solution.getFanCritics(), "the unrated movie is gone")
+        self.assertEqual([("Drama", 40.0)], Solution.averageAgeByGenre(), "Kate only played in the deleted movie")
+        self.assertEqual(ReturnValue.OK, Solution.deleteActor(1))
+        self.assertEqual([], Solution.averageAgeByGenre())
+
+    def testClearTablesEmptiesTheSummaries(self) -> None:
+        Solution.addMovies([Movie(movie_name="Titanic", year=1997, genre="Drama")])
+        Solution.addCritics([Critic(critic_id=1, critic_name="Critic")])
+        Solution.addActors([Actor(actor_id=1, actor_name="Leo", age=40, height=180)])
+        Solution.addStudios([Studio(studio_id=1, studio_name="Fox")])
+        Solution.studioProducedMovie(1, "Titanic", 1997, 100, 1000)
+        Solution.criticRatedMovie("Titanic", 1997, 1, 5)
+        Solution.actorPlayedInMovie("Titanic", 1997, 1, 100, ["Jack"])
+        self.assertEqual(5, Solution.averageRating("Titanic", 1997))
+        self.assertIsInstance(Solution.clearTables(), float, "the time it took")
+        self.assertEqual(Movie.badMovie(), Solution.getMovieProfile("Titanic", 1997))
+        self.assertEqual(0, Solution.averageRating("Titanic", 1997))
+        self.assertEqual(([], [], []), (Solution.getFanCritics(), Solution.averageAgeByGenre(),
+                                        Solution.getExclusiveActors()))
+        Solution.addMovies([Movie(movie_name="Titanic", year=1997, genre="Drama")])
+        Solution.addCritics([Critic(critic_id=1, critic_name="Critic")])
+        Solution.criticRatedMovie("Titanic", 1997, 1, 3)
+        self.assertEqual(3, Solution.averageRating("Titanic", 1997), "the summaries start over from zero")
+
+    def testBulkDeletes(self) -> None:
+        Solution.addMovies([Movie(movie_name="Movie " + str(i), year=2000, genre="Drama") for i in range(5)])
+        Solution.addCritics([Critic(critic_id=1, critic_name="Critic")])
+        Solution.addActors([Actor(actor_id=1, actor_name="Leo", age=40, height=180)])
+        Solution.criticRatedMovie("Movie 4", 2000, 1, 5)
+        Solution.actorPlayedInMovie("Movie 4", 2000, 1, 100, ["Jack"])
+        self.assertEqual(5, Solution.averageActorRating(1))
+        movies = [("Movie 0", 2000), ("Movie 9", 2000), ("Movie 1", 2000), ("Movie 0", 2000), ("Movie 4", "2000")]
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.NOT_EXISTS), (3, ReturnValue.NOT_EXISTS)]),
+                         Solution.deleteMovies(movies, chunk_size=2), "absent and already deleted keys")
+        self.assertEqual(Movie.badMovie(), Solution.getMovieProfile("Movie 1", 2000))
+        self.assertEqual(Movie(movie_name="Movie 2", year=2000, genre="Drama"),
+                         Solution.getMovieProfile("Movie 2", 2000))
+        self.assertEqual(0, Solution.averageActorRating(1), "the cached rating went with the movie")
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.NOT_EXISTS), (2, ReturnValue.NOT_EXISTS)]),
+                         Solution.deleteCritics([1, 2, -1]))
+        self.assertEqual((ReturnValue.OK, [(1, ReturnValue.NOT_EXISTS)]), Solution.deleteActors(["1", 1]))
+        self.assertEqual((ReturnValue.OK, [(0, ReturnValue.NOT_EXISTS)]), Solution.deleteStudios([1]))
+        self.assertEqual((ReturnValue.OK, []), Solution.deleteStudios([]))
+
+    def testRevenuePages(self) -> None:
+        Solution.addMovies([Movie(movie_name="Movie " + str(i), year=2000 + i % 3, genre="Drama") for i in range(5)])
+        Solution.addStudios([Studio(studio_id=i, studio_name="Studio") for i in (1, 2)])
+        Solution.studioProducedMovies([(1 + i % 2, "Movie " + str(i), 2000 + i % 3, 10, 100 * i) for i in range(5)])
+        for function, paged in ((Solution.franchiseRevenue, Solution.franchiseRevenuePage),
+                                (Solution.studioRevenueByYear, Solution.studioRevenueByYearPage)):
+            rows, token, pages = [], None, 0
+            while pages == 0 or token is not None:
+                page, token = paged(2, token)
+                self.assertLessEqual(len(page), 2)
+                rows, pages = rows + page, pages + 1
+            self.assertEqual(function(), rows, "the pages put together are the whole list")
+            self.assertEqual(function()[:3], function(top=3))
+        self.assertEqual(3, pages, "5 (studio, year) pairs, no empty page after the last one")
+        page, token = Solution.franchiseRevenuePage(3)
+        Solution.deleteMovie("Movie 0", 2000)  # a row of the next page
+        self.assertEqual([("Movie 1", 100)], Solution.franchiseRevenuePage(3, token)[0],
+                         "the next page starts after the last row of this one, whatever changed since")
+        self.assertEqual(([], None), Solution.studioRevenueByYearPage(2, token), "a token of the other function")
+
+    def testRatingSummary(self) -> None:
+        Solution.addMovies([Movie(movie_name="Titanic", year=1997, genre="Drama"),
+                            Movie(movie_name="Up", year=2009, genre="Drama")])
+        Solution.addCritics([Critic(critic_id=i, critic_name="Critic") for i in (1, 2, 3)])
+        Solution.addActors([Actor(actor_id=1, actor_name="Leo", age=40, height=180)])
+        Solution.actorPlayedInMovies([("Titanic", 1997, 1, 100, ["Jack"]), ("Up", 2009, 1, 100, ["Carl"])])
+        Solution.criticRatedMovies([("Titanic", 1997, 1, 5), ("Titanic", 1997, 2, 2), ("Up", 2009, 1, 4)])
+        self.assertEqual(ReturnValue.OK, Solution.criticRatedMovie("Titanic", 1997, 3, 2))
+        self.assertEqual(3.0, Solution.averageRating("Titanic", 1997))
+        self.assertEqual(3.5, Solution.averageActorRating(1))
+        self.assertEqual("Up", Solution.bestPerformance(1).getMovieName())
+        self.assertEqual(ReturnValue.OK, Solution.criticDidntRateMovie("Titanic", 1997, 2))
+        self.assertEqual(ReturnValue.OK, Solution.deleteCritic(3))
+        self.assertEqual(5.0, Solution.averageRating("Titanic", 1997))
+        self.assertEqual("Titanic", Solution.bestPerformance(1).getMovieName())
+        self.assertEqual(ReturnValue.OK, Solution.deleteCritic(1))
+        self.assertEqual((0, 0), (Solution.averageRating("Titanic", 1997), Solution.averageActorRating(1)),
+                         "no reviews left")
+
+    def testBatchLookups(self) -> None:
+        Solution.addActors([Actor(actor_id=i, actor_name="Actor " + str(i), age=30, height=170) for i in (1, 2, 3)])
+        Solution.addMovies([Movie(movie_name="Titanic", year=1997, genre="Drama"),
+                            Movie(movie_name="Up", year=2009, genre="Comedy")])
+        Solution.addCritic(Critic(critic_id=1, critic_name="Roger"))
+        Solution.criticRatedMovie("Up", 2009, 1, 4)
+        self.assertEqual("Actor 2", Solution.getActorProfile(2).getActorName(), "cached before the batch")
+        actors = Solution.getActorProfiles([3, 9, "1", None, 2, 3])
+        self.assertEqual([3, None, 1, None, 2, 3], [actor.getActorID() for actor in actors])
+        self.assertEqual(ReturnValue.OK, Solution.deleteActor(3))
+        self.assertEqual([Actor.badActor(), Actor.badActor()], Solution.getActorProfiles([3, 3]), "delete invalidates")
+        movies = Solution.getMovieProfiles([("Up", 2009), ("Titanic", "1997"), ("Titanic", 1998)])
+        self.assertEqual(["Comedy", "Drama", None], [movie.getGenre() for movie in movies])
+        self.assertEqual([4.0, 0, 0], Solution.averageRatings([("Up", 2009), ("Titanic", 1997), ("Jaws", 1975)]))
+        self.assertEqual([], Solution.averageRatings([]))
+
+    def testBulkCallsWithoutAConnection(self) -> None:
+        Connector.DBConnector.configurePool(minconn=0, maxconn=1, checkout_timeout=0.1)
+        held = Connector.DBConnector()  # the pool has no connection left to lend
+        try:
+            self.assertEqual((ReturnValue.ERROR, [(0, ReturnValue.ERROR), (1, ReturnValue.ERROR)]),
+                             Solution.deleteCritics([1, 2]))
+            self.assertEqual((ReturnValue.ERROR, []), Solution.addCritics([Critic(critic_id=1, critic_name="John")]))
+            self.assertEqual([Actor.badActor()], Solution.getActorProfiles([1]))
+            self.assertEqual([Movie.badMovie()], Solution.getMovieProfiles([("Titanic", 1997)]))
+            self.assertEqual([0], Solution.averageRatings([("Titanic", 1997)]))
+        finally:
+            held.close()
+            Connector.DBConnector.resetPoolSettings()
+
+    def testSingleCallsWithoutAConnection(self) -> None:
+        Connector.DBConnector.configurePool(minconn=0, maxconn=1, checkout_timeout=0.1)
+        held = Connector.DBConnector()  # the pool has no connection left to lend
+        try:
+            self.assertEqual(ReturnValue.ERROR, Solution.addCritic(Critic(critic_id=1, critic_name="John")))
+            self.assertEqual(Critic.badCritic(), Solution.getCriticProfile(1))
+            self.assertEqual(ReturnValue.ERROR, Solution.deleteCritic(1))
+            self.assertEqual(ReturnValue.ERROR, Solution.criticRatedMovie("Titanic", 1997, 1, 5))
+            self.assertEqual(0, Solution.averageRating("Titanic", 1997))
+            self.assertEqual([], Solution.getFanCritics())
+        finally:
+            held.close()
+            Connector.DBConnector.resetPoolSettings()
+
+    def testTransaction(self) -> None:
+        with self.assertRaises(KeyError):
+            with Solution.transaction():
+                titanic = Movie(movie_name="Titanic", year=1997, genre="Drama")
+                self.assertEqual(ReturnValue.OK, Solution.addMovie(titanic))
+                self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.addMovie(titanic))
+                self.assertEqual("Drama", Solution.getMovieProfile("Titanic", 1997).getGenre())
+                raise KeyError()
+        self.assertEqual(Movie.badMovie(), Solution.getMovieProfile("Titanic", 1997), "rolled back")
+        with Solution.transaction():
+            Solution.addMovie(Movie(movie_name="Titanic", year=1997, genre="Drama"))
+            Solution.addCritic(Critic(critic_id=1, critic_name="Roger"))
+            self.assertEqual(ReturnValue.NOT_EXISTS, Solution.criticRatedMovie("Titanic", 1997, 2, 5))
+            self.assertEqual(ReturnValue.OK, Solution.criticRatedMovie("Titanic", 1997, 1, 5))
+        self.assertEqual(5.0, Solution.averageRating("Titanic", 1997))
+
+    def testProfileCache(self) -> None:
+        self.assertEqual(Movie.badMovie(), Solution.getMovieProfile("Titanic", 1997))
+        self.assertEqual(ReturnValue.OK, Solution.addMovie(Movie(movie_name="Titanic", year="1997", genre="Drama")))
+        before = Solution.movie_profiles.stats()
+        self.assertEqual("Drama", Solution.getMovieProfile("Titanic", 1997).getGenre(), "add invalidates")
+        self.assertEqual("Drama", Solution.getMovieProfile("Titanic", "1997").getGenre())
+        after = Solution.movie_profiles.stats()
+        self.assertEqual((1, 1), (after['misses'] - before['misses'], after['hits'] - before['hits']))
+        self.assertEqual(ReturnValue.OK, Solution.deleteMovie("Titanic", 1997))
+        self.assertEqual(Movie.badMovie(), Solution.getMovieProfile("Titanic", 1997), "delete invalidates")
+
+    def testRatingCache(self) -> None:
+        Solution.addCritic(Critic(critic_id=1, critic_name="Roger"))
+        Solution.addActors([Actor(actor_id=i, actor_name="Actor", age=30, height=180) for i in (1, 2)])
+        Solution.addMovies([Movie(movie_name="Titanic", year=1997, genre="Drama"),
+                            Movie(movie_name="Avatar", year=2009, genre="Action")])
+        self.assertEqual(ReturnValue.OK, Solution.actorPlayedInMovie("Titanic", 1997, 1, 100, ["Jack"]))
+        self.assertEqual(ReturnValue.OK, Solution.actorPlayedInMovie("Avatar", 2009, 2, 100, ["Jake"]))
+        self.assertEqual((0, 0), (Solution.averageRating("Titanic", 1997), Solution.averageActorRating(1)))
+        self.assertEqual((0, 0), (Solution.averageRating("Avatar", 2009), Solution.averageActorRating(2)))
+        self.assertEqual(ReturnValue.OK, Solution.criticRatedMovie("Titanic", 1997, 1, 4))
+        before = Solution.actor_ratings.stats()
+        self.assertEqual((4, 4), (Solution.averageRating("Titanic", 1997), Solution.averageActorRating(1)))
+        self.assertEqual((0, 0), (Solution.averageRating("Avatar", 2009), Solution.averageActorRating(2)),
+                         "other keys stay cached")
+        after = Solution.actor_ratings.stats()
+        self.assertEqual((1, 1), (after['misses'] - before['misses'], after['hits'] - before['hits']))
+        self.assertEqual("Titanic", Solution.bestPerformance(1).getMovieName())
+        self.assertEqual(ReturnValue.OK, Solution.deleteCritic(1))
+        self.assertEqual((0, 0), (Solution.averageRating("Titanic", 1997), Solution.averageActorRating(1)),
+                         "cascaded reviews invalidate")
+        self.assertEqual(ReturnValue.OK, Solution.deleteMovie("Titanic", 1997))
+        self.assertEqual(Movie.badMovie(), Solution.bestPerformance(1), "cascaded jobs invalidate")
+
 
 # *** DO NOT RUN EACH TEST MANUALLY ***
 if __name__ == '__main__':
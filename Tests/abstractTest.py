@@ -1,12 +1,35 @@
 import unittest
 import Solution as Solution
+from Utility.DBConnector import DBConnector
 
 
 class AbstractTest(unittest.TestCase):
+    # the schema is created once per test class and emptied with clearTables after each test, which is much faster
+    # than running the DDL around every test. Set fixture = recreate in the [tests] section of database.ini
+    # (or DATABASE_TESTS_FIXTURE=recreate) to create and drop the tables around every test instead
+    @staticmethod
+    def recreateTables() -> bool:
+        return DBConnector.configSection('tests').get('fixture', 'clear') == 'recreate'
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        if not AbstractTest.recreateTables():
+            Solution.dropTables()
+            Solution.createTables()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        if not AbstractTest.recreateTables():
+            Solution.dropTables()
+
     # before each test, setUp is executed
     def setUp(self) -> None:
-        Solution.createTables()
+        if AbstractTest.recreateTables():
+            Solution.createTables()
 
     # after each test, tearDown is executed
     def tearDown(self) -> None:
-        Solution.dropTables()
+        if AbstractTest.recreateTables():
+            Solution.dropTables()
+        else:
+            Solution.clearTables()
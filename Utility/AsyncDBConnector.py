@@ -0,0 +1,330 @@
+import asyncio
+import time
+import weakref
+import psycopg2
+from psycopg2 import errors, extensions, sql
+from typing import Union
+from Utility.ConnectionPool import PooledConnection
+from Utility.DBConnector import DBConnector, ResultSet
+from Utility.Exceptions import DatabaseException
+from Utility import Instrumentation
+
+
+# drives an asynchronous psycopg2 connection until its pending operation is done,
+# the event loop is free to run other tasks while the socket is not ready
+async def _wait(conn: PooledConnection):
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        ready = loop.create_future()
+        wake = lambda: ready.done() or ready.set_result(None)
+        fd = conn.fileno()
+        if state == extensions.POLL_READ:
+            loop.add_reader(fd, wake)
+            try:
+                await ready
+            finally:
+                loop.remove_reader(fd)
+        elif state == extensions.POLL_WRITE:
+            loop.add_writer(fd, wake)
+            try:
+                await ready
+            finally:
+                loop.remove_writer(fd)
+        else:
+            raise psycopg2.OperationalError("Unexpected poll state " + str(state))
+
+
+class AsyncConnectionPool:
+    # constructor, the same limits as ConnectionPool. Belongs to the event loop that uses it first,
+    # no connections are opened until the first getconn since a constructor cannot wait for them
+    def __init__(self, params: dict, minconn=1, maxconn=20, idle_timeout=300.0, checkout_timeout=30.0,
+                 ping_interval=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: minconn=" + str(minconn) + ", maxconn=" + str(maxconn))
+        self.params = dict(params)
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self.__idle = []  # LIFO, so the warmest connections are reused first
+        self.__opened = 0  # idle + checked out
+        self.__closed = False
+        self.__released = asyncio.Condition()
+
+    # how many connections are currently open / idle
+    def size(self):
+        return self.__opened
+
+    def idle(self):
+        return len(self.__idle)
+
+    # borrow a connection, waits while all maxconn connections are checked out
+    async def getconn(self) -> PooledConnection:
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            if self.__closed:
+                raise DatabaseException.ConnectionInvalid("Connection pool is closed")
+            self.__pruneIdle()
+            if self.__idle:
+                conn = self.__idle.pop()
+                if await self.__healthy(conn):
+                    return conn
+                self.__discard(conn)
+                continue
+            if self.__opened < self.maxconn:
+                self.__opened += 1
+                try:
+                    return await self.__connect()
+                except Exception:
+                    self.__forget()
+                    raise
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DatabaseException.ConnectionInvalid("Connection pool exhausted")
+            async with self.__released:
+                try:
+                    await asyncio.wait_for(self.__released.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    # give a borrowed connection back, any open transaction is rolled back first
+    async def putconn(self, conn: PooledConnection):
+        if not await self.__reset(conn):
+            self.__discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        if self.__closed:
+            self.__opened -= 1
+            conn.close()
+        else:
+            self.__idle.append(conn)
+        await self.__notify()
+
+    # close every idle connection, checked out connections are closed when they are returned
+    async def closeall(self):
+        self.__closed = True
+        idle, self.__idle = self.__idle, []
+        self.__opened -= len(idle)
+        for conn in idle:
+            conn.close()
+        async with self.__released:
+            self.__released.notify_all()
+
+    async def __connect(self) -> PooledConnection:
+        conn = psycopg2.connect(connection_factory=PooledConnection, async_=True, **self.params)
+        try:
+            await _wait(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    async def __healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.ping_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            await _wait(conn)
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    # asynchronous connections run in autocommit mode, so only an explicit BEGIN leaves a transaction open
+    @staticmethod
+    async def __reset(conn: PooledConnection) -> bool:
+        if conn.closed or conn.isexecuting():  # e.g. the borrowing task was cancelled mid-query
+            return False
+        try:
+            status = conn.get_transaction_status()
+            if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+                cursor = conn.cursor()
+                cursor.execute("ROLLBACK")
+                await _wait(conn)
+                cursor.close()
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                return False
+            return True
+        except Exception:
+            return False
+
+    def __discard(self, conn: PooledConnection):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self.__forget()
+
+    def __forget(self):
+        self.__opened -= 1
+        asyncio.ensure_future(self.__notify())
+
+    async def __notify(self):
+        async with self.__released:
+            self.__released.notify()
+
+    def __pruneIdle(self):
+        now = time.monotonic()
+        # the stack bottom holds the connections idle for the longest time
+        while self.__idle and self.__opened > self.minconn and now - self.__idle[0].last_used > self.idle_timeout:
+            self.__idle.pop(0).close()
+            self.__opened -= 1
+
+
+class AsyncDBConnector:
+    # the asyncio counterpart of DBConnector: same connection parameters, pool limits, registered statements and
+    # DatabaseException mapping, but every call that talks to the database is a coroutine.
+    # asynchronous psycopg2 connections are always in autocommit mode, which matches DBConnector.execute committing
+    # after every query; a query string with several statements still runs in one transaction.
+    # COPY and named cursors are not available on them, use DBConnector for copyFrom and stream.
+    #
+    #     conn = AsyncDBConnector()
+    #     try:
+    #         await conn.connect()
+    #         rows_effected, result = await conn.executeStatement("getCriticProfile", 1)
+    #     finally:
+    #         await conn.close()
+
+    # one pool per event loop, asyncio primitives cannot be shared between loops
+    __pools = weakref.WeakKeyDictionary()
+
+    # constructor, the connection is borrowed by connect()
+    def __init__(self):
+        self.connection = None
+        self.cursor = None
+        self.__owner = None
+        self.__connect_ms = 0.0  # reported with the first timed query, see Instrumentation
+
+    async def connect(self):
+        started = time.perf_counter() if Instrumentation.sinks else None
+        try:
+            self.__owner = AsyncDBConnector.__getPool()
+            self.connection = await self.__owner.getconn()
+            self.cursor = self.connection.cursor()
+        except Exception as e:
+            await self.close()
+            raise DatabaseException.ConnectionInvalid("Could not connect to database")
+        if started is not None:
+            self.__connect_ms = (time.perf_counter() - started) * 1000
+
+    # close connection, the underlying connection goes back to the pool with its transaction rolled back
+    async def close(self):
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            await self.__owner.putconn(connection)
+
+    # close every idle connection of the current event loop's pool, the next connect opens a fresh pool
+    @staticmethod
+    async def closePool():
+        pool = AsyncDBConnector.__pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.closeall()
+
+    @staticmethod
+    def __getPool() -> AsyncConnectionPool:
+        loop = asyncio.get_running_loop()
+        pool = AsyncDBConnector.__pools.get(loop)
+        if pool is None:
+            pool = AsyncConnectionPool(DBConnector.connectionParams(), **DBConnector.poolSettings())
+            AsyncDBConnector.__pools[loop] = pool
+        return pool
+
+    # commit connection's changes, only needed after an explicit BEGIN
+    async def commit(self):
+        if self.connection is not None and \
+                self.connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                await self.__run("COMMIT")
+            except Exception:
+                raise DatabaseException.ConnectionInvalid("Could not commit changes")
+
+    # rollback connection's changes, only needed after an explicit BEGIN
+    async def rollback(self):
+        if self.connection is not None and \
+                self.connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                await self.__run("ROLLBACK")
+            except Exception:
+                raise DatabaseException.ConnectionInvalid("Could not rollback changes")
+
+    # executes the query like DBConnector.execute,
+    # returns the number of rows effected and a ResultSet (for SELECT)
+    async def execute(self, query: Union[str, sql.Composed], printSchema=False, params=None) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        if Instrumentation.sinks:
+            return await self.__timedExecute(None, query, printSchema, params, time.perf_counter())
+        return await self.__execute(query, printSchema, params)
+
+    # there is no commit phase, the connection is in autocommit mode
+    async def __execute(self, query, printSchema, params, timing: Instrumentation.QueryTiming = None) \
+            -> (int, ResultSet):
+        # try execute the query
+        try:
+            await self.__run(query, params)
+            if timing is not None:
+                timing.execute_ms = timing.lap()
+            row_effected = max(self.cursor.rowcount, 0)
+        except errors.IntegrityError as e:
+            DBConnector.raiseViolation(e)
+
+        # get entries in case of SELECT
+        if self.cursor.description is not None:
+            entries = ResultSet(self.cursor.description, self.cursor.fetchall())
+        else:
+            entries = ResultSet()
+        if timing is not None:
+            timing.fetch_ms = timing.lap()
+            timing.rows = entries.size() if self.cursor.description is not None else row_effected
+
+        # print SELECT entries
+        if printSchema:
+            print(entries)
+
+        return row_effected, entries
+
+    # like DBConnector's, see there
+    async def __timedExecute(self, name, query, printSchema, params, started: float) -> (int, ResultSet):
+        if name is None:
+            name = Instrumentation.queryText(query if isinstance(query, str) else query.as_string(self.cursor))
+        timing = Instrumentation.QueryTiming(Instrumentation.callerName(), name, self.__connect_ms, started)
+        self.__connect_ms = 0.0
+        try:
+            return await self.__execute(query, printSchema, params, timing)
+        except Exception as e:
+            timing.error = type(e).__name__
+            timing.execute_ms += timing.lap()
+            raise
+        finally:
+            Instrumentation.emit(timing)
+
+    # executes a statement registered with DBConnector.registerStatement, PREPAREd once per pooled connection
+    # like DBConnector.executeStatement. Returns the same as execute
+    async def executeStatement(self, name: str, *params, printSchema=False) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        prepare = DBConnector.prepareTemplate(name)
+        started = time.perf_counter() if Instrumentation.sinks else None  # PREPARE counts as executing
+
+        if name not in self.connection.prepared:
+            await self.__run(prepare)
+            self.connection.prepared.add(name)
+
+        query = DBConnector.executeTemplate(name, len(params), self.cursor)
+        if started is None:
+            return await self.__execute(query, printSchema, params or None)
+        return await self.__timedExecute(name, query, printSchema, params or None, started)
+
+    async def __run(self, query, params=None):
+        self.cursor.execute(query, params)
+        await _wait(self.connection)
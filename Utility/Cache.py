@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from Utility.DBConnector import DBConnector, Transaction
+
+# what Cache.get returns for a key that is not cached (None is a legitimate cached value)
+MISSING = object()
+
+
+class Cache:
+    # in-process, thread-safe LRU cache with a time to live.
+    # at most maxsize entries are kept (0 disables the cache), the least recently used one is evicted first,
+    # and an entry older than ttl seconds counts as a miss (0 keeps entries until they are evicted).
+    # limits that are not given are read from the [cache] section of database.ini on first use.
+    # a thread inside a Transaction sees its own uncommitted changes, which other threads must not, so it neither
+    # reads nor fills the cache, and what it invalidates is invalidated again once the transaction ends
+    __setting_types = {'maxsize': int, 'ttl': float}
+
+    def __init__(self, name: str, maxsize: int = None, ttl: float = None):
+        self.name = name
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.__configured = False
+        self.__entries = OrderedDict()  # key -> (expires, value), most recently used last
+        self.__stamp = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__lock = threading.Lock()
+
+    # change the limits, entries above the new maxsize are evicted
+    def configure(self, maxsize: int = None, ttl: float = None):
+        with self.__lock:
+            self.__resolve()
+            if maxsize is not None:
+                self.__maxsize = maxsize
+            if ttl is not None:
+                self.__ttl = ttl if ttl > 0 else None
+            self.__evict()
+
+    # the cached value of key, or MISSING
+    def get(self, key):
+        if Transaction.current() is not None:
+            return MISSING
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > time.monotonic():
+                    self.__entries.move_to_end(key)
+                    self.__hits += 1
+                    return value
+                del self.__entries[key]
+            self.__misses += 1
+            return MISSING
+
+    # take a stamp before reading the value from the database and pass it to put: a value read before
+    # an invalidation may already be stale, so put drops it if anything was invalidated in between
+    def stamp(self) -> int:
+        return self.__stamp
+
+    # caches value under key, returns whether it was stored
+    def put(self, key, value, stamp: int = None) -> bool:
+        if Transaction.current() is not None:
+            return False
+        with self.__lock:
+            self.__resolve()
+            if self.__maxsize <= 0 or (stamp is not None and stamp != self.__stamp):
+                return False
+            expires = None if self.__ttl is None else time.monotonic() + self.__ttl
+            self.__entries[key] = (expires, value)
+            self.__entries.move_to_end(key)
+            self.__evict()
+            return True
+
+    def invalidate(self, key):
+        with self.__lock:
+            self.__stamp += 1
+            self.__entries.pop(key, None)
+        self.__afterTransaction(lambda: self.invalidate(key))
+
+    def clear(self):
+        with self.__lock:
+            self.__stamp += 1
+            self.__entries.clear()
+        self.__afterTransaction(self.clear)
+
+    # hit / miss / eviction counters since the cache was created, and the current size
+    def stats(self) -> dict:
+        with self.__lock:
+            self.__resolve()
+            return {'hits': self.__hits, 'misses': self.__misses, 'evictions': self.__evictions,
+                    'size': len(self.__entries), 'maxsize': self.__maxsize}
+
+    def __len__(self):
+        return len(self.__entries)
+
+    # until the transaction ends other threads can still read, and cache, the values it changes
+    @staticmethod
+    def __afterTransaction(callback):
+        transaction = Transaction.current()
+        if transaction is not None:
+            transaction.onCommit(callback)
+            transaction.onRollback(callback)
+
+    # must be called with the lock held
+    def __resolve(self):
+        if self.__configured:
+            return
+        try:
+            settings = {name: Cache.__setting_types[name](value)
+                        for name, value in DBConnector.configSection('cache').items()
+                        if name in Cache.__setting_types}
+        except Exception:
+            settings = {}
+        if self.__maxsize is None:
+            self.__maxsize = settings.get('maxsize', 10000)
+        if self.__ttl is None:
+            self.__ttl = settings.get('ttl', 60.0)
+        if self.__ttl is not None and self.__ttl <= 0:
+            self.__ttl = None
+        self.__configured = True
+
+    # must be called with the lock held
+    def __evict(self):
+        while len(self.__entries) > max(self.__maxsize, 0):
+            self.__entries.popitem(last=False)
+            self.__evictions += 1
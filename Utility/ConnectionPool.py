@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+import weakref
+import psycopg2
+from psycopg2 import extensions
+from Utility.Exceptions import DatabaseException
+
+
+class PooledConnection(extensions.connection):
+    # a psycopg2 connection that remembers when it was last handed back to the pool
+    # and which named statements were already PREPAREd on its session
+    __open = weakref.WeakSet()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_used = time.monotonic()
+        self.prepared = set()
+        PooledConnection.__open.add(self)
+
+    # to be called in a forked child: the connections it inherited share their sockets with the sessions of the
+    # parent, they are pointed at /dev/null so that whatever the child does with them (closing them sends a
+    # Terminate message) cannot reach the server. The child has to open connections of its own
+    @staticmethod
+    def detachInherited():
+        devnull = os.open(os.devnull, os.O_RDWR)
+        try:
+            for conn in list(PooledConnection.__open):
+                if not conn.closed:
+                    os.dup2(devnull, conn.fileno())
+        finally:
+            os.close(devnull)
+
+
+class ConnectionPool:
+    # constructor
+    # minconn connections are kept open even when idle, at most maxconn are open at any time.
+    # idle connections above minconn are closed after idle_timeout seconds, a connection that sat idle for
+    # more than ping_interval seconds is pinged before it is handed out, and a caller waits at most
+    # checkout_timeout seconds for a free connection when the pool is exhausted
+    def __init__(self, params: dict, minconn=1, maxconn=20, idle_timeout=300.0, checkout_timeout=30.0,
+                 ping_interval=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: minconn=" + str(minconn) + ", maxconn=" + str(maxconn))
+        self.params = dict(params)
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self.__idle = []  # LIFO, so the warmest connections are reused first
+        self.__opened = 0  # idle + checked out
+        self.__closed = False
+        self.__cond = threading.Condition(threading.Lock())
+        for _ in range(minconn):
+            self.__idle.append(self.__connect())
+            self.__opened += 1
+
+    # how many connections are currently open / idle
+    def size(self):
+        with self.__cond:
+            return self.__opened
+
+    def idle(self):
+        with self.__cond:
+            return len(self.__idle)
+
+    # borrow a connection, blocks while all maxconn connections are checked out
+    def getconn(self) -> PooledConnection:
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self.__cond:
+                while True:
+                    if self.__closed:
+                        raise DatabaseException.ConnectionInvalid("Connection pool is closed")
+                    self.__pruneIdle()
+                    if self.__idle:
+                        conn = self.__idle.pop()
+                        break
+                    if self.__opened < self.maxconn:
+                        conn = None
+                        self.__opened += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DatabaseException.ConnectionInvalid("Connection pool exhausted")
+                    self.__cond.wait(remaining)
+
+            # connecting and pinging happen outside the lock so other threads are not held up by the network
+            if conn is None:
+                try:
+                    return self.__connect()
+                except Exception:
+                    self.__forget()
+                    raise
+            if self.__healthy(conn):
+                return conn
+            self.__discard(conn)
+
+    # give a borrowed connection back, any open transaction is rolled back first
+    def putconn(self, conn: PooledConnection):
+        if not self.__reset(conn):
+            self.__discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self.__cond:
+            if self.__closed:
+                self.__opened -= 1
+                conn.close()
+            else:
+                self.__idle.append(conn)
+            self.__cond.notify()
+
+    # close every idle connection, checked out connections are closed when they are returned
+    def closeall(self):
+        with self.__cond:
+            self.__closed = True
+            idle, self.__idle = self.__idle, []
+            self.__opened -= len(idle)
+            self.__cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def __connect(self) -> PooledConnection:
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.params)
+        conn.autocommit = False
+        return conn
+
+    def __healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.ping_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def __reset(conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        try:
+            status = conn.get_transaction_status()
+            if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+                conn.rollback()
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                return False
+            if conn.autocommit:
+                conn.autocommit = False
+            return True
+        except Exception:
+            return False
+
+    def __discard(self, conn: PooledConnection):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self.__forget()
+
+    def __forget(self):
+        with self.__cond:
+            self.__opened -= 1
+            self.__cond.notify()
+
+    # must be called with the lock held
+    def __pruneIdle(self):
+        if not self.__idle or self.__opened <= self.minconn:
+            return
+        now = time.monotonic()
+        # the stack bottom holds the connections idle for the longest time
+        while self.__idle and self.__opened > self.minconn and now - self.__idle[0].last_used > self.idle_timeout:
+            self.__idle.pop(0).close()
+            self.__opened -= 1
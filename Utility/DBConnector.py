@@ -1,8 +1,16 @@
 import psycopg2
+from array import array
+from collections.abc import Mapping
 from psycopg2 import errors, sql
 from configparser import ConfigParser
+from Utility.ConnectionPool import ConnectionPool, PooledConnection
 from Utility.Exceptions import DatabaseException
+from Utility import Instrumentation
+import itertools
 import os
+import re
+import threading
+import time
 from typing import Union
 
 
@@ -13,17 +21,54 @@ class ResultSetDict(dict):
         return super().__getitem__(item.lower())
 
 
+class ResultSetRow(Mapping):
+    # read-only view of one row of a ResultSet, behaves like the ResultSetDict rows used to be
+    # but shares the row tuple and the column index of its ResultSet instead of copying them
+    __slots__ = ('__values', '__header', '__index')
+
+    def __init__(self, values: tuple, header: list, index: dict):
+        self.__values = values
+        self.__header = header
+        self.__index = index
+
+    def __getitem__(self, item):
+        if type(item) is not str:
+            return None
+        index = self.__index.get(item)
+        if index is None:
+            index = self.__index[item.lower()]
+            self.__index[item] = index  # the next row finds this spelling directly
+        return self.__values[index]
+
+    def __iter__(self):
+        return iter(self.__header)
+
+    def __len__(self):
+        return len(self.__header)
+
+    def __repr__(self):
+        return repr(dict(zip(self.__header, self.__values)))
+
+
 class ResultSet:
-    # constructor
+    # constructor, results is kept as is (a list of tuples, as returned by fetchall)
     def __init__(self, description=None, results=None):
+        self.plan = None  # a QueryPlan when the statement is explained, see DBConnector.explainStatements
         self.rows = []
         self.cols_header = []
         self.cols = ResultSetDict()
+        self.__index = {}
+        self.__columns = {}
         self.__fromQuery(description, results)
 
     def __getitem__(self, row):
         return self.__getRow(row)
 
+    # iterates over the rows, like ResultSet[0], ResultSet[1], ...
+    def __iter__(self):
+        header, index = self.cols_header, self.__index
+        return (ResultSetRow(values, header, index) for values in self.rows)
+
     # so you can use print(ResultSet)
     def __str__(self):
         string = ""
@@ -44,88 +89,389 @@ class ResultSet:
     def isEmpty(self):
         return self.size() == 0
 
+    # all the values of one column. integer and float columns without NULLs come as an array.array,
+    # anything else as a list. The result is cached, do not modify it
+    def column(self, name: str) -> Union[array, list]:
+        if not self.rows:
+            return []
+        index = self.__index.get(name)
+        if index is None:
+            index = self.__index[name.lower()]
+        values = self.__columns.get(index)
+        if values is None:
+            values = [row[index] for row in self.rows]
+            types = set(map(type, values))
+            try:
+                if types == {int}:
+                    values = array('q', values)
+                elif types == {float}:
+                    values = array('d', values)
+            except OverflowError:  # integers beyond 64 bits stay a list
+                pass
+            self.__columns[index] = values
+        return values
+
     def __getRow(self, row: int):
         if len(self.rows) <= row:
             print('Invalid row ' + str(row))
             return ResultSetDict()
-        row_to_return = ResultSetDict()
-        for val, col in zip(self.rows[row], self.cols_header):
-            row_to_return[col] = val
-        return row_to_return
+        return ResultSetRow(self.rows[row], self.cols_header, self.__index)
 
     def __fromQuery(self, description, results: list):
         if results is None or len(results) == 0:  # no results
             self.cols = ResultSetDict()
         else:
-            self.rows = results.copy()
+            self.rows = results
             self.cols_header = [d.name for d in description]
             self.cols = ResultSetDict()
             for col, index in zip(self.cols_header, range(len(results[0]))):
                 self.cols[col] = index
+            self.__index = _columnIndex(self.cols_header)
+
+
+# column name -> position, under the name Postgres returned and in lower case
+def _columnIndex(header: list) -> dict:
+    index = {}
+    for position, col in enumerate(header):  # the last of equally named columns wins, as in ResultSetDict
+        index[col] = position
+        index[col.lower()] = position
+    return index
+
+
+class ResultSetStream:
+    # rows of a server-side cursor (see DBConnector.stream), fetched chunk_size at a time while iterating.
+    # iterate it once, before the DBConnector that opened it is closed or commits
+    def __init__(self, cursor, chunk_size: int):
+        self.plan = None  # as in ResultSet
+        self.cols_header = []
+        self.__cursor = cursor
+        self.__chunk_size = chunk_size
+
+    # yields every row as a ResultSetRow, like ResultSet[i]
+    def __iter__(self):
+        try:
+            while self.__cursor is not None:
+                rows = self.__cursor.fetchmany(self.__chunk_size)
+                if not rows:
+                    break
+                if not self.cols_header:  # a named cursor only has a description after its first fetch
+                    self.cols_header = [d.name for d in self.__cursor.description]
+                    index = _columnIndex(self.cols_header)
+                for row in rows:
+                    yield ResultSetRow(row, self.cols_header, index)
+        finally:
+            self.close()
+
+    def close(self):
+        if self.__cursor is not None:
+            try:
+                self.__cursor.close()
+            except psycopg2.ProgrammingError:
+                pass  # the transaction already ended, and the server-side cursor with it
+            self.__cursor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _CopyStream:
+    # file-like view of an iterable of rows in COPY's text format, copy_expert pulls it chunk by chunk
+    __escapes = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+    def __init__(self, rows, rows_per_chunk=1000):
+        self.__rows = iter(rows)
+        self.__rows_per_chunk = rows_per_chunk
+        self.__buffer = ''
+
+    # lists and tuples become array literals
+    @staticmethod
+    def __field(val) -> str:
+        if val is None:
+            return '\\N'
+        if isinstance(val, (list, tuple)):
+            val = '{' + ','.join('NULL' if item is None else
+                                 '"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"'
+                                 for item in val) + '}'
+        return str(val).translate(_CopyStream.__escapes)
+
+    def read(self, size=-1) -> str:
+        while self.__rows is not None and (size < 0 or len(self.__buffer) < size):
+            lines = []
+            for row in self.__rows:
+                lines.append('\t'.join(_CopyStream.__field(val) for val in row) + '\n')
+                if len(lines) == self.__rows_per_chunk:
+                    break
+            if not lines:
+                self.__rows = None
+            self.__buffer += ''.join(lines)
+        if size < 0:
+            size = len(self.__buffer)
+        chunk, self.__buffer = self.__buffer[:size], self.__buffer[size:]
+        return chunk
+
+
+class QueryPlan:
+    # what EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) reported for one run of a statement (see
+    # DBConnector.explainStatements). plan is the parsed JSON ("Plan", "Planning Time", "Execution Time", ...),
+    # warnings describe the sequential scans that read at least seq_scan_rows rows and the sorts that spilled
+    # at least sort_spill_kb kB to disk
+    def __init__(self, statement: str, plan: dict, seq_scan_rows: int, sort_spill_kb: int):
+        self.statement = statement
+        self.plan = plan
+        self.warnings = []
+        for node in self.nodes():
+            if node.get('Node Type') == 'Seq Scan':
+                scanned = (node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * \
+                          node.get('Actual Loops', 1)
+                if scanned >= seq_scan_rows:
+                    self.warnings.append("Seq Scan on " + str(node.get('Relation Name')) + " read " +
+                                         str(int(scanned)) + " rows")
+            if node.get('Sort Space Type') == 'Disk' and node.get('Sort Space Used', 0) >= sort_spill_kb:
+                self.warnings.append(node['Node Type'] + " spilled " + str(node['Sort Space Used']) +
+                                     " kB to disk")
+
+    # every node of the plan tree, depth first
+    def nodes(self):
+        pending = [self.plan['Plan']]
+        while pending:
+            node = pending.pop()
+            yield node
+            pending.extend(reversed(node.get('Plans', [])))
+
+    def executionTime(self) -> float:
+        return self.plan.get('Execution Time', 0.0)
+
+    def __repr__(self):
+        return "QueryPlan(" + self.statement + ", " + str(self.executionTime()) + " ms, " + repr(self.warnings) + ")"
 
 
 class DBConnector:
-    # constructor
+    # every DBConnector in the process borrows its connection from this pool, it is created on first use
+    __pool = None
+    __pool_lock = threading.Lock()
+    __pool_setting_types = {'minconn': int, 'maxconn': int, 'idle_timeout': float, 'checkout_timeout': float,
+                       'ping_interval': float}
+    __pool_overrides = {}
+    # statement shapes registered with registerStatement, by name
+    __statements = {}
+    __execute_templates = {}
+    __stream_ids = itertools.count()
+    # statement name -> (seq_scan_rows, sort_spill_kb) of the explained statements, and their latest QueryPlan
+    __explained = {}
+    __plans = {}
+    __savepoint_ids = itertools.count()
+    # parsed database.ini sections, read once per process (see reloadConfig)
+    __settings = None
+    __config_lock = threading.Lock()
+
+    # constructor. While the thread has a Transaction open the connector works on its connection instead
     def __init__(self):
+        self.connection = None
+        self.cursor = None
+        self.__owner = None
+        self.__transaction = Transaction.current()
+        self.__savepoint = None
+        self.__queued = []  # (statement name or None, query, params), see queue
+        self.__connect_ms = 0.0  # reported with the first timed query, see Instrumentation
+        if self.__transaction is not None:
+            self.connection = self.__transaction.connection
+            self.cursor = self.connection.cursor()
+            return
+        started = time.perf_counter() if Instrumentation.sinks else None
         try:
-            # Obtain the configuration parameters
-            params = DBConnector.__config()
-            self.connection = psycopg2.connect(**params)
-            self.connection.autocommit = False
+            self.__owner = DBConnector.__getPool()
+            self.connection = self.__owner.getconn()
             self.cursor = self.connection.cursor()
         except Exception as e:
-            self.connection = None
-            self.cursor = None
+            self.close()
             raise DatabaseException.ConnectionInvalid("Could not connect to database")
+        if started is not None:
+            self.__connect_ms = (time.perf_counter() - started) * 1000
 
-    # close connection
+    # close connection, the underlying connection goes back to the pool with its transaction rolled back.
+    # inside a Transaction only the changes that were not committed are rolled back
     def close(self):
+        if self.__transaction is not None and self.connection is not None:
+            try:
+                self.rollback()
+            except DatabaseException.ConnectionInvalid:
+                pass  # the Transaction cannot commit anymore, it rolls back when it ends
         if self.cursor is not None:
             self.cursor.close()
+            self.cursor = None
         if self.connection is not None:
-            self.connection.close()
+            if self.__transaction is None:
+                self.__owner.putconn(self.connection)
+            self.connection = None
+
+    # opens a Transaction, see there
+    @staticmethod
+    def transaction() -> 'Transaction':
+        return Transaction()
+
+    # change the pool limits (see ConnectionPool), they take precedence over the [pool] section of database.ini.
+    # idle connections of the current pool are closed
+    @staticmethod
+    def configurePool(**settings):
+        with DBConnector.__pool_lock:
+            unknown = set(settings) - set(DBConnector.__pool_setting_types)
+            if unknown:
+                raise ValueError("Unknown pool settings: " + ", ".join(sorted(unknown)))
+            DBConnector.__pool_overrides = {**DBConnector.__pool_overrides, **settings}
+            DBConnector.__resetPool()
+
+    # drops every configurePool override, the pool goes back to the [pool] section of database.ini (and its
+    # DATABASE_POOL_* overrides). Idle connections of the current pool are closed
+    @staticmethod
+    def resetPoolSettings():
+        with DBConnector.__pool_lock:
+            DBConnector.__pool_overrides = {}
+            DBConnector.__resetPool()
+
+    # close every idle pooled connection, the next DBConnector opens a fresh pool
+    @staticmethod
+    def closePool():
+        with DBConnector.__pool_lock:
+            DBConnector.__resetPool()
+
+    # runs in the child after os.fork (e.g. a multiprocessing worker): the pool is dropped without closing its
+    # connections, they belong to the parent (see PooledConnection.detachInherited), and the child opens its own
+    @staticmethod
+    def afterFork():
+        PooledConnection.detachInherited()
+        DBConnector.__pool = None
+        DBConnector.__pool_lock = threading.Lock()
+        DBConnector.__config_lock = threading.Lock()
+
+    @staticmethod
+    def __getPool() -> ConnectionPool:
+        pool = DBConnector.__pool
+        if pool is None:
+            with DBConnector.__pool_lock:
+                if DBConnector.__pool is None:
+                    DBConnector.__pool = ConnectionPool(DBConnector.connectionParams(), **DBConnector.poolSettings())
+                pool = DBConnector.__pool
+        return pool
+
+    # the [postgresql] parameters connections are opened with (see reloadConfig),
+    # schema is not passed on as is but becomes the search_path of every connection
+    @staticmethod
+    def connectionParams() -> dict:
+        params = DBConnector.__config()
+        schema = DBConnector.schema()
+        params.pop('schema', None)
+        if schema is not None:
+            params['options'] = (params.get('options', '') + " -c search_path=" + schema).strip()
+        return params
 
-    # commit connection's changes
+    # the schema set in [postgresql] (e.g. DATABASE_POSTGRESQL_SCHEMA=worker_1) that every table is created and
+    # looked up in instead of public, None if there is none. createTables creates it when it does not exist
+    @staticmethod
+    def schema() -> Union[str, None]:
+        schema = DBConnector.__config().get('schema')
+        if not schema:
+            return None
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", schema):
+            raise DatabaseException.database_ini_ERROR("schema must be a lower case identifier, not " + schema)
+        return schema
+
+    # any other section of database.ini, e.g. [cache]. Empty if the section is missing
+    @staticmethod
+    def configSection(section: str) -> dict:
+        return DBConnector.__config(section)
+
+    # the pool limits: the [pool] section of database.ini, overridden by configurePool
+    @staticmethod
+    def poolSettings() -> dict:
+        settings = {name: DBConnector.__pool_setting_types[name](value)
+                    for name, value in DBConnector.__config('pool').items()
+                    if name in DBConnector.__pool_setting_types}
+        settings.update(DBConnector.__pool_overrides)
+        return settings
+
+    # must be called with __pool_lock held
+    @staticmethod
+    def __resetPool():
+        if DBConnector.__pool is not None:
+            DBConnector.__pool.closeall()
+            DBConnector.__pool = None
+
+    # commit connection's changes, inside a Transaction they become part of it
     def commit(self):
         if self.connection is not None:
             try:
-                self.connection.commit()
+                if self.__transaction is None:
+                    self.connection.commit()
+                elif self.__savepoint is not None:
+                    self.__savepointCommand("RELEASE SAVEPOINT {name}")
+                    self.__savepoint = None
             except Exception:
                 raise DatabaseException.ConnectionInvalid("Could not commit changes")
 
-    # rollback connection's changes
+    # rollback connection's changes, inside a Transaction only the ones made since the last commit
     def rollback(self):
         if self.connection is not None:
             try:
-                self.connection.rollback()
+                if self.__transaction is None:
+                    self.connection.rollback()
+                elif self.__savepoint is not None:
+                    self.__savepointCommand("ROLLBACK TO SAVEPOINT {name}; RELEASE SAVEPOINT {name}")
+                    self.__savepoint = None
             except Exception:
                 raise DatabaseException.ConnectionInvalid("Could not rollback changes")
 
+    # inside a Transaction, the changes since the last commit are kept in a savepoint of their own,
+    # opened before the first query so that a failing query does not abort the whole Transaction
+    def __begin(self):
+        if self.__transaction is not None and self.__savepoint is None:
+            self.__savepoint = "connector_" + str(next(DBConnector.__savepoint_ids))
+            try:
+                self.__savepointCommand("SAVEPOINT {name}")
+            except Exception:
+                self.__savepoint = None
+                raise
+
+    # on a cursor of its own, execute commits before the rows of its query are fetched
+    def __savepointCommand(self, command: str):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql.SQL(command).format(name=sql.Identifier(self.__savepoint)))
+
     # executes the query, if it is SELECT you may ask to print the results with printSchema
+    # params are bound to %s placeholders in query (see psycopg2's cursor.execute)
     # returns the number of rows effected and a ResultSet (for SELECT)
-    def execute(self, query: Union[str, sql.Composed], printSchema=False) -> (int, ResultSet):
+    def execute(self, query: Union[str, sql.Composed], printSchema=False, params=None) -> (int, ResultSet):
         if self.connection is None:
             raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        if Instrumentation.sinks:
+            return self.__timedExecute(None, query, printSchema, params, time.perf_counter())
+        return self.__execute(query, printSchema, params)
 
+    # timing, if given, gets the time of every phase and the number of rows
+    def __execute(self, query, printSchema, params, timing: Instrumentation.QueryTiming = None) -> (int, ResultSet):
         # try execute the query
         try:
-            self.cursor.execute(query)
+            self.__begin()
+            self.cursor.execute(query, params)
+            if timing is not None:
+                timing.execute_ms = timing.lap()
             row_effected = max(self.cursor.rowcount, 0)
             self.commit()
-        except errors.lookup("23502"):
-            raise DatabaseException.NOT_NULL_VIOLATION("NOT_NULL_VIOLATION")
-        except errors.lookup("23503"):
-            raise DatabaseException.FOREIGN_KEY_VIOLATION("FOREIGN_KEY_VIOLATION")
-        except errors.lookup("23505"):
-            raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
-        except errors.lookup("23514"):
-            raise DatabaseException.CHECK_VIOLATION("CHECK_VIOLATION")
+            if timing is not None:
+                timing.commit_ms = timing.lap()
+        except errors.IntegrityError as e:
+            DBConnector.raiseViolation(e)
 
         # get entries in case of SELECT
         if self.cursor.description is not None:
             entries = ResultSet(self.cursor.description, self.cursor.fetchall())
         else:
             entries = ResultSet()
+        if timing is not None:
+            timing.fetch_ms = timing.lap()
+            timing.rows = entries.size() if self.cursor.description is not None else row_effected
 
         # print SELECT entries
         if printSchema:
@@ -133,25 +479,387 @@ class DBConnector:
 
         return row_effected, entries
 
-    # grant credentials
-    @staticmethod
-    def __config(filename=os.path.join(os.path.join(os.getcwd(), "Utility"), 'database.ini'),
-                 section='postgresql'):
-        # create a parser
-        parser = ConfigParser()
-        # read config file
-        parser.read(filename)
-
-        # get section
-        db = {}
-        if parser.has_section(section):
-            params = parser.items(section)
-            for param in params:
-                db[param[0]] = param[1]
+    # __execute while sinks are registered, the timing goes to them even if the query fails.
+    # name is the registered statement, for other queries their text is reported
+    def __timedExecute(self, name, query, printSchema, params, started: float) -> (int, ResultSet):
+        if name is None:
+            name = Instrumentation.queryText(query if isinstance(query, str) else query.as_string(self.cursor))
+        timing = Instrumentation.QueryTiming(Instrumentation.callerName(), name, self.__connect_ms, started)
+        self.__connect_ms = 0.0
+        try:
+            return self.__execute(query, printSchema, params, timing)
+        except Exception as e:
+            timing.error = type(e).__name__
+            timing.execute_ms += timing.lap()
+            raise
+        finally:
+            Instrumentation.emit(timing)
+
+    # streams rows (any iterable of tuples, e.g. a generator) into table with COPY ... FROM STDIN,
+    # table and columns are quoted identifiers, so pass them the way Postgres stores them (lower case).
+    # only one chunk of rows is held in memory at a time. Like execute it raises the matching DatabaseException,
+    # unlike execute it does not commit so the copied rows can be processed further in the same transaction.
+    # returns the number of rows copied
+    def copyFrom(self, table: str, columns: list, rows) -> int:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        query = sql.SQL("COPY {table}({columns}) FROM STDIN").format(
+            table=sql.Identifier(table), columns=sql.SQL(', ').join(map(sql.Identifier, columns)))
+        try:
+            self.__begin()
+            self.cursor.copy_expert(query, _CopyStream(rows))
+        except errors.IntegrityError as e:
+            DBConnector.raiseViolation(e)
+        return max(self.cursor.rowcount, 0)
+
+    # registers a query shape under name, its parameters are written $1, $2, ... like in PREPARE.
+    # registering the same name twice is fine as long as the query is the same
+    @staticmethod
+    def registerStatement(name: str, query: str):
+        registered = DBConnector.__statements.setdefault(name, query)
+        if registered != query:
+            raise ValueError("Statement " + name + " is already registered with a different query")
+
+    # the query registered under name
+    @staticmethod
+    def registeredStatement(name: str) -> str:
+        if name not in DBConnector.__statements:
+            raise ValueError("Unknown statement " + name)
+        return DBConnector.__statements[name]
+
+    # diagnostic mode: from now on every run of the named statements (executeStatement or streamStatement) is preceded
+    # by a run under EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), in a savepoint that is rolled back so that a statement
+    # which writes only takes effect once. The QueryPlan goes to the ResultSet / ResultSetStream (result.plan) and
+    # to lastPlan. Each explained statement runs twice, turn it off with explainStatements() when done
+    @staticmethod
+    def explainStatements(*names: str, seq_scan_rows: int = 10000, sort_spill_kb: int = 0):
+        for name in names:
+            DBConnector.registeredStatement(name)
+        DBConnector.__explained = {name: (seq_scan_rows, sort_spill_kb) for name in names}
+
+    # the plan of the latest explained run of the statement, None if it was not explained yet
+    @staticmethod
+    def lastPlan(name: str) -> Union[QueryPlan, None]:
+        return DBConnector.__plans.get(name)
+
+    # None if the statement is not explained or EXPLAIN failed, the statement itself then reports the error
+    def __explain(self, name: str, query: str, params) -> Union[QueryPlan, None]:
+        thresholds = DBConnector.__explained.get(name)
+        if thresholds is None:
+            return None
+        with self.connection.cursor() as cursor:
+            try:
+                cursor.execute("SAVEPOINT explain_plan")
+            except psycopg2.Error:
+                return None
+            try:
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+                plan = QueryPlan(name, cursor.fetchone()[0][0], *thresholds)
+            except psycopg2.Error:
+                plan = None
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_plan; RELEASE SAVEPOINT explain_plan")
+        if plan is not None:
+            DBConnector.__plans[name] = plan
+        return plan
+
+    # executes a statement registered with registerStatement, binding params to $1, $2, ...
+    # the statement is PREPAREd the first time it runs on the pooled connection and only EXECUTEd afterwards,
+    # so Postgres parses and plans it once per connection. Returns the same as execute
+    def executeStatement(self, name: str, *params, printSchema=False) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        if name not in DBConnector.__statements:
+            raise ValueError("Unknown statement " + name)
+
+        started = time.perf_counter() if Instrumentation.sinks else None  # PREPARE counts as executing
+        self.__begin()
+        if name not in self.connection.prepared:
+            self.cursor.execute(DBConnector.prepareTemplate(name))
+            self.connection.prepared.add(name)
+        query = DBConnector.executeTemplate(name, len(params), self.cursor)
+        plan = self.__explain(name, query, params or None) if DBConnector.__explained else None
+        if started is None:
+            row_effected, entries = self.__execute(query, printSchema, params or None)
+        else:
+            row_effected, entries = self.__timedExecute(name, query, printSchema, params or None, started)
+        entries.plan = plan
+        return row_effected, entries
+
+    # the PREPARE of a registered statement, shared with AsyncDBConnector
+    @staticmethod
+    def prepareTemplate(name: str) -> sql.Composed:
+        return sql.SQL("PREPARE {name} AS ").format(name=sql.Identifier(name)) + \
+            sql.SQL(DBConnector.registeredStatement(name))
+
+    # the EXECUTE text only depends on the name and the number of parameters, so it is rendered once per process
+    # with the cursor of whichever connector (DBConnector or AsyncDBConnector) runs it first
+    @staticmethod
+    def executeTemplate(name: str, param_count: int, cursor) -> str:
+        query = DBConnector.__execute_templates.get((name, param_count))
+        if query is None:
+            if param_count:
+                query = sql.SQL("EXECUTE {name}({params})").format(
+                    name=sql.Identifier(name), params=sql.SQL(', ').join(sql.Placeholder() * param_count))
+            else:
+                query = sql.SQL("EXECUTE {name}").format(name=sql.Identifier(name))
+            query = query.as_string(cursor)
+            DBConnector.__execute_templates[(name, param_count)] = query
+        return query
+
+    # queue a query (like execute) / a registered statement (like executeStatement) to be sent with flush()
+    def queue(self, query: Union[str, sql.Composed], params=None):
+        self.__queued.append((None, query, params))
+
+    def queueStatement(self, name: str, *params):
+        if name not in DBConnector.__statements:
+            raise ValueError("Unknown statement " + name)
+        self.__queued.append((name, None, params))
+
+    # sends every queued statement to the server in one round trip and commits, like execute would after each.
+    # meant for writes, their rows and counts are not returned. Returns one entry per statement, in the order they
+    # were queued: None if it succeeded, else the DatabaseException it raised (UNKNOWN_ERROR for errors that are not
+    # a constraint violation). When one fails the batch is rolled back and the statements are run again one at a
+    # time, each committed on its own, so the others still take effect and every failure is reported with its own
+    # statement. The batch is then applied partially, not all or nothing: statements that depend on a failed one
+    # run without it. To undo all of it, flush inside a Transaction (see there) and raise when an outcome is not None
+    def flush(self) -> list:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        queued, self.__queued = self.__queued, []
+        if not queued:
+            return []
+        prepare = list(dict.fromkeys(name for name, _, _ in queued
+                                     if name is not None and name not in self.connection.prepared))
+        try:
+            self.__begin()
+            batch = [self.cursor.mogrify(DBConnector.prepareTemplate(name)) for name in prepare]
+            batch += [self.cursor.mogrify(query, params) if name is None else
+                      self.cursor.mogrify(DBConnector.executeTemplate(name, len(params), self.cursor), params or None)
+                      for name, query, params in queued]
+            self.cursor.execute(b";\n".join(batch))
+            self.commit()
+            self.connection.prepared.update(prepare)
+            return [None] * len(queued)
+        except (psycopg2.Error, DatabaseException.ConnectionInvalid):
+            self.rollback()
+        # PREPARE is not undone by a rollback, the ones sent before the failure are there now
+        self.cursor.execute("SELECT name FROM pg_prepared_statements")
+        self.connection.prepared.clear()
+        self.connection.prepared.update(row[0] for row in self.cursor.fetchall())
+        self.commit()
+        outcomes = []
+        for name, query, params in queued:
+            try:
+                if name is None:
+                    self.execute(query, params=params)
+                else:
+                    self.executeStatement(name, *params)
+                outcomes.append(None)
+            except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.FOREIGN_KEY_VIOLATION,
+                    DatabaseException.UNIQUE_VIOLATION, DatabaseException.CHECK_VIOLATION) as e:
+                self.rollback()
+                outcomes.append(e)
+            except psycopg2.Error as e:
+                self.rollback()
+                outcomes.append(DatabaseException.UNKNOWN_ERROR(str(e).strip()))
+        return outcomes
+
+    # runs a SELECT through a named (server-side) cursor, instead of fetching every row up front the returned
+    # ResultSetStream fetches chunk_size rows per round trip while it is iterated, so only one chunk is held in memory.
+    # the cursor lives in the current transaction: consume the stream before commit, rollback or close
+    def stream(self, query: Union[str, sql.Composed], params=None, chunk_size=2000) -> ResultSetStream:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        self.__begin()
+        cursor = self.connection.cursor(name="stream_" + str(next(DBConnector.__stream_ids)))
+        try:
+            cursor.execute(query, params)
+        except errors.IntegrityError as e:
+            cursor.close()
+            DBConnector.raiseViolation(e)
+        except Exception:
+            cursor.close()
+            raise
+        return ResultSetStream(cursor, chunk_size)
+
+    # stream() for a statement registered with registerStatement. A cursor cannot be declared over EXECUTE,
+    # so the query text is sent with its $n parameters bound on the client side
+    def streamStatement(self, name: str, *params, chunk_size=2000) -> ResultSetStream:
+        if name not in DBConnector.__statements:
+            raise ValueError("Unknown statement " + name)
+        query = re.sub(r"\$(\d+)", r"%(\1)s", DBConnector.__statements[name].replace("%", "%%"))
+        params = {str(i): param for i, param in enumerate(params, 1)} or None
+        plan = None
+        if DBConnector.__explained:
+            self.__begin()
+            plan = self.__explain(name, query, params)
+        stream = self.stream(query, params, chunk_size)
+        stream.plan = plan
+        return stream
+
+    # re-raises an integrity error reported by Postgres as the matching DatabaseException
+    @staticmethod
+    def raiseViolation(error):
+        if error.pgcode == "23502":
+            raise DatabaseException.NOT_NULL_VIOLATION("NOT_NULL_VIOLATION")
+        if error.pgcode == "23503":
+            raise DatabaseException.FOREIGN_KEY_VIOLATION("FOREIGN_KEY_VIOLATION")
+        if error.pgcode == "23505":
+            raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
+        if error.pgcode == "23514":
+            raise DatabaseException.CHECK_VIOLATION("CHECK_VIOLATION")
+        raise error
+
+    # reads database.ini again (and the DATABASE_* environment variables), the pool is rebuilt with the new
+    # parameters on the next DBConnector. Call it after editing database.ini or the environment of a running process
+    @staticmethod
+    def reloadConfig():
+        with DBConnector.__pool_lock:
+            DBConnector.__settings = DBConnector.__readConfig()
+            DBConnector.__resetPool()
+
+    # grant credentials, database.ini is only read the first time, later calls return the cached section
+    @staticmethod
+    def __config(section='postgresql') -> dict:
+        settings = DBConnector.__settings
+        if settings is None:
+            with DBConnector.__config_lock:
+                if DBConnector.__settings is None:
+                    DBConnector.__settings = DBConnector.__readConfig()
+                settings = DBConnector.__settings
+        return dict(settings.get(section, {}))
+
+    # every section of the first database.ini found, overridden by DATABASE_<SECTION>_<KEY> environment variables
+    # (e.g. DATABASE_POSTGRESQL_HOST=db.local or DATABASE_POOL_MAXCONN=50)
+    @staticmethod
+    def __readConfig(section='postgresql') -> dict:
+        settings = {}
+        for filename in DBConnector.__configFiles():
+            # create a parser
+            parser = ConfigParser()
+            # read config file
+            parser.read(filename)
+            if parser.has_section(section):
+                settings = {name: dict(parser.items(name)) for name in parser.sections()}
+                break
+
+        for variable, value in os.environ.items():
+            parts = variable.split('_', 2)
+            if len(parts) == 3 and parts[0] == 'DATABASE' and parts[1] and parts[2]:
+                settings.setdefault(parts[1].lower(), {})[parts[2].lower()] = value
+
+        if not settings.get(section):
+            raise DatabaseException.database_ini_ERROR("Please modify database.ini file under Utility")
+        return settings
+
+    # where database.ini is looked for, in order: $DATABASE_INI, Utility under the working directory,
+    # Utility under its parent and finally the directory of this module
+    @staticmethod
+    def __configFiles() -> list:
+        candidates = [os.path.join(os.getcwd(), 'Utility', 'database.ini'),
+                      os.path.join(os.path.dirname(os.getcwd()), 'Utility', 'database.ini'),
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.ini')]
+        if os.environ.get('DATABASE_INI'):
+            candidates.insert(0, os.environ['DATABASE_INI'])
+        return candidates
+
+
+class Transaction:
+    # one database transaction shared by every DBConnector the thread creates while it is open, so a sequence of
+    # Solution.py calls commits (or rolls back) as a whole with a single commit:
+    #
+    #     with DBConnector.transaction():
+    #         Solution.addMovie(movie)
+    #         Solution.studioProducedMovie(studio_id, movie_name, year, budget, revenue)
+    #
+    # every DBConnector in it keeps its changes in a savepoint until it commits them into the transaction, so a
+    # failing query only undoes the work of its connector and the calls return the same ReturnValues as without it.
+    # the transaction commits when the with block ends and rolls back if the block raises, a transaction opened
+    # inside another one is a savepoint of it
+    __local = threading.local()
+    __savepoint_ids = itertools.count()
+
+    # the innermost transaction the calling thread has open, or None
+    @staticmethod
+    def current() -> Union['Transaction', None]:
+        return getattr(Transaction.__local, 'current', None)
+
+    def __init__(self):
+        self.connection = None
+        self.__parent = None
+        self.__connector = None
+        self.__savepoint = None
+        self.__on_commit = []
+        self.__on_rollback = []
+
+    # callback() runs once the changes are committed / rolled back (for a nested transaction: once the outermost
+    # one commits, or as soon as this one rolls back), after the thread has left the transaction
+    def onCommit(self, callback):
+        self.__on_commit.append(callback)
+
+    def onRollback(self, callback):
+        self.__on_rollback.append(callback)
+
+    def __enter__(self) -> 'Transaction':
+        parent = Transaction.current()
+        if parent is None:
+            self.__connector = DBConnector()
+            self.connection = self.__connector.connection
         else:
-            # file not found
-            db = DBConnector.__config(
-                filename=os.path.join(os.path.join(os.path.dirname(os.getcwd()), 'Utility'), 'database.ini'))
-            if db is None:
-                raise DatabaseException.database_ini_ERROR("Please modify database.ini file under Utility")
-        return db
+            self.connection = parent.connection
+            self.__savepoint = "transaction_" + str(next(Transaction.__savepoint_ids))
+            with self.connection.cursor() as cursor:
+                cursor.execute(sql.SQL("SAVEPOINT {name}").format(name=sql.Identifier(self.__savepoint)))
+        self.__parent = parent
+        Transaction.__local.current = self
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        Transaction.__local.current = self.__parent
+        committed = False
+        try:
+            if exc_type is None:
+                self.__commit()
+                committed = True
+            else:
+                try:
+                    self.__rollback()
+                except Exception:
+                    pass  # a broken connection is discarded by the pool, the exception of the block is the one raised
+        finally:
+            if self.__connector is not None:
+                self.__connector.close()
+            if committed and self.__parent is not None:
+                for callback in self.__on_commit:
+                    self.__parent.onCommit(callback)
+                for callback in self.__on_rollback:
+                    self.__parent.onRollback(callback)
+            else:
+                for callback in self.__on_commit if committed else self.__on_rollback:
+                    callback()
+        return False
+
+    def __commit(self):
+        if self.__parent is None:
+            self.__connector.commit()
+            return
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(sql.SQL("RELEASE SAVEPOINT {name}").format(name=sql.Identifier(self.__savepoint)))
+        except Exception:
+            try:
+                self.__rollback()
+            except Exception:
+                pass
+            raise DatabaseException.ConnectionInvalid("Could not commit changes")
+
+    def __rollback(self):
+        if self.__parent is None:
+            self.__connector.rollback()
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql.SQL("ROLLBACK TO SAVEPOINT {name}; RELEASE SAVEPOINT {name}").format(
+                name=sql.Identifier(self.__savepoint)))
+
+
+os.register_at_fork(after_in_child=DBConnector.afterFork)
@@ -0,0 +1,168 @@
+import json
+import logging
+import math
+import re
+import sys
+import threading
+import time
+
+# the registered sinks, DBConnector and AsyncDBConnector only time their queries while this is not empty
+sinks = []
+_sinks_lock = threading.Lock()
+
+# modules whose frames are skipped when looking for the API function that ran a query
+_internal_modules = {'Utility.DBConnector', 'Utility.AsyncDBConnector', 'Utility.Instrumentation'}
+
+
+class QueryTiming:
+    # what one query cost: the API function that ran it (module.function), the registered statement name or the
+    # query text, the time in milliseconds spent borrowing the connection (only on the first query of a DBConnector),
+    # running the query, fetching its rows and committing, the number of rows returned (or effected) and the name
+    # of the exception it raised, if any
+    __slots__ = ('api', 'statement', 'connect_ms', 'execute_ms', 'fetch_ms', 'commit_ms', 'rows', 'error',
+                 '__last')
+
+    def __init__(self, api: str, statement: str, connect_ms: float, started: float):
+        self.api = api
+        self.statement = statement
+        self.connect_ms = connect_ms
+        self.execute_ms = 0.0
+        self.fetch_ms = 0.0
+        self.commit_ms = 0.0
+        self.rows = 0
+        self.error = None
+        self.__last = started
+
+    # milliseconds since the previous lap (or since the query started)
+    def lap(self) -> float:
+        now = time.perf_counter()
+        elapsed, self.__last = (now - self.__last) * 1000, now
+        return elapsed
+
+    def total_ms(self) -> float:
+        return self.connect_ms + self.execute_ms + self.fetch_ms + self.commit_ms
+
+    def asDict(self) -> dict:
+        return {'api': self.api, 'statement': self.statement, 'connect_ms': self.connect_ms,
+                'execute_ms': self.execute_ms, 'fetch_ms': self.fetch_ms, 'commit_ms': self.commit_ms,
+                'total_ms': self.total_ms(), 'rows': self.rows, 'error': self.error}
+
+    def __repr__(self):
+        return "QueryTiming(" + ", ".join(name + "=" + repr(value) for name, value in self.asDict().items()) + ")"
+
+
+# a sink is any object with a record(timing: QueryTiming) method, it is called on the thread that ran the query
+def addSink(sink):
+    with _sinks_lock:
+        if sink not in sinks:
+            sinks.append(sink)
+
+
+def removeSink(sink):
+    with _sinks_lock:
+        if sink in sinks:
+            sinks.remove(sink)
+
+
+# passes timing to every sink, a failing sink does not fail the query
+def emit(timing: QueryTiming):
+    for sink in list(sinks):
+        try:
+            sink.record(timing)
+        except Exception:
+            pass
+
+
+# module.function of the innermost caller outside of the connection layer, e.g. Solution.addMovie
+def callerName() -> str:
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get('__name__') in _internal_modules:
+        frame = frame.f_back
+    if frame is None:
+        return '?'
+    return frame.f_globals.get('__name__', '?') + '.' + frame.f_code.co_name
+
+
+# the query as one line, at most 200 characters
+def queryText(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip()[:200]
+
+
+class HistogramSink:
+    # aggregates the timings in memory by key (by default the API function), with the total time of each query
+    # counted in logarithmic buckets 2 ** (1 / 4) apart so that percentiles are accurate to about 20%
+    __buckets_per_doubling = 4
+    __smallest_ms = 0.01
+
+    def __init__(self, key=lambda timing: timing.api):
+        self.__key = key
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    def record(self, timing: QueryTiming):
+        total = timing.total_ms()
+        bucket = max(int(HistogramSink.__buckets_per_doubling * math.log2(max(total, 1e-9) /
+                                                                          HistogramSink.__smallest_ms)), 0)
+        with self.__lock:
+            entry = self.__entries.setdefault(self.__key(timing), {
+                'count': 0, 'errors': 0, 'rows': 0, 'max_ms': 0.0, 'connect_ms': 0.0, 'execute_ms': 0.0,
+                'fetch_ms': 0.0, 'commit_ms': 0.0, 'buckets': {}})
+            entry['count'] += 1
+            entry['errors'] += timing.error is not None
+            entry['rows'] += timing.rows
+            entry['max_ms'] = max(entry['max_ms'], total)
+            for phase in ('connect_ms', 'execute_ms', 'fetch_ms', 'commit_ms'):
+                entry[phase] += getattr(timing, phase)
+            entry['buckets'][bucket] = entry['buckets'].get(bucket, 0) + 1
+
+    # per key: count, errors, rows, the mean time of every phase, mean / p50 / p95 / p99 / max total time
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {key: self.__summarize(entry) for key, entry in self.__entries.items()}
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    @staticmethod
+    def __summarize(entry: dict) -> dict:
+        count = entry['count']
+        summary = {'count': count, 'errors': entry['errors'], 'rows': entry['rows'], 'max_ms': entry['max_ms']}
+        for phase in ('connect_ms', 'execute_ms', 'fetch_ms', 'commit_ms'):
+            summary['mean_' + phase] = entry[phase] / count
+        summary['mean_ms'] = sum(summary['mean_' + phase] for phase in ('connect_ms', 'execute_ms', 'fetch_ms',
+                                                                          'commit_ms'))
+        for name, fraction in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            rank, seen = math.ceil(fraction * count), 0
+            for bucket in sorted(entry['buckets']):
+                seen += entry['buckets'][bucket]
+                if seen >= rank:
+                    upper = HistogramSink.__smallest_ms * 2 ** ((bucket + 1) / HistogramSink.__buckets_per_doubling)
+                    summary[name] = min(upper, entry['max_ms'])
+                    break
+        return summary
+
+
+class LogSink:
+    # writes every timing as one JSON line to a logging.Logger (by default "Utility.Instrumentation"),
+    # the fields are also attached to the record as record.query_timing for structured handlers.
+    # min_ms skips the queries that took less, e.g. to only log the slow ones
+    def __init__(self, logger: logging.Logger = None, level=logging.INFO, min_ms: float = 0.0):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.level = level
+        self.min_ms = min_ms
+
+    def record(self, timing: QueryTiming):
+        if timing.total_ms() < self.min_ms or not self.logger.isEnabledFor(self.level):
+            return
+        fields = timing.asDict()
+        self.logger.log(self.level, json.dumps(fields), extra={'query_timing': fields})
+
+
+class CallbackSink:
+    # calls callback(timing) for every query
+    def __init__(self, callback):
+        self.callback = callback
+
+    def record(self, timing: QueryTiming):
+        self.callback(timing)